@@ -3,6 +3,11 @@ from fastapi import APIRouter
 from .categories import router as categories_router
 from .products import router as products_router
 from .files import router as files_router
+from .changes import router as changes_router
+from .events import router as events_router
+from .imports import router as imports_router
+from .exports import router as exports_router
+from .metrics import router as metrics_router
 
 router = APIRouter()
 
@@ -10,6 +15,11 @@ router = APIRouter()
 router.include_router(categories_router)
 router.include_router(products_router)
 router.include_router(files_router)
+router.include_router(changes_router)
+router.include_router(events_router)
+router.include_router(imports_router)
+router.include_router(exports_router)
+router.include_router(metrics_router)
 
 __all__ = ["router"]
 
@@ -1,36 +1,166 @@
-from typing import Optional
-from sqlalchemy import select, func
+from typing import Optional, Sequence
+from sqlalchemy import select, func, insert, update, delete, case, literal, or_
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased, load_only
+from pydantic import BaseModel
 
-from core.models.models import Category
-from .schemas import CategoryCreate, CategoryUpdate
+from core.cache import entity_cache
+from core.events import record_change
+from core.models import db_helper
+from core.models.models import Category, Product, File
+from core.singleflight import coalesce, single_flight_group
+from admin.api.v1.utils.db_utils import add_tombstones
+from admin.api.v1.utils.fieldsets import get_sparse_schema, get_sparse_list_schema
+from admin.api.v1.utils.tree_utils import TREE_LOCK_KEY, child_path, in_subtree, in_subtree_of
+from .schemas import (
+    CategoryCreate,
+    CategoryUpdate,
+    CategoryResponse,
+    CategoryListResponse,
+    CategoryCounts,
+    CategoryCountsResponse
+)
+
+# Одинаковые параллельные чтения категорий выполняются одним запросом
+category_reads = single_flight_group("categories")
 
 
 class CategoryCRUD:
     """CRUD операции для категорий"""
 
+    @staticmethod
+    async def _lock_tree(session: AsyncSession, exclusive: bool = True) -> None:
+        """
+        Заблокировать дерево категорий до конца транзакции (PostgreSQL)
+
+        Блокировки строк мало: два параллельных переноса проверяют цикл по путям,
+        которые другой перенос сейчас перепишет, и вместе могут замкнуть дерево.
+        Поэтому переносы и удаления поддеревьев выполняются по одному, а создание
+        подкатегории (разделяемая блокировка) не пересекается с ними: перенос
+        не пропустит новую подкатегорию, записанную со старым путем родителя.
+        """
+        if session.get_bind().dialect.name != "postgresql":
+            return
+        lock = func.pg_advisory_xact_lock if exclusive else func.pg_advisory_xact_lock_shared
+        await session.execute(select(lock(TREE_LOCK_KEY)))
+
+    @staticmethod
+    async def _get_path(session: AsyncSession, category_id: int) -> Optional[str]:
+        """Путь категории; строка блокируется до конца транзакции (PostgreSQL)"""
+        return await session.scalar(
+            select(Category.path)
+            .where(Category.id == category_id)
+            .with_for_update()
+        )
+
+    @staticmethod
+    async def _get_parent_path(session: AsyncSession, parent_id: Optional[int]) -> str:
+        """
+        Путь будущего родителя ("" - корень)
+
+        Raises:
+            LookupError: Если родительская категория не существует
+        """
+        if parent_id is None:
+            return ""
+        parent_path = await CategoryCRUD._get_path(session, parent_id)
+        if parent_path is None:
+            await session.rollback()
+            raise LookupError(f"Родительская категория с ID {parent_id} не найдена")
+        return parent_path
+
     @staticmethod
     async def create(session: AsyncSession, category_in: CategoryCreate) -> Category:
-        """Создать категорию"""
-        category = Category(**category_in.model_dump())
-        session.add(category)
+        """
+        Создать категорию: INSERT и UPDATE пути, в котором участвует новый ID
+
+        Raises:
+            LookupError: Если родительская категория не существует
+        """
+        if category_in.parent_id is not None:
+            await CategoryCRUD._lock_tree(session, exclusive=False)
+        parent_path = await CategoryCRUD._get_parent_path(session, category_in.parent_id)
+        result = await session.execute(
+            insert(Category)
+            .values(**category_in.model_dump(), path="")
+            .returning(Category.id)
+        )
+        category_id = result.scalar_one()
+        result = await session.execute(
+            update(Category)
+            .where(Category.id == category_id)
+            .values(path=child_path(parent_path, category_id))
+            .returning(Category)
+        )
+        category = result.scalar_one()
+        record_change(session, "category", category.id, "create", category.updated_at)
         await session.commit()
-        await session.refresh(category)
         return category
 
     @staticmethod
-    async def get_by_id(session: AsyncSession, category_id: int) -> Optional[Category]:
+    def _load_options(fields: Optional[Sequence[str]] = None) -> list:
+        """Опции загрузки: только запрошенные колонки, без скрытых догрузок остальных"""
+        if fields is None:
+            return []
+        return [load_only(*(getattr(Category, field) for field in fields), raiseload=True)]
+
+    @staticmethod
+    async def get_by_id(
+        session: AsyncSession,
+        category_id: int,
+        fields: Optional[Sequence[str]] = None
+    ) -> Optional[Category]:
         """Получить категорию по ID"""
         result = await session.execute(
-            select(Category).where(Category.id == category_id)
+            select(Category)
+            .options(*CategoryCRUD._load_options(fields))
+            .where(Category.id == category_id)
         )
         return result.scalar_one_or_none()
 
+    @staticmethod
+    async def get_by_ids(
+        session: AsyncSession,
+        category_ids: Sequence[int],
+        fields: Optional[Sequence[str]] = None
+    ) -> dict[int, Category]:
+        """Получить категории по списку ID одним запросом"""
+        result = await session.execute(
+            select(Category)
+            .options(*CategoryCRUD._load_options(fields))
+            .where(Category.id.in_(category_ids))
+        )
+        return {category.id: category for category in result.scalars()}
+
+    @staticmethod
+    @coalesce(category_reads, key=lambda category_id, fields=None: ("category", category_id, fields))
+    async def get_response(category_id: int, fields: Optional[tuple[str, ...]] = None) -> Optional[BaseModel]:
+        """
+        Получить категорию схемой ответа (полной или только с полями fields)
+
+        Одинаковые параллельные вызовы объединяются в один запрос в своей сессии.
+        """
+        async with db_helper.session_factory() as session:
+            category = await CategoryCRUD.get_by_id(session, category_id, fields=fields)
+            if category is None:
+                return None
+            schema = CategoryResponse if fields is None else get_sparse_schema(CategoryResponse, fields)
+            return schema.model_validate(category)
+
+    @staticmethod
+    async def get_cached(category_id: int) -> Optional[CategoryResponse]:
+        """Получить категорию через кэш воркера"""
+        return await entity_cache.get_or_load(
+            ("category", category_id),
+            lambda: CategoryCRUD.get_response(category_id)
+        )
+
     @staticmethod
     async def get_all(
         session: AsyncSession,
         skip: int = 0,
-        limit: int = 100
+        limit: int = 100,
+        fields: Optional[Sequence[str]] = None
     ) -> tuple[list[Category], int]:
         """Получить список всех категорий с пагинацией"""
         # Получаем общее количество
@@ -40,6 +170,7 @@ class CategoryCRUD:
         # Получаем категории с пагинацией
         result = await session.execute(
             select(Category)
+            .options(*CategoryCRUD._load_options(fields))
             .offset(skip)
             .limit(limit)
             .order_by(Category.id.desc())
@@ -47,26 +178,183 @@ class CategoryCRUD:
         categories = result.scalars().all()
         return list(categories), total
 
+    @staticmethod
+    @coalesce(category_reads, key=lambda **params: ("categories", *sorted(params.items())))
+    async def get_list_response(
+        *,
+        skip: int = 0,
+        limit: int = 100,
+        fields: Optional[tuple[str, ...]] = None
+    ) -> BaseModel:
+        """Получить страницу категорий схемой ответа; одинаковые параллельные вызовы объединяются"""
+        async with db_helper.session_factory() as session:
+            categories, total = await CategoryCRUD.get_all(session, skip=skip, limit=limit, fields=fields)
+            if fields is None:
+                return CategoryListResponse(items=categories, total=total)
+            return get_sparse_list_schema(CategoryResponse, fields)(items=categories, total=total)
+
     @staticmethod
     async def update(
         session: AsyncSession,
-        category: Category,
+        category_id: int,
         category_update: CategoryUpdate
-    ) -> Category:
-        """Обновить категорию"""
+    ) -> Optional[Category]:
+        """
+        Обновить категорию одним UPDATE ... RETURNING
+
+        С parent_id категория переносится вместе с поддеревом: пути всех категорий
+        поддерева переписываются одним UPDATE.
+
+        Returns:
+            Optional[Category]: Обновленная категория или None если она не найдена
+
+        Raises:
+            LookupError: Если новая родительская категория не существует
+            ValueError: Если категорию переносят в ее же поддерево
+        """
         update_data = category_update.model_dump(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(category, field, value)
-        
+        if not update_data:
+            return await CategoryCRUD.get_by_id(session, category_id)
+
+        if "parent_id" in update_data:
+            await CategoryCRUD._lock_tree(session)
+            path = await CategoryCRUD._get_path(session, category_id)
+            if path is None:
+                await session.rollback()
+                return None
+            parent_path = await CategoryCRUD._get_parent_path(session, update_data["parent_id"])
+            if parent_path.startswith(path):
+                await session.rollback()
+                raise ValueError("Нельзя перенести категорию в нее саму или ее подкатегорию")
+            await CategoryCRUD._move_subtree(session, category_id, path, child_path(parent_path, category_id))
+
+        result = await session.execute(
+            update(Category)
+            .where(Category.id == category_id)
+            .values(**update_data)
+            .returning(Category)
+            .execution_options(populate_existing=True)
+        )
+        category = result.scalar_one_or_none()
+        if category is not None:
+            record_change(session, "category", category.id, "update", category.updated_at)
         await session.commit()
-        await session.refresh(category)
         return category
 
     @staticmethod
-    async def delete(session: AsyncSession, category: Category) -> None:
-        """Удалить категорию"""
-        await session.delete(category)
+    async def _move_subtree(session: AsyncSession, category_id: int, path: str, new_path: str) -> None:
+        """Заменить префикс path на new_path у путей поддерева одним UPDATE"""
+        if new_path == path:
+            return
+        result = await session.execute(
+            update(Category)
+            .where(in_subtree(Category.path, path))
+            .values(path=literal(new_path).concat(func.substr(Category.path, len(path) + 1)))
+            .returning(Category.id, Category.updated_at)
+            .execution_options(synchronize_session=False)
+        )
+        # Сама категория попадет в ленту изменений из основного UPDATE
+        for row in result:
+            if row.id != category_id:
+                record_change(session, "category", row.id, "update", row.updated_at)
+
+    @staticmethod
+    async def get_counts(session: AsyncSession, category_id: int) -> Optional[CategoryCountsResponse]:
+        """
+        Размер поддерева категории и поддеревьев ее прямых подкатегорий
+
+        Продукты поддерева считаются по категориям одним проходом по индексу
+        (category_id, is_active), затем суммируются по поддеревьям диапазонами путей.
+        """
+        path = await session.scalar(select(Category.path).where(Category.id == category_id))
+        if path is None:
+            return None
+        per_category = (
+            select(
+                Product.category_id,
+                func.count().label("products"),
+                func.count(case((Product.is_active.is_(True), 1))).label("active_products"),
+            )
+            .where(Product.category_id.in_(select(Category.id).where(in_subtree(Category.path, path))))
+            .group_by(Product.category_id)
+            .subquery()
+        )
+        root = aliased(Category)
+        result = await session.execute(
+            select(
+                root.id,
+                func.count(Category.id),
+                func.coalesce(func.sum(per_category.c.products), 0),
+                func.coalesce(func.sum(per_category.c.active_products), 0),
+            )
+            .select_from(root)
+            .join(Category, in_subtree_of(Category.path, root.path))
+            .outerjoin(per_category, per_category.c.category_id == Category.id)
+            # Все узлы лежат в поддереве category_id: диапазон по известному пути вместо полного прохода
+            .where(in_subtree(Category.path, path), or_(root.id == category_id, root.parent_id == category_id))
+            .group_by(root.id)
+            .order_by(root.id)
+        )
+        counts = {
+            row[0]: CategoryCounts(category_id=row[0], categories=row[1], products=row[2], active_products=row[3])
+            for row in result
+        }
+        total = counts.pop(category_id)
+        return CategoryCountsResponse(**total.model_dump(), children=list(counts.values()))
+
+    @staticmethod
+    async def delete(session: AsyncSession, category_id: int) -> Optional[tuple[list[str], list[str]]]:
+        """
+        Удалить категорию вместе с подкатегориями, их продуктами и файлами без загрузки сущностей
+
+        Returns:
+            Optional[tuple[list[str], list[str]]]: (изображения продуктов, пути файлов)
+            для удаления с диска или None если категория не найдена
+        """
+        await CategoryCRUD._lock_tree(session)
+        path = await CategoryCRUD._get_path(session, category_id)
+        if path is None:
+            await session.rollback()
+            return None
+        category_ids = select(Category.id).where(in_subtree(Category.path, path))
+        product_ids = select(Product.id).where(Product.category_id.in_(category_ids))
+        files_result = await session.execute(
+            delete(File)
+            .where(File.product_id.in_(product_ids))
+            .returning(File.id, File.path, File.product_id)
+        )
+        file_rows = files_result.all()
+
+        products_result = await session.execute(
+            delete(Product)
+            .where(Product.category_id.in_(category_ids))
+            .returning(Product.id, Product.image)
+        )
+        product_rows = products_result.all()
+
+        # Поддерево удаляется одним DELETE: ссылки parent_id проверяются в конце оператора
+        result = await session.execute(
+            delete(Category)
+            .where(in_subtree(Category.path, path))
+            .returning(Category.id)
+            .execution_options(synchronize_session=False)
+        )
+        deleted_ids = result.scalars().all()
+
+        await add_tombstones(session, "file", (file_row.id for file_row in file_rows))
+        await add_tombstones(session, "product", (product_row.id for product_row in product_rows))
+        await add_tombstones(session, "category", deleted_ids)
+        for file_row in file_rows:
+            record_change(session, "file", file_row.id, "delete", product_id=file_row.product_id)
+        for product_row in product_rows:
+            record_change(session, "product", product_row.id, "delete")
+        for deleted_id in deleted_ids:
+            record_change(session, "category", deleted_id, "delete")
         await session.commit()
+        return (
+            [product_row.image for product_row in product_rows if product_row.image],
+            [file_row.path for file_row in file_rows]
+        )
 
 
 category_crud = CategoryCRUD()
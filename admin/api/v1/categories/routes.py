@@ -1,15 +1,23 @@
+from typing import Optional
 from fastapi import APIRouter, HTTPException, status, Query
 
-from admin.api.v1.dependencies import DBSession
+from core.idempotency import IdempotentRoute, idempotent
+from admin.api.v1.dependencies import DBSession, Loaders
+from admin.api.v1.utils.file_utils import delete_product_image, delete_product_file
+from admin.api.v1.utils.fieldsets import get_field_set, model_response
+from admin.api.v1.utils.batch_utils import parse_ids, batch_response
 from .crud import category_crud
 from .schemas import (
     CategoryCreate,
     CategoryUpdate,
     CategoryResponse,
-    CategoryListResponse
+    CategoryListResponse,
+    CategoryBatchResponse,
+    CategoryCountsResponse
 )
 
-router = APIRouter(prefix="/categories", tags=["Categories"])
+# Создание принимает Idempotency-Key (core.idempotency), все маршруты - дедлайн (core.deadline)
+router = APIRouter(prefix="/categories", tags=["Categories"], route_class=IdempotentRoute)
 
 
 @router.post(
@@ -18,27 +26,46 @@ router = APIRouter(prefix="/categories", tags=["Categories"])
     status_code=status.HTTP_201_CREATED,
     summary="Создать категорию"
 )
+@idempotent
 async def create_category(
     category_in: CategoryCreate,
     session: DBSession
 ):
-    """Создать новую категорию"""
-    return await category_crud.create(session, category_in)
+    """Создать новую категорию (с parent_id - подкатегорию)"""
+    try:
+        return await category_crud.create(session, category_in)
+    except LookupError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
 
 
 @router.get(
     "/",
-    response_model=CategoryListResponse,
-    summary="Получить список категорий"
+    response_model=CategoryListResponse | CategoryBatchResponse,
+    summary="Получить список категорий или категории по ID"
 )
 async def get_categories(
-    session: DBSession,
+    loaders: Loaders,
+    ids: Optional[str] = Query(None, description="ID категорий через запятую: выборка по ID вместо страницы"),
     skip: int = Query(0, ge=0, description="Количество пропускаемых записей"),
-    limit: int = Query(100, ge=1, le=100, description="Максимальное количество записей")
+    limit: int = Query(100, ge=1, le=100, description="Максимальное количество записей"),
+    fields: Optional[str] = Query(None, description="Возвращаемые поля через запятую (id возвращается всегда)")
 ):
-    """Получить список всех категорий с пагинацией"""
-    categories, total = await category_crud.get_all(session, skip=skip, limit=limit)
-    return CategoryListResponse(items=categories, total=total)
+    """
+    Получить список всех категорий с пагинацией.
+    С ids= категории загружаются одним запросом и возвращаются в порядке ids;
+    ненайденные ID перечисляются в missing.
+    """
+    field_set = get_field_set(CategoryResponse, fields)
+    if ids is not None:
+        category_ids = parse_ids(ids)
+        categories = await loaders.get(category_crud.get_by_ids, field_set).load_many(category_ids)
+        return batch_response(CategoryResponse, CategoryBatchResponse, field_set, category_ids, categories)
+
+    page = await category_crud.get_list_response(skip=skip, limit=limit, fields=field_set)
+    return model_response(page)
 
 
 @router.get(
@@ -48,16 +75,42 @@ async def get_categories(
 )
 async def get_category(
     category_id: int,
-    session: DBSession
+    fields: Optional[str] = Query(None, description="Возвращаемые поля через запятую (id возвращается всегда)")
 ):
     """Получить категорию по ID"""
-    category = await category_crud.get_by_id(session, category_id)
+    field_set = get_field_set(CategoryResponse, fields)
+    if field_set is None:
+        category = await category_crud.get_cached(category_id)
+    else:
+        category = await category_crud.get_response(category_id, fields=field_set)
     if not category:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Категория с ID {category_id} не найдена"
         )
-    return category
+    return model_response(category)
+
+
+@router.get(
+    "/{category_id}/counts",
+    response_model=CategoryCountsResponse,
+    summary="Размер поддерева категории"
+)
+async def get_category_counts(
+    category_id: int,
+    session: DBSession
+):
+    """
+    Число категорий, продуктов и активных продуктов в поддереве категории
+    (вместе с ней самой) и в поддереве каждой ее прямой подкатегории
+    """
+    counts = await category_crud.get_counts(session, category_id)
+    if counts is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Категория с ID {category_id} не найдена"
+        )
+    return counts
 
 
 @router.patch(
@@ -70,14 +123,25 @@ async def update_category(
     category_update: CategoryUpdate,
     session: DBSession
 ):
-    """Обновить категорию"""
-    category = await category_crud.get_by_id(session, category_id)
+    """Обновить категорию; parent_id переносит ее вместе со всеми подкатегориями"""
+    try:
+        category = await category_crud.update(session, category_id, category_update)
+    except LookupError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     if not category:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Категория с ID {category_id} не найдена"
         )
-    return await category_crud.update(session, category, category_update)
+    return category
 
 
 @router.delete(
@@ -89,12 +153,18 @@ async def delete_category(
     category_id: int,
     session: DBSession
 ):
-    """Удалить категорию"""
-    category = await category_crud.get_by_id(session, category_id)
-    if not category:
+    """Удалить категорию вместе с подкатегориями, их продуктами и файлами"""
+    deleted = await category_crud.delete(session, category_id)
+    if deleted is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Категория с ID {category_id} не найдена"
         )
-    await category_crud.delete(session, category)
+    
+    # Удаляем изображения и файлы продуктов поддерева с диска
+    images, file_paths = deleted
+    for image in images:
+        delete_product_image(image)
+    for file_path in file_paths:
+        delete_product_file(file_path)
 
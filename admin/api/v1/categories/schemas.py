@@ -1,12 +1,13 @@
 from datetime import datetime
 from typing import Optional
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class CategoryBase(BaseModel):
     """Базовая схема для категории"""
     name: str
     description: Optional[str] = None
+    parent_id: Optional[int] = Field(None, description="Родительская категория (пусто - корень)")
 
 
 class CategoryCreate(CategoryBase):
@@ -18,11 +19,13 @@ class CategoryUpdate(BaseModel):
     """Схема для обновления категории"""
     name: Optional[str] = None
     description: Optional[str] = None
+    parent_id: Optional[int] = Field(None, description="Перенести под другую категорию (null - в корень)")
 
 
 class CategoryResponse(CategoryBase):
     """Схема ответа категории"""
     id: int
+    path: str = Field(description="ID предков и самой категории от корня через /")
     created_at: datetime
     updated_at: datetime
 
@@ -34,3 +37,22 @@ class CategoryListResponse(BaseModel):
     items: list[CategoryResponse]
     total: int
 
+
+class CategoryBatchResponse(BaseModel):
+    """Схема выборки категорий по ID (ids=)"""
+    items: list[CategoryResponse]
+    missing: list[int] = Field(default_factory=list, description="Запрошенные ID, которые не найдены")
+
+
+
+class CategoryCounts(BaseModel):
+    """Размер поддерева категории (с ней самой)"""
+    category_id: int
+    categories: int
+    products: int
+    active_products: int
+
+
+class CategoryCountsResponse(CategoryCounts):
+    """Размер поддерева категории и поддеревьев ее прямых подкатегорий"""
+    children: list[CategoryCounts]
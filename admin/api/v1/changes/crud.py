@@ -0,0 +1,172 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select, tuple_, TIMESTAMP
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import raiseload
+from sqlalchemy.sql import ColumnElement
+from sqlalchemy.sql.functions import FunctionElement
+
+from core.models.models import Category, Product, File, Tombstone
+
+# Позиция в потоке: (время изменения, ID) последней отданной записи
+Position = tuple[datetime, int]
+
+STREAMS = ("categories", "products", "files", "deleted")
+
+
+class lagged_now(FunctionElement):
+    """
+    Текущее время базы без зоны минус lag_seconds, вычисляемое в самом запросе
+
+    Колонки времени - TIMESTAMP без зоны, заполняемые now() базы, поэтому граница
+    считается в SQL в той же зоне сессии, а не передается параметром из Python:
+    now() в PostgreSQL возвращает время с зоной, и asyncpg не связывает его
+    с TIMESTAMP WITHOUT TIME ZONE.
+    """
+    type = TIMESTAMP()
+    inherit_cache = True
+
+    def __init__(self, lag_seconds: int):
+        self.lag_seconds = int(lag_seconds)
+        super().__init__()
+
+
+@compiles(lagged_now)
+def _lagged_now(element, compiler, **kw):
+    return f"LOCALTIMESTAMP - INTERVAL '{element.lag_seconds} seconds'"
+
+
+@compiles(lagged_now, "sqlite")
+def _lagged_now_sqlite(element, compiler, **kw):
+    # CURRENT_TIMESTAMP в SQLite - строка UTC того же формата, что и в колонках
+    return f"datetime('now', '-{element.lag_seconds} seconds')"
+
+
+def encode_cursor(positions: dict[str, Optional[Position]]) -> str:
+    """Упаковать позиции потоков в непрозрачный курсор"""
+    data = {
+        stream: [position[0].isoformat(), position[1]]
+        for stream, position in positions.items()
+        if position is not None
+    }
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> dict[str, Optional[Position]]:
+    """
+    Распаковать курсор в позиции потоков
+
+    Raises:
+        ValueError: Если курсор поврежден
+    """
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        positions = {
+            stream: (datetime.fromisoformat(data[stream][0]), int(data[stream][1]))
+            for stream in STREAMS
+            if stream in data
+        }
+    except (binascii.Error, UnicodeError, json.JSONDecodeError, TypeError, KeyError, IndexError) as e:
+        raise ValueError("Некорректный курсор") from e
+    return {stream: positions.get(stream) for stream in STREAMS}
+
+
+class ChangeCRUD:
+    """Чтение ленты изменений каталога"""
+
+    @staticmethod
+    def get_horizon(lag_seconds: int) -> Optional[ColumnElement]:
+        """
+        Граница, новее которой изменения еще не отдаются (выражение SQL)
+
+        updated_at выставляется временем начала транзакции, поэтому транзакция,
+        которая еще не зафиксирована, может позже записать строку "в прошлое".
+        Отставание ленты на lag_seconds не дает курсору перескочить такие строки.
+        """
+        if lag_seconds <= 0:
+            return None
+        return lagged_now(lag_seconds)
+
+    @staticmethod
+    async def get_changed(
+        session: AsyncSession,
+        model,
+        after: Optional[Position],
+        limit: int,
+        horizon: Optional[ColumnElement] = None,
+        options: tuple = ()
+    ) -> list:
+        """Получить записи, измененные после позиции, по индексу (updated_at, id)"""
+        return await ChangeCRUD._get_after(
+            session, select(model).options(*options), model.updated_at, model.id, after, limit, horizon
+        )
+
+    @staticmethod
+    async def get_deleted(
+        session: AsyncSession,
+        after: Optional[Position],
+        limit: int,
+        horizon: Optional[ColumnElement] = None
+    ) -> list[Tombstone]:
+        """Получить записи об удалениях после позиции"""
+        return await ChangeCRUD._get_after(
+            session, select(Tombstone), Tombstone.deleted_at, Tombstone.id, after, limit, horizon
+        )
+
+    @staticmethod
+    async def _get_after(session, query, time_column, id_column, after, limit, horizon) -> list:
+        if after is not None:
+            query = query.where(tuple_(time_column, id_column) > tuple_(*after))
+        if horizon is not None:
+            query = query.where(time_column <= horizon)
+        result = await session.execute(query.order_by(time_column, id_column).limit(limit))
+        return list(result.scalars().all())
+
+    @staticmethod
+    async def get_changes(
+        session: AsyncSession,
+        positions: dict[str, Optional[Position]],
+        limit: int,
+        lag_seconds: int = 0
+    ) -> tuple[dict[str, list], dict[str, Optional[Position]], bool]:
+        """
+        Получить изменения всех потоков после позиций курсора
+
+        Каждый поток читается независимо, не более limit записей.
+
+        Returns:
+            tuple: (записи по потокам, новые позиции, есть ли еще изменения)
+        """
+        horizon = ChangeCRUD.get_horizon(lag_seconds)
+        items = {
+            "categories": await ChangeCRUD.get_changed(
+                session, Category, positions["categories"], limit, horizon
+            ),
+            "products": await ChangeCRUD.get_changed(
+                session, Product, positions["products"], limit, horizon, (raiseload(Product.files),)
+            ),
+            "files": await ChangeCRUD.get_changed(
+                session, File, positions["files"], limit, horizon
+            ),
+            "deleted": await ChangeCRUD.get_deleted(
+                session, positions["deleted"], limit, horizon
+            ),
+        }
+
+        next_positions = dict(positions)
+        for stream, rows in items.items():
+            if rows:
+                last = rows[-1]
+                moment = last.deleted_at if stream == "deleted" else last.updated_at
+                next_positions[stream] = (moment, last.id)
+
+        has_more = any(len(rows) == limit for rows in items.values())
+        return items, next_positions, has_more
+
+
+change_crud = ChangeCRUD()
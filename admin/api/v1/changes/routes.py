@@ -0,0 +1,68 @@
+from datetime import datetime, timezone
+from typing import Optional
+from fastapi import APIRouter, HTTPException, status, Query
+
+from core.config import settings
+from core.deadline import DeadlineRoute
+from admin.api.v1.dependencies import DBSession
+from .crud import change_crud, STREAMS, encode_cursor, decode_cursor
+from .schemas import ChangeFeedResponse, DeletedEntity
+
+router = APIRouter(prefix="/changes", tags=["Changes"], route_class=DeadlineRoute)
+
+
+@router.get(
+    "/",
+    response_model=ChangeFeedResponse,
+    summary="Получить изменения каталога"
+)
+async def get_changes(
+    session: DBSession,
+    cursor: Optional[str] = Query(None, description="Курсор из next_cursor предыдущего ответа"),
+    updated_since: Optional[datetime] = Query(
+        None,
+        description="Начать с изменений после этого момента (если курсор не передан)"
+    ),
+    limit: int = Query(100, ge=1, le=500, description="Максимальное количество записей в каждом потоке")
+):
+    """
+    Получить категории, продукты и файлы, измененные после курсора, и удаленные сущности.
+    Без курсора и updated_since лента начинается с начала (полная синхронизация).
+    Пока has_more = true, следующую страницу нужно запросить сразу с next_cursor.
+    """
+    if cursor is not None:
+        try:
+            positions = decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+    else:
+        start = None
+        if updated_since is not None:
+            # В базе время хранится без зоны (UTC)
+            if updated_since.tzinfo is not None:
+                updated_since = updated_since.astimezone(timezone.utc).replace(tzinfo=None)
+            # ID 0 меньше любого реального - берутся все изменения начиная с этого момента
+            start = (updated_since, 0)
+        positions = {stream: start for stream in STREAMS}
+
+    items, next_positions, has_more = await change_crud.get_changes(
+        session,
+        positions,
+        limit,
+        settings.change_feed_lag_seconds
+    )
+
+    return ChangeFeedResponse(
+        categories=items["categories"],
+        products=items["products"],
+        files=items["files"],
+        deleted=[
+            DeletedEntity(entity=row.entity, id=row.entity_id, deleted_at=row.deleted_at)
+            for row in items["deleted"]
+        ],
+        next_cursor=encode_cursor(next_positions),
+        has_more=has_more
+    )
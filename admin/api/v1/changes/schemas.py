@@ -0,0 +1,37 @@
+from datetime import datetime
+from typing import Optional
+from pydantic import BaseModel, ConfigDict
+
+from admin.api.v1.categories.schemas import CategoryResponse
+from admin.api.v1.files.schemas import FileResponse
+from admin.api.v1.products.schemas import ProductBase
+
+
+class ProductChange(ProductBase):
+    """Схема измененного продукта (без файлов - они идут отдельным потоком)"""
+    id: int
+    external_id: Optional[str] = None
+    image_width: Optional[int] = None
+    image_height: Optional[int] = None
+    image_placeholder: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class DeletedEntity(BaseModel):
+    """Схема удаленной сущности"""
+    entity: str
+    id: int
+    deleted_at: datetime
+
+
+class ChangeFeedResponse(BaseModel):
+    """Схема ответа ленты изменений"""
+    categories: list[CategoryResponse]
+    products: list[ProductChange]
+    files: list[FileResponse]
+    deleted: list[DeletedEntity]
+    next_cursor: str
+    has_more: bool
@@ -2,6 +2,7 @@ from typing import Annotated
 from fastapi import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from core.dataloader import RequestLoaders
 from core.models.db_helper import db_helper
 
 
@@ -16,3 +17,14 @@ async def get_db_session() -> AsyncSession:
 # Аннотация для упрощения использования в роутах
 DBSession = Annotated[AsyncSession, Depends(get_db_session)]
 
+
+
+async def get_loaders(session: DBSession) -> RequestLoaders:
+    """
+    Зависимость для получения загрузчиков сущностей по ID в сессии запроса
+    """
+    return RequestLoaders(session)
+
+
+# Аннотация для загрузчиков: вместо цикла get_by_id по списку ID
+Loaders = Annotated[RequestLoaders, Depends(get_loaders)]
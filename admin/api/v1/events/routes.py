@@ -0,0 +1,95 @@
+import asyncio
+from typing import AsyncIterator, Optional
+from fastapi import APIRouter, Header, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+
+from core.events import broadcaster
+
+router = APIRouter(prefix="/events", tags=["Events"])
+
+SSE_RESET = "event: reset\ndata: {}\n\n"
+WS_RESET = '{"type": "reset"}'
+
+
+@router.get(
+    "/",
+    summary="Поток событий изменения каталога (SSE)"
+)
+async def stream_events(
+    last_event_id: Optional[str] = Header(None, description="ID последнего полученного события"),
+    last_event_id_query: Optional[str] = Query(
+        None,
+        alias="last_event_id",
+        description="То же, что заголовок Last-Event-ID"
+    )
+):
+    """
+    Server-Sent Events с событиями изменения категорий, продуктов и файлов:
+    `{"entity": ..., "id": ..., "op": "create|update|delete", "updated_at": ...}`.
+    При переподключении с Last-Event-ID пропущенные события повторяются из буфера.
+    Событие `reset` означает, что часть событий потеряна и нужна синхронизация
+    через ленту изменений (/changes).
+    """
+    subscriber, replay, need_reset = broadcaster.subscribe(last_event_id or last_event_id_query)
+
+    async def body() -> AsyncIterator[str]:
+        try:
+            if need_reset:
+                yield SSE_RESET
+            for message in replay:
+                yield message.sse
+            # None - подписчик отключен (не успевал читать или сброс), клиент переподключится
+            while (message := await subscriber.queue.get()) is not None:
+                yield message.sse
+        finally:
+            broadcaster.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # Отключаем буферизацию ответа в nginx
+            "X-Accel-Buffering": "no",
+        }
+    )
+
+
+@router.websocket("/ws")
+async def websocket_events(
+    websocket: WebSocket,
+    last_event_id: Optional[str] = Query(None, description="ID последнего полученного события")
+):
+    """WebSocket с теми же событиями, что и SSE поток"""
+    await websocket.accept()
+    subscriber, replay, need_reset = broadcaster.subscribe(last_event_id)
+
+    async def send() -> None:
+        if need_reset:
+            await websocket.send_text(WS_RESET)
+        for message in replay:
+            await websocket.send_text(message.ws)
+        while (message := await subscriber.queue.get()) is not None:
+            if message.ws is not None:
+                await websocket.send_text(message.ws)
+
+    async def receive() -> None:
+        # Сообщения клиента не используются, ждем только закрытия
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
+
+    sender = asyncio.create_task(send())
+    receiver = asyncio.create_task(receive())
+    try:
+        done, _ = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        sender.cancel()
+        receiver.cancel()
+        broadcaster.unsubscribe(subscriber)
+
+    # Отправка закончилась без ошибки - подписчик не успевал читать и отключен
+    if sender in done and sender.exception() is None:
+        await websocket.close(code=1013)
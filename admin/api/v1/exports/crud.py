@@ -0,0 +1,87 @@
+from datetime import datetime
+from typing import AsyncIterator, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.models.models import Product, File
+
+PRODUCT_COLUMNS = (
+    Product.id,
+    Product.external_id,
+    Product.name,
+    Product.description,
+    Product.image,
+    Product.image_width,
+    Product.image_height,
+    Product.image_placeholder,
+    Product.is_active,
+    Product.category_id,
+    Product.created_at,
+    Product.updated_at,
+)
+FILE_COLUMNS = (File.id, File.name, File.path, File.created_at, File.updated_at)
+
+# Поля выгрузки в порядке колонок CSV
+PRODUCT_FIELDS = [column.key for column in PRODUCT_COLUMNS]
+FILE_FIELDS = [column.key for column in FILE_COLUMNS]
+PRODUCT_EXPORT_FIELDS = PRODUCT_FIELDS + ["files"]
+
+
+class ExportCRUD:
+    """Потоковая выгрузка каталога"""
+
+    @staticmethod
+    async def iter_products(
+        session: AsyncSession,
+        batch_size: int,
+        category_id: Optional[int] = None,
+        is_active: Optional[bool] = None,
+        updated_since: Optional[datetime] = None
+    ) -> AsyncIterator[list[dict]]:
+        """
+        Выгрузить продукты вместе с файлами пачками
+
+        Продукты и файлы читаются одним запросом (LEFT JOIN, сортировка по ID
+        продукта) через серверный курсор: в памяти находится только текущая
+        пачка строк, без COUNT и OFFSET. Строки одного продукта идут подряд
+        и собираются в одну запись.
+
+        Args:
+            batch_size: Сколько строк результата забирать с сервера за раз
+            updated_since: Только продукты, измененные начиная с этого момента (UTC)
+        """
+        query = select(*PRODUCT_COLUMNS, *FILE_COLUMNS).outerjoin(File, File.product_id == Product.id)
+        if category_id is not None:
+            query = query.where(Product.category_id == category_id)
+        if is_active is not None:
+            query = query.where(Product.is_active == is_active)
+        if updated_since is not None:
+            query = query.where(Product.updated_at >= updated_since)
+        query = query.order_by(Product.id, File.id).execution_options(yield_per=batch_size)
+
+        product_size = len(PRODUCT_FIELDS)
+        current: Optional[dict] = None
+        result = await session.stream(query)
+        try:
+            async for rows in result.partitions():
+                batch = []
+                for row in rows:
+                    if current is None or current["id"] != row[0]:
+                        if current is not None:
+                            batch.append(current)
+                        current = dict(zip(PRODUCT_FIELDS, row[:product_size]))
+                        current["files"] = []
+                    # Продукт без файлов: поля файла пустые
+                    if row[product_size] is not None:
+                        current["files"].append(dict(zip(FILE_FIELDS, row[product_size:])))
+                if batch:
+                    yield batch
+        finally:
+            await result.close()
+
+        if current is not None:
+            yield [current]
+
+
+export_crud = ExportCRUD()
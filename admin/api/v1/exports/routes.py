@@ -0,0 +1,66 @@
+from datetime import datetime, timezone
+from typing import Literal, Optional
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import StreamingResponse
+
+from core.compression import accepts_encoding
+from core.config import settings
+from core.models import db_helper
+from admin.api.v1.utils.export_utils import (
+    EXPORT_MEDIA_TYPES,
+    iter_csv,
+    iter_encoded,
+    iter_ndjson,
+)
+from .crud import export_crud, PRODUCT_EXPORT_FIELDS
+
+router = APIRouter(prefix="/exports", tags=["Exports"])
+
+
+@router.get(
+    "/products",
+    response_class=StreamingResponse,
+    summary="Выгрузить продукты с файлами в NDJSON или CSV"
+)
+async def export_products(
+    request: Request,
+    format: Literal["ndjson", "csv"] = Query("ndjson", description="Формат выгрузки"),
+    category_id: Optional[int] = Query(None, gt=0, description="Только продукты категории"),
+    is_active: Optional[bool] = Query(None, description="Фильтр по активности"),
+    updated_since: Optional[datetime] = Query(None, description="Только продукты, измененные начиная с этого момента")
+):
+    """
+    Выгрузить весь каталог (или его часть по фильтрам) одним потоком.
+    Каждый продукт содержит список своих файлов; в CSV файлы записываются JSON строкой в колонке `files`.
+
+    Выгрузка читается одним запросом через серверный курсор, потребление памяти
+    не зависит от размера каталога. Если клиент принимает gzip (`Accept-Encoding`),
+    поток сжимается на лету.
+    """
+    if updated_since is not None and updated_since.tzinfo is not None:
+        # В базе время хранится без зоны (UTC)
+        updated_since = updated_since.astimezone(timezone.utc).replace(tzinfo=None)
+    compress = accepts_encoding(request.headers.get("accept-encoding"), "gzip")
+
+    async def iter_export():
+        # Своя сессия: сессия зависимости закрывается до окончания отдачи потока
+        async with db_helper.session_factory() as session:
+            batches = export_crud.iter_products(
+                session,
+                settings.export_batch_size,
+                category_id=category_id,
+                is_active=is_active,
+                updated_since=updated_since
+            )
+            chunks = iter_ndjson(batches) if format == "ndjson" else iter_csv(batches, PRODUCT_EXPORT_FIELDS)
+            async for data in iter_encoded(chunks, compress):
+                yield data
+
+    headers = {
+        "Content-Disposition": f"attachment; filename=\"products.{format}\"",
+        "Vary": "Accept-Encoding",
+    }
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+
+    return StreamingResponse(iter_export(), media_type=EXPORT_MEDIA_TYPES[format], headers=headers)
@@ -1,9 +1,19 @@
-from typing import Optional
-from sqlalchemy import select, func
+from typing import Optional, Sequence
+from sqlalchemy import select, func, insert, update, delete, Row
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+from pydantic import BaseModel
 
-from core.models.models import File
-from .schemas import FileCreate, FileUpdate
+from core.events import record_change
+from core.models import db_helper
+from core.models.models import File, Product
+from core.singleflight import coalesce, single_flight_group
+from admin.api.v1.utils.db_utils import add_tombstones
+from admin.api.v1.utils.fieldsets import get_sparse_schema, get_sparse_list_schema
+from .schemas import FileCreate, FileUpdate, FileResponse, FileListResponse
+
+# Одинаковые параллельные чтения файлов выполняются одним запросом
+file_reads = single_flight_group("files")
 
 
 class FileCRUD:
@@ -11,31 +21,94 @@ class FileCRUD:
 
     @staticmethod
     async def create(session: AsyncSession, file_in: FileCreate) -> File:
-        """Создать файл"""
-        file = File(**file_in.model_dump())
-        session.add(file)
+        """
+        Создать файл одним INSERT ... RETURNING
+
+        Raises:
+            IntegrityError: Если продукт не существует
+        """
+        result = await session.execute(
+            insert(File)
+            .values(**file_in.model_dump())
+            .returning(File)
+        )
+        file = result.scalar_one()
+        record_change(session, "file", file.id, "create", file.updated_at, file.product_id)
         await session.commit()
-        await session.refresh(file)
         return file
 
     @staticmethod
-    async def get_by_id(session: AsyncSession, file_id: int) -> Optional[File]:
+    def _load_options(fields: Optional[Sequence[str]] = None) -> list:
+        """Опции загрузки: только запрошенные колонки, без скрытых догрузок остальных"""
+        if fields is None:
+            return []
+        return [load_only(*(getattr(File, field) for field in fields), raiseload=True)]
+
+    @staticmethod
+    async def get_by_id(
+        session: AsyncSession,
+        file_id: int,
+        fields: Optional[Sequence[str]] = None
+    ) -> Optional[File]:
         """Получить файл по ID"""
         result = await session.execute(
-            select(File).where(File.id == file_id)
+            select(File)
+            .options(*FileCRUD._load_options(fields))
+            .where(File.id == file_id)
         )
         return result.scalar_one_or_none()
 
+    @staticmethod
+    async def get_by_ids(
+        session: AsyncSession,
+        file_ids: Sequence[int],
+        fields: Optional[Sequence[str]] = None
+    ) -> dict[int, File]:
+        """Получить файлы по списку ID одним запросом"""
+        result = await session.execute(
+            select(File)
+            .options(*FileCRUD._load_options(fields))
+            .where(File.id.in_(file_ids))
+        )
+        return {file.id: file for file in result.scalars()}
+
+    @staticmethod
+    @coalesce(file_reads, key=lambda file_id, fields=None: ("file", file_id, fields))
+    async def get_response(file_id: int, fields: Optional[tuple[str, ...]] = None) -> Optional[BaseModel]:
+        """
+        Получить файл схемой ответа (полной или только с полями fields)
+
+        Одинаковые параллельные вызовы объединяются в один запрос в своей сессии.
+        """
+        async with db_helper.session_factory() as session:
+            file = await FileCRUD.get_by_id(session, file_id, fields=fields)
+            if file is None:
+                return None
+            schema = FileResponse if fields is None else get_sparse_schema(FileResponse, fields)
+            return schema.model_validate(file)
+
+    @staticmethod
+    async def get_active_by_path(session: AsyncSession, paths: Sequence[str]) -> Optional[Row]:
+        """Получить имя файла активного продукта по одному из путей (name, path)"""
+        result = await session.execute(
+            select(File.name, File.path)
+            .join(Product, Product.id == File.product_id)
+            .where(File.path.in_(paths), Product.is_active.is_(True))
+            .limit(1)
+        )
+        return result.first()
+
     @staticmethod
     async def get_all(
         session: AsyncSession,
         skip: int = 0,
         limit: int = 100,
-        product_id: Optional[int] = None
+        product_id: Optional[int] = None,
+        fields: Optional[Sequence[str]] = None
     ) -> tuple[list[File], int]:
         """Получить список всех файлов с пагинацией и фильтрацией"""
         # Базовый запрос
-        query = select(File)
+        query = select(File).options(*FileCRUD._load_options(fields))
         count_query = select(func.count(File.id))
         
         # Применяем фильтры
@@ -53,26 +126,82 @@ class FileCRUD:
         files = result.scalars().all()
         return list(files), total
 
+    @staticmethod
+    @coalesce(file_reads, key=lambda **params: ("files", *sorted(params.items())))
+    async def get_list_response(
+        *,
+        skip: int = 0,
+        limit: int = 100,
+        product_id: Optional[int] = None,
+        fields: Optional[tuple[str, ...]] = None
+    ) -> BaseModel:
+        """Получить страницу файлов схемой ответа; одинаковые параллельные вызовы объединяются"""
+        async with db_helper.session_factory() as session:
+            files, total = await FileCRUD.get_all(
+                session,
+                skip=skip,
+                limit=limit,
+                product_id=product_id,
+                fields=fields
+            )
+            if fields is None:
+                return FileListResponse(items=files, total=total)
+            return get_sparse_list_schema(FileResponse, fields)(items=files, total=total)
+
     @staticmethod
     async def update(
         session: AsyncSession,
-        file: File,
+        file_id: int,
         file_update: FileUpdate
-    ) -> File:
-        """Обновить файл"""
+    ) -> Optional[File]:
+        """
+        Обновить файл одним UPDATE ... RETURNING
+
+        Returns:
+            Optional[File]: Обновленный файл или None если он не найден
+
+        Raises:
+            IntegrityError: Если новый продукт не существует
+        """
         update_data = file_update.model_dump(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(file, field, value)
-        
+        if not update_data:
+            return await FileCRUD.get_by_id(session, file_id)
+
+        result = await session.execute(
+            update(File)
+            .where(File.id == file_id)
+            .values(**update_data)
+            .returning(File)
+            .execution_options(populate_existing=True)
+        )
+        file = result.scalar_one_or_none()
+        if file is not None:
+            record_change(session, "file", file.id, "update", file.updated_at, file.product_id)
         await session.commit()
-        await session.refresh(file)
         return file
 
     @staticmethod
-    async def delete(session: AsyncSession, file: File) -> None:
-        """Удалить файл"""
-        await session.delete(file)
+    async def delete(session: AsyncSession, file_id: int) -> Optional[str]:
+        """
+        Удалить файл одним DELETE ... RETURNING
+
+        Returns:
+            Optional[str]: Путь к удаленному файлу или None если он не найден
+        """
+        result = await session.execute(
+            delete(File)
+            .where(File.id == file_id)
+            .returning(File.path, File.product_id)
+        )
+        row = result.one_or_none()
+        if row is None:
+            await session.rollback()
+            return None
+
+        await add_tombstones(session, "file", [file_id])
+        record_change(session, "file", file_id, "delete", product_id=row.product_id)
         await session.commit()
+        return row.path
 
 
 file_crud = FileCRUD()
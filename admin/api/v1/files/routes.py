@@ -1,19 +1,28 @@
 from typing import Optional
 from fastapi import APIRouter, HTTPException, status, Query, UploadFile, File as FastAPIFile
+from sqlalchemy.exc import IntegrityError
 
-from admin.api.v1.dependencies import DBSession
+from core.config import settings
+from core.idempotency import IdempotentRoute, idempotent
+from core.deadline import request_timeout
+from admin.api.v1.dependencies import DBSession, Loaders
 from admin.api.v1.utils.file_utils import save_product_file, delete_product_file
-from admin.api.v1.products.crud import product_crud
+from admin.api.v1.utils.db_utils import is_foreign_key_violation
+from admin.api.v1.utils.fieldsets import get_field_set, model_response
+from admin.api.v1.utils.batch_utils import parse_ids, batch_response
 from .crud import file_crud
 from .schemas import (
     FileCreate,
     FileUpdate,
     FileResponse,
     FileListResponse,
+    FileBatchResponse,
     FileUploadResponse
 )
 
-router = APIRouter(prefix="/files", tags=["Files"])
+# Создание и загрузки принимают Idempotency-Key (core.idempotency), загрузки файлов проходят
+# контроль допуска (core.admission), все маршруты - дедлайн (core.deadline)
+router = APIRouter(prefix="/files", tags=["Files"], route_class=IdempotentRoute)
 
 
 @router.post(
@@ -22,33 +31,59 @@ router = APIRouter(prefix="/files", tags=["Files"])
     status_code=status.HTTP_201_CREATED,
     summary="Создать файл"
 )
+@idempotent
 async def create_file(
     file_in: FileCreate,
     session: DBSession
 ):
     """Создать новый файл"""
-    return await file_crud.create(session, file_in)
+    try:
+        return await file_crud.create(session, file_in)
+    except IntegrityError as e:
+        if not is_foreign_key_violation(e):
+            raise
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Продукт с ID {file_in.product_id} не найден"
+        )
 
 
 @router.get(
     "/",
-    response_model=FileListResponse,
-    summary="Получить список файлов"
+    response_model=FileListResponse | FileBatchResponse,
+    summary="Получить список файлов или файлы по ID"
 )
 async def get_files(
-    session: DBSession,
+    loaders: Loaders,
+    ids: Optional[str] = Query(None, description="ID файлов через запятую: выборка по ID вместо страницы"),
     skip: int = Query(0, ge=0, description="Количество пропускаемых записей"),
     limit: int = Query(100, ge=1, le=100, description="Максимальное количество записей"),
-    product_id: Optional[int] = Query(None, description="Фильтр по продукту")
+    product_id: Optional[int] = Query(None, description="Фильтр по продукту"),
+    fields: Optional[str] = Query(None, description="Возвращаемые поля через запятую (id возвращается всегда)")
 ):
-    """Получить список всех файлов с пагинацией и фильтрацией"""
-    files, total = await file_crud.get_all(
-        session,
+    """
+    Получить список всех файлов с пагинацией и фильтрацией.
+    С ids= файлы загружаются одним запросом и возвращаются в порядке ids;
+    ненайденные ID перечисляются в missing.
+    """
+    field_set = get_field_set(FileResponse, fields)
+    if ids is not None:
+        if product_id is not None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="ids нельзя сочетать с фильтрами"
+            )
+        file_ids = parse_ids(ids)
+        files = await loaders.get(file_crud.get_by_ids, field_set).load_many(file_ids)
+        return batch_response(FileResponse, FileBatchResponse, field_set, file_ids, files)
+
+    page = await file_crud.get_list_response(
         skip=skip,
         limit=limit,
-        product_id=product_id
+        product_id=product_id,
+        fields=field_set
     )
-    return FileListResponse(items=files, total=total)
+    return model_response(page)
 
 
 @router.get(
@@ -58,16 +93,17 @@ async def get_files(
 )
 async def get_file(
     file_id: int,
-    session: DBSession
+    fields: Optional[str] = Query(None, description="Возвращаемые поля через запятую (id возвращается всегда)")
 ):
     """Получить файл по ID"""
-    file = await file_crud.get_by_id(session, file_id)
+    field_set = get_field_set(FileResponse, fields)
+    file = await file_crud.get_response(file_id, fields=field_set)
     if not file:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Файл с ID {file_id} не найден"
         )
-    return file
+    return model_response(file)
 
 
 @router.patch(
@@ -81,13 +117,22 @@ async def update_file(
     session: DBSession
 ):
     """Обновить файл"""
-    file = await file_crud.get_by_id(session, file_id)
+    try:
+        file = await file_crud.update(session, file_id, file_update)
+    except IntegrityError as e:
+        if not is_foreign_key_violation(e):
+            raise
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Продукт с ID {file_update.product_id} не найден"
+        )
+    
     if not file:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Файл с ID {file_id} не найден"
         )
-    return await file_crud.update(session, file, file_update)
+    return file
 
 
 @router.delete(
@@ -100,18 +145,16 @@ async def delete_file(
     session: DBSession
 ):
     """Удалить файл"""
-    file = await file_crud.get_by_id(session, file_id)
-    if not file:
+    file_path = await file_crud.delete(session, file_id)
+    if file_path is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Файл с ID {file_id} не найден"
         )
     
-    # Удаляем файл из файловой системы
-    if file.path:
-        delete_product_file(file.path)
-    
-    await file_crud.delete(session, file)
+    # Удаляем файл из файловой системы после фиксации транзакции
+    if file_path:
+        delete_product_file(file_path)
 
 
 @router.post(
@@ -120,6 +163,8 @@ async def delete_file(
     status_code=status.HTTP_201_CREATED,
     summary="Загрузить файл для продукта"
 )
+@request_timeout(settings.upload_request_timeout_seconds)
+@idempotent
 async def upload_product_file(
     product_id: int,
     session: DBSession,
@@ -127,35 +172,36 @@ async def upload_product_file(
 ):
     """
     Загрузить файл для продукта.
-    Файл будет сохранен в директории /files/{product_name}/
+    Файл будет сохранен в шардированной директории /files/ab/cd/
     
     Поддерживаемые форматы: PDF, DOC, DOCX, XLS, XLSX, PPT, PPTX, TXT, CSV, ODT, ODS
     """
-    # Проверяем существование продукта
-    product = await product_crud.get_by_id(session, product_id)
-    if not product:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Продукт с ID {product_id} не найден"
-        )
-    
     # Сохраняем файл в файловую систему
-    file_path = await save_product_file(file, product.name)
+    file_path = await save_product_file(file)
     
-    # Создаем запись в БД
+    # Создаем запись в БД; существование продукта проверяет внешний ключ
     file_create = FileCreate(
         name=file.filename or "unknown",
         path=file_path,
         product_id=product_id
     )
     
-    db_file = await file_crud.create(session, file_create)
+    try:
+        db_file = await file_crud.create(session, file_create)
+    except IntegrityError as e:
+        delete_product_file(file_path)
+        if not is_foreign_key_violation(e):
+            raise
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Продукт с ID {product_id} не найден"
+        )
     
     return FileUploadResponse(
         id=db_file.id,
         name=db_file.name,
         path=db_file.path,
         product_id=db_file.product_id,
-        message=f"Файл успешно загружен в /files/{product.name}/"
+        message=f"Файл успешно загружен в /files/{db_file.path}"
     )
 
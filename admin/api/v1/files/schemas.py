@@ -1,6 +1,6 @@
 from datetime import datetime
 from typing import Optional
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class FileBase(BaseModel):
@@ -37,6 +37,12 @@ class FileListResponse(BaseModel):
     total: int
 
 
+class FileBatchResponse(BaseModel):
+    """Схема выборки файлов по ID (ids=)"""
+    items: list[FileResponse]
+    missing: list[int] = Field(default_factory=list, description="Запрошенные ID, которые не найдены")
+
+
 class FileUploadResponse(BaseModel):
     """Схема ответа при загрузке файла"""
     id: int
@@ -0,0 +1,302 @@
+import time
+from operator import attrgetter
+from typing import AsyncIterator, Callable, Optional
+
+from pydantic import BaseModel, TypeAdapter, ValidationError
+from sqlalchemy import (
+    Boolean,
+    Column,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    case,
+    exists,
+    func,
+    insert,
+    or_,
+    select,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.schema import CreateTable, DropTable
+
+from core.config import settings
+from core.events import record_reset
+from core.models.models import Category, Product, File
+from .schemas import ProductImportRow, FileImportRow, ImportRowError, ImportReport
+
+# Промежуточные таблицы живут только в транзакции импорта
+staging_metadata = MetaData()
+
+product_staging = Table(
+    "import_products",
+    staging_metadata,
+    Column("source_row", Integer, nullable=False),
+    Column("external_id", String, nullable=False),
+    Column("name", String, nullable=False),
+    Column("description", String),
+    Column("image", String),
+    Column("is_active", Boolean, nullable=False),
+    Column("category_id", Integer, nullable=False),
+    prefixes=["TEMPORARY"],
+    postgresql_on_commit="DROP",
+)
+
+file_staging = Table(
+    "import_files",
+    staging_metadata,
+    Column("source_row", Integer, nullable=False),
+    Column("product_external_id", String, nullable=False),
+    Column("name", String, nullable=False),
+    Column("path", String, nullable=False),
+    prefixes=["TEMPORARY"],
+    postgresql_on_commit="DROP",
+)
+
+# Проверка целой пачки одним вызовом pydantic
+BATCH_ADAPTERS = {
+    ProductImportRow: TypeAdapter(list[ProductImportRow]),
+    FileImportRow: TypeAdapter(list[FileImportRow]),
+}
+
+# (прочитано строк, валидных, с ошибками) после каждой пачки
+ProgressCallback = Callable[[int, int, int], None]
+
+
+def _format_validation_error(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc']) or 'row'}: {item['msg']}"
+        for item in error.errors(include_url=False)
+    )
+
+
+class CatalogImportCRUD:
+    """
+    Массовый импорт продуктов и файлов
+
+    Строки проверяются pydantic схемой пачками и складываются во временную
+    таблицу: на PostgreSQL через COPY (asyncpg copy_records_to_table),
+    на других СУБД через executemany. Затем одна операция INSERT ... SELECT
+    ... ON CONFLICT DO UPDATE переносит их в основную таблицу. Если строка
+    повторяется в источнике, побеждает последняя. Неизмененные записи
+    не перезаписываются, поэтому повторный импорт не засоряет ленту изменений.
+    """
+
+    @staticmethod
+    async def _create_staging(session: AsyncSession, table: Table) -> None:
+        await session.execute(DropTable(table, if_exists=True))
+        await session.execute(CreateTable(table))
+
+    @staticmethod
+    async def _stage(session: AsyncSession, table: Table, records: list[tuple]) -> None:
+        """Загрузить пачку проверенных строк во временную таблицу"""
+        if not records:
+            return
+        connection = await session.connection()
+        raw_connection = (await connection.get_raw_connection()).driver_connection
+        if connection.dialect.name == "postgresql":
+            await raw_connection.copy_records_to_table(
+                table.name,
+                records=records,
+                columns=[column.name for column in table.columns]
+            )
+        else:
+            # executemany драйвера с кортежами: без построения параметров на каждую строку в SQLAlchemy
+            statement = str(insert(table).compile(dialect=connection.dialect))
+            await raw_connection.executemany(statement, records)
+
+    @staticmethod
+    async def _upsert_insert(session: AsyncSession):
+        connection = await session.connection()
+        return postgresql.insert if connection.dialect.name == "postgresql" else sqlite.insert
+
+    @staticmethod
+    def _latest(table: Table, *key: Column):
+        """Последнее вхождение каждого ключа в источнике"""
+        return select(
+            table,
+            func.row_number().over(partition_by=key, order_by=table.c.source_row.desc()).label("rank")
+        ).subquery()
+
+    @staticmethod
+    async def _merge_products(session: AsyncSession, max_errors: int) -> tuple[int, int, list[ImportRowError]]:
+        ranked = CatalogImportCRUD._latest(product_staging, product_staging.c.external_id)
+        category_exists = exists().where(Category.id == ranked.c.category_id)
+        columns = ["external_id", "name", "description", "image", "is_active", "category_id"]
+
+        upsert = (await CatalogImportCRUD._upsert_insert(session))(Product).from_select(
+            columns,
+            select(*(ranked.c[column] for column in columns)).where(ranked.c.rank == 1, category_exists)
+        )
+        excluded = upsert.excluded
+        image_changed = Product.image.is_distinct_from(excluded.image)
+        upsert = upsert.on_conflict_do_update(
+            index_elements=[Product.external_id],
+            set_={
+                "name": excluded.name,
+                "description": excluded.description,
+                "image": excluded.image,
+                "is_active": excluded.is_active,
+                "category_id": excluded.category_id,
+                # Метаданные старого изображения к новому пути не относятся
+                "image_width": case((image_changed, None), else_=Product.image_width),
+                "image_height": case((image_changed, None), else_=Product.image_height),
+                "image_placeholder": case((image_changed, None), else_=Product.image_placeholder),
+                "updated_at": func.now(),
+            },
+            where=or_(*(
+                getattr(Product, column).is_distinct_from(excluded[column])
+                for column in columns[1:]
+            ))
+        )
+        imported = (await session.execute(upsert)).rowcount
+
+        missing = select(product_staging.c.source_row, product_staging.c.category_id).where(
+            ~exists().where(Category.id == product_staging.c.category_id)
+        )
+        return imported, *await CatalogImportCRUD._missing_errors(
+            session,
+            missing,
+            max_errors,
+            lambda row: f"category_id: категория с ID {row.category_id} не найдена"
+        )
+
+    @staticmethod
+    async def _merge_files(session: AsyncSession, max_errors: int) -> tuple[int, int, list[ImportRowError]]:
+        ranked = CatalogImportCRUD._latest(file_staging, file_staging.c.product_external_id, file_staging.c.path)
+
+        upsert = (await CatalogImportCRUD._upsert_insert(session))(File).from_select(
+            ["name", "path", "product_id"],
+            select(ranked.c.name, ranked.c.path, Product.id)
+            .join(Product, Product.external_id == ranked.c.product_external_id)
+            .where(ranked.c.rank == 1)
+        )
+        excluded = upsert.excluded
+        upsert = upsert.on_conflict_do_update(
+            index_elements=[File.product_id, File.path],
+            set_={"name": excluded.name, "updated_at": func.now()},
+            where=File.name.is_distinct_from(excluded.name)
+        )
+        imported = (await session.execute(upsert)).rowcount
+
+        missing = select(file_staging.c.source_row, file_staging.c.product_external_id).where(
+            ~exists().where(Product.external_id == file_staging.c.product_external_id)
+        )
+        return imported, *await CatalogImportCRUD._missing_errors(
+            session,
+            missing,
+            max_errors,
+            lambda row: f"product_external_id: продукт с артикулом {row.product_external_id} не найден"
+        )
+
+    @staticmethod
+    async def _missing_errors(session: AsyncSession, missing, max_errors: int, message) -> tuple[int, list[ImportRowError]]:
+        """Строки, ссылающиеся на несуществующие записи: (количество, первые ошибки)"""
+        count = (await session.execute(select(func.count()).select_from(missing.subquery()))).scalar_one()
+        if not count or max_errors <= 0:
+            return count, []
+        result = await session.execute(missing.order_by(missing.selected_columns.source_row).limit(max_errors))
+        return count, [ImportRowError(row=row.source_row, error=message(row)) for row in result]
+
+    @staticmethod
+    def _validate(
+        schema: type[BaseModel],
+        fields: list[str],
+        batch: list[tuple[int, dict | Exception]]
+    ) -> tuple[list[tuple], list[ImportRowError]]:
+        """
+        Проверить пачку строк схемой: (записи для временной таблицы, ошибки строк)
+
+        Пачка проверяется одним вызовом; строки проверяются по одной, только если
+        в пачке есть ошибки, чтобы вернуть ошибку каждой строки.
+        """
+        get_values = attrgetter(*fields)
+        parsed = [(number, data) for number, data in batch if not isinstance(data, Exception)]
+        errors = [
+            ImportRowError(row=number, error=str(data))
+            for number, data in batch
+            if isinstance(data, Exception)
+        ]
+        try:
+            items = BATCH_ADAPTERS[schema].validate_python([data for _, data in parsed])
+        except ValidationError:
+            pass
+        else:
+            return [(number, *get_values(item)) for (number, _), item in zip(parsed, items)], errors
+
+        records = []
+        for number, data in parsed:
+            try:
+                item = schema.model_validate(data)
+            except ValidationError as e:
+                errors.append(ImportRowError(row=number, error=_format_validation_error(e)))
+            else:
+                records.append((number, *get_values(item)))
+        return records, sorted(errors, key=lambda error: error.row)
+
+    @staticmethod
+    async def run(
+        session: AsyncSession,
+        kind: str,
+        batches: AsyncIterator[list[tuple[int, dict | Exception]]],
+        on_progress: Optional[ProgressCallback] = None,
+        max_errors: Optional[int] = None
+    ) -> ImportReport:
+        """
+        Импортировать продукты ("products") или файлы ("files") одной транзакцией
+
+        Args:
+            batches: Пачки строк (номер строки, поля или ошибка разбора)
+            on_progress: Вызывается после каждой пачки
+            max_errors: Сколько ошибок вернуть в отчете (по умолчанию из настроек)
+        """
+        if max_errors is None:
+            max_errors = settings.import_max_errors
+        schema: type[BaseModel]
+        if kind == "products":
+            schema, table, merge = ProductImportRow, product_staging, CatalogImportCRUD._merge_products
+        else:
+            schema, table, merge = FileImportRow, file_staging, CatalogImportCRUD._merge_files
+        fields = [column.name for column in table.columns][1:]
+
+        started = time.perf_counter()
+        rows = valid = failed = 0
+        errors: list[ImportRowError] = []
+        await CatalogImportCRUD._create_staging(session, table)
+
+        async for batch in batches:
+            records, batch_errors = CatalogImportCRUD._validate(schema, fields, batch)
+            rows += len(batch)
+            failed += len(batch_errors)
+            errors.extend(batch_errors[:max_errors - len(errors)])
+
+            valid += len(records)
+            await CatalogImportCRUD._stage(session, table, records)
+            if on_progress is not None:
+                on_progress(rows, valid, failed)
+
+        imported, missing, missing_errors = await merge(session, max_errors - len(errors))
+        failed += missing
+        errors = sorted(errors + missing_errors, key=lambda error: error.row)
+
+        await session.execute(DropTable(table, if_exists=True))
+        # Вместо события на каждую строку - один сброс подписчиков и кэшей
+        if imported:
+            record_reset(session)
+        await session.commit()
+
+        duration = time.perf_counter() - started
+        return ImportReport(
+            kind=kind,
+            rows=rows,
+            valid=valid - missing,
+            imported=imported,
+            failed=failed,
+            errors=errors,
+            duration_seconds=round(duration, 3),
+            rows_per_second=round(rows / duration, 1) if duration else 0.0
+        )
+
+
+catalog_import_crud = CatalogImportCRUD()
@@ -0,0 +1,54 @@
+from typing import Literal, Optional
+from fastapi import APIRouter, HTTPException, Query, Request, status
+
+from core.config import settings
+from core.deadline import DeadlineRoute, request_timeout
+from admin.api.v1.dependencies import DBSession
+from admin.api.v1.utils.import_utils import detect_import_format, iter_import_rows
+from .crud import catalog_import_crud
+from .schemas import ImportReport
+
+router = APIRouter(prefix="/imports", tags=["Imports"], route_class=DeadlineRoute)
+
+
+@router.post(
+    "/{kind}",
+    response_model=ImportReport,
+    summary="Импортировать продукты или файлы из CSV/JSONL"
+)
+# Импорт большого файла идет минуты: дедлайн только по X-Request-Timeout
+@request_timeout(None)
+async def import_catalog(
+    kind: Literal["products", "files"],
+    request: Request,
+    session: DBSession,
+    format: Optional[Literal["csv", "jsonl"]] = Query(
+        None,
+        description="Формат тела запроса (по умолчанию - по Content-Type)"
+    ),
+    batch_size: int = Query(
+        settings.import_batch_size,
+        ge=100,
+        le=100_000,
+        description="Размер пачки валидации и загрузки"
+    )
+):
+    """
+    Импортировать CSV (с заголовком) или JSONL из тела запроса одной транзакцией.
+    Тело читается потоком, в памяти находится только текущая пачка.
+
+    - **products**: `external_id`, `name`, `description`, `image`, `is_active`, `category_id`
+    - **files**: `product_external_id`, `name`, `path`
+
+    Существующие записи обновляются по ключу (`external_id` для продуктов,
+    продукт + `path` для файлов). Ошибочные строки пропускаются и попадают в отчет.
+    """
+    import_format = format or detect_import_format(request.headers.get("content-type"))
+    if import_format is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Не удалось определить формат. Укажите format=csv|jsonl или Content-Type"
+        )
+
+    batches = iter_import_rows(request.stream(), import_format, batch_size)
+    return await catalog_import_crud.run(session, kind, batches)
@@ -0,0 +1,33 @@
+from pydantic import BaseModel, Field
+
+from admin.api.v1.products.schemas import ProductCreate
+
+
+class ProductImportRow(ProductCreate):
+    """Строка импорта продукта"""
+    external_id: str = Field(..., min_length=1, description="Артикул поставщика (ключ импорта)")
+
+
+class FileImportRow(BaseModel):
+    """Строка импорта файла продукта"""
+    product_external_id: str = Field(..., min_length=1, description="Артикул продукта")
+    name: str
+    path: str
+
+
+class ImportRowError(BaseModel):
+    """Ошибка в строке источника"""
+    row: int
+    error: str
+
+
+class ImportReport(BaseModel):
+    """Результат импорта"""
+    kind: str
+    rows: int = Field(..., description="Строк в источнике")
+    valid: int = Field(..., description="Строк, прошедших валидацию")
+    imported: int = Field(..., description="Создано или изменено записей")
+    failed: int = Field(..., description="Строк с ошибками")
+    errors: list[ImportRowError] = Field(..., description="Первые ошибки (не больше import_max_errors)")
+    duration_seconds: float
+    rows_per_second: float
@@ -0,0 +1,131 @@
+from typing import Literal
+
+from fastapi import APIRouter, HTTPException, Query, status
+from fastapi.responses import FileResponse
+
+from core.access_log import AccessLogStats, access_log
+from core.admission import AdmissionStats, upload_admission
+from core.loop_monitor import LoopLagStats, loop_monitor
+from core.profiling import ProfileInfo, get_profile_path, list_profiles
+from core.slow_queries import QueryStats, SlowQuery, slow_query_log
+from core.singleflight import SingleFlightStats, single_flight_stats
+
+router = APIRouter(prefix="/metrics", tags=["Metrics"])
+
+
+@router.get(
+    "/uploads",
+    response_model=AdmissionStats,
+    summary="Метрики контроля допуска загрузок"
+)
+async def get_upload_metrics():
+    """
+    Текущее состояние контроля допуска загрузок воркера, обработавшего запрос:
+    активные загрузки, занятый объем, глубина очереди и счетчики отказов.
+    Счетчики накапливаются с запуска воркера.
+    """
+    return upload_admission.stats()
+
+
+@router.get(
+    "/single-flight",
+    response_model=list[SingleFlightStats],
+    summary="Метрики объединения одинаковых чтений"
+)
+async def get_single_flight_metrics():
+    """
+    Для каждой группы чтений (продукты, категории, файлы) воркера, обработавшего запрос:
+    сколько запросов к базе выполнено, сколько запросов присоединилось к уже
+    выполняющимся и сколько общих запросов отменено, потому что их никто не ждал.
+    """
+    return single_flight_stats()
+
+
+@router.get(
+    "/event-loop",
+    response_model=LoopLagStats,
+    summary="Задержка цикла событий"
+)
+async def get_event_loop_metrics():
+    """
+    Гистограмма задержки цикла событий воркера, обработавшего запрос (накопительные
+    корзины le в мс, как у Prometheus), максимум, последний замер и число блокировок,
+    замеченных в отладочном режиме. Задержка - на сколько позже срока проснулась
+    задача, засыпающая на interval_ms.
+    """
+    return loop_monitor.stats()
+
+
+@router.get(
+    "/access-log",
+    response_model=AccessLogStats,
+    summary="Счетчики журнала запросов"
+)
+async def get_access_log_metrics():
+    """
+    Сколько запросов воркера записано в журнал, сколько пропущено по доле записи,
+    сколько записей отброшено из-за заполненной очереди и сколько ждут записи.
+    """
+    return access_log.stats()
+
+
+@router.get(
+    "/queries",
+    response_model=list[QueryStats],
+    summary="Самые дорогие запросы к базе"
+)
+async def get_query_metrics(
+    order_by: Literal["total", "p95", "count", "max"] = Query("total", description="Порядок сортировки"),
+    limit: int = Query(20, ge=1, le=1000, description="Количество запросов")
+):
+    """
+    Статистика нормализованных запросов воркера, обработавшего запрос:
+    число выполнений, суммарное, среднее, p95 и максимальное время в мс
+    и сколько раз запрос превысил slow_query_threshold_ms.
+    """
+    return slow_query_log.top(limit, order_by)
+
+
+@router.get(
+    "/slow-queries",
+    response_model=list[SlowQuery],
+    summary="Последние медленные запросы"
+)
+async def get_slow_queries():
+    """
+    Последние запросы дольше slow_query_threshold_ms: нормализованный SQL,
+    параметры (секреты скрыты), маршрут, длительность и план EXPLAIN (ANALYZE, BUFFERS),
+    если он снимался (PostgreSQL, доля slow_query_explain_sample_rate).
+    """
+    return slow_query_log.recent()
+
+
+@router.get(
+    "/profiles",
+    response_model=list[ProfileInfo],
+    summary="Список профилей запросов"
+)
+async def get_profiles():
+    """
+    Профили запросов, снятые воркерами по токену X-Profile или по доле
+    profiling_sample_rate, новые первыми. Хранятся последние profiling_max_files.
+    """
+    return list_profiles()
+
+
+@router.get(
+    "/profiles/{name}",
+    summary="Скачать профиль запроса"
+)
+async def get_profile(name: str):
+    """
+    Файл профиля: *.speedscope.json открывается в https://www.speedscope.app,
+    *.pstats - через python -m pstats или snakeviz.
+    """
+    path = get_profile_path(name)
+    if path is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Профиль не найден"
+        )
+    return FileResponse(path, filename=path.name)
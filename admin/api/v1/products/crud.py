@@ -1,10 +1,22 @@
-from typing import Optional
-from sqlalchemy import select, func
+from typing import Optional, Sequence
+from sqlalchemy import select, func, insert, update, delete, case, Row
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import selectinload, load_only, raiseload
+from sqlalchemy.orm.attributes import set_committed_value
+from pydantic import BaseModel
 
-from core.models.models import Product
-from .schemas import ProductCreate, ProductUpdate
+from core.cache import entity_cache
+from core.events import record_change
+from core.models import db_helper
+from core.models.models import Product, File
+from core.singleflight import coalesce, single_flight_group
+from admin.api.v1.utils.db_utils import add_tombstones
+from admin.api.v1.utils.fieldsets import get_sparse_schema, get_sparse_list_schema
+from admin.api.v1.utils.tree_utils import subtree_category_ids
+from .schemas import ProductCreate, ProductUpdate, ProductResponse, ProductListResponse
+
+# Одинаковые параллельные чтения продуктов выполняются одним запросом
+product_reads = single_flight_group("products")
 
 
 class ProductCRUD:
@@ -12,40 +24,139 @@ class ProductCRUD:
 
     @staticmethod
     async def create(session: AsyncSession, product_in: ProductCreate) -> Product:
-        """Создать продукт"""
-        product = Product(**product_in.model_dump())
-        session.add(product)
+        """
+        Создать продукт одним INSERT ... RETURNING
+
+        Raises:
+            IntegrityError: Если категория не существует
+        """
+        result = await session.execute(
+            insert(Product)
+            .values(**product_in.model_dump())
+            .returning(Product)
+        )
+        product = result.scalar_one()
+        # У нового продукта файлов нет - не даем ORM догружать их отдельным запросом
+        set_committed_value(product, "files", [])
+        record_change(session, "product", product.id, "create", product.updated_at, category_id=product.category_id)
         await session.commit()
-        await session.refresh(product)
         return product
 
     @staticmethod
-    async def get_by_id(session: AsyncSession, product_id: int) -> Optional[Product]:
+    def _load_options(fields: Optional[Sequence[str]] = None) -> list:
+        """
+        Опции загрузки для набора полей ответа
+
+        Без fields загружаются все колонки и файлы. С fields в SELECT попадают
+        только запрошенные колонки, а файлы загружаются только если "files" в наборе.
+        Обращение к незагруженным атрибутам вызывает ошибку вместо скрытого запроса.
+        """
+        if fields is None:
+            return [selectinload(Product.files)]
+
+        columns = [getattr(Product, field) for field in fields if field != "files"]
+        files_option = selectinload(Product.files) if "files" in fields else raiseload(Product.files)
+        return [load_only(*columns, raiseload=True), files_option]
+
+    @staticmethod
+    async def get_by_id(
+        session: AsyncSession,
+        product_id: int,
+        fields: Optional[Sequence[str]] = None
+    ) -> Optional[Product]:
         """Получить продукт по ID"""
         result = await session.execute(
             select(Product)
-            .options(selectinload(Product.files))
+            .options(*ProductCRUD._load_options(fields))
             .where(Product.id == product_id)
         )
         return result.scalar_one_or_none()
 
+    @staticmethod
+    async def get_by_ids(
+        session: AsyncSession,
+        product_ids: Sequence[int],
+        fields: Optional[Sequence[str]] = None
+    ) -> dict[int, Product]:
+        """Получить продукты по списку ID одним запросом (файлы - одним дополнительным запросом)"""
+        result = await session.execute(
+            select(Product)
+            .options(*ProductCRUD._load_options(fields))
+            .where(Product.id.in_(product_ids))
+        )
+        return {product.id: product for product in result.scalars()}
+
+    @staticmethod
+    @coalesce(product_reads, key=lambda product_id, fields=None: ("product", product_id, fields))
+    async def get_response(product_id: int, fields: Optional[tuple[str, ...]] = None) -> Optional[BaseModel]:
+        """
+        Получить продукт схемой ответа (полной или только с полями fields)
+
+        Одинаковые параллельные вызовы объединяются в один запрос в своей сессии.
+        """
+        async with db_helper.session_factory() as session:
+            product = await ProductCRUD.get_by_id(session, product_id, fields=fields)
+            if product is None:
+                return None
+            schema = ProductResponse if fields is None else get_sparse_schema(ProductResponse, fields)
+            return schema.model_validate(product)
+
+    @staticmethod
+    async def get_cached(product_id: int) -> Optional[ProductResponse]:
+        """Получить полный продукт с файлами через кэш воркера"""
+        return await entity_cache.get_or_load(
+            ("product", product_id),
+            lambda: ProductCRUD.get_response(product_id),
+            lambda product: [("file", file.id) for file in product.files]
+        )
+
+    @staticmethod
+    async def get_columns(session: AsyncSession, product_id: int, *columns: str) -> Optional[Row]:
+        """Получить отдельные колонки продукта по ID без загрузки сущности и файлов"""
+        result = await session.execute(
+            select(*(getattr(Product, column) for column in columns))
+            .where(Product.id == product_id)
+        )
+        return result.one_or_none()
+
+    @staticmethod
+    async def has_active_image(session: AsyncSession, paths: Sequence[str]) -> bool:
+        """Проверить, что изображение по одному из путей принадлежит активному продукту"""
+        result = await session.execute(
+            select(Product.id)
+            .where(Product.image.in_(paths), Product.is_active.is_(True))
+            .limit(1)
+        )
+        return result.first() is not None
+
     @staticmethod
     async def get_all(
         session: AsyncSession,
         skip: int = 0,
         limit: int = 100,
         category_id: Optional[int] = None,
-        is_active: Optional[bool] = None
+        is_active: Optional[bool] = None,
+        fields: Optional[Sequence[str]] = None,
+        include_descendants: bool = False
     ) -> tuple[list[Product], int]:
-        """Получить список всех продуктов с пагинацией и фильтрацией"""
+        """
+        Получить список всех продуктов с пагинацией и фильтрацией
+
+        С include_descendants фильтр category_id включает продукты всех подкатегорий:
+        ID категорий поддерева выбираются в том же запросе по индексу пути.
+        """
         # Базовый запрос
-        query = select(Product).options(selectinload(Product.files))
+        query = select(Product).options(*ProductCRUD._load_options(fields))
         count_query = select(func.count(Product.id))
         
         # Применяем фильтры
         if category_id is not None:
-            query = query.where(Product.category_id == category_id)
-            count_query = count_query.where(Product.category_id == category_id)
+            if include_descendants:
+                category_filter = Product.category_id.in_(subtree_category_ids(category_id))
+            else:
+                category_filter = Product.category_id == category_id
+            query = query.where(category_filter)
+            count_query = count_query.where(category_filter)
         
         if is_active is not None:
             query = query.where(Product.is_active == is_active)
@@ -61,27 +172,130 @@ class ProductCRUD:
         products = result.scalars().all()
         return list(products), total
 
+    @staticmethod
+    @coalesce(product_reads, key=lambda **filters: ("products", *sorted(filters.items())))
+    async def get_list_response(
+        *,
+        skip: int = 0,
+        limit: int = 100,
+        category_id: Optional[int] = None,
+        is_active: Optional[bool] = None,
+        fields: Optional[tuple[str, ...]] = None,
+        include_descendants: bool = False
+    ) -> BaseModel:
+        """Получить страницу продуктов схемой ответа; одинаковые параллельные вызовы объединяются"""
+        async with db_helper.session_factory() as session:
+            products, total = await ProductCRUD.get_all(
+                session,
+                skip=skip,
+                limit=limit,
+                category_id=category_id,
+                is_active=is_active,
+                fields=fields,
+                include_descendants=include_descendants
+            )
+            if fields is None:
+                return ProductListResponse(items=products, total=total)
+            return get_sparse_list_schema(ProductResponse, fields)(items=products, total=total)
+
+    @staticmethod
+    async def _update_returning(session: AsyncSession, product_id: int, values: dict) -> Optional[Product]:
+        """UPDATE ... RETURNING с подгрузкой файлов одним дополнительным запросом"""
+        result = await session.execute(
+            update(Product)
+            .where(Product.id == product_id)
+            .values(**values)
+            .returning(Product)
+            .options(selectinload(Product.files))
+            .execution_options(populate_existing=True)
+        )
+        product = result.scalar_one_or_none()
+        if product is not None:
+            record_change(session, "product", product.id, "update", product.updated_at, category_id=product.category_id)
+        await session.commit()
+        return product
+
     @staticmethod
     async def update(
         session: AsyncSession,
-        product: Product,
+        product_id: int,
         product_update: ProductUpdate
-    ) -> Product:
-        """Обновить продукт"""
+    ) -> Optional[Product]:
+        """
+        Обновить продукт без предварительного SELECT
+
+        Returns:
+            Optional[Product]: Обновленный продукт или None если он не найден
+
+        Raises:
+            IntegrityError: Если новая категория не существует
+        """
         update_data = product_update.model_dump(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(product, field, value)
-        
-        await session.commit()
-        await session.refresh(product)
-        return product
+        if not update_data:
+            return await ProductCRUD.get_by_id(session, product_id)
+
+        # Метаданные старого изображения к новому пути не относятся
+        if "image" in update_data:
+            image_unchanged = Product.image.is_not_distinct_from(update_data["image"])
+            for column in (Product.image_width, Product.image_height, Product.image_placeholder):
+                update_data[column.key] = case((image_unchanged, column), else_=None)
+
+        return await ProductCRUD._update_returning(session, product_id, update_data)
+
+    @staticmethod
+    async def update_image(
+        session: AsyncSession,
+        product_id: int,
+        image: str,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+        placeholder: Optional[str] = None
+    ) -> Optional[Product]:
+        """Сохранить путь к изображению продукта и его метаданные"""
+        return await ProductCRUD._update_returning(
+            session,
+            product_id,
+            {
+                "image": image,
+                "image_width": width,
+                "image_height": height,
+                "image_placeholder": placeholder,
+            }
+        )
 
     @staticmethod
-    async def delete(session: AsyncSession, product: Product) -> None:
-        """Удалить продукт"""
-        await session.delete(product)
+    async def delete(session: AsyncSession, product_id: int) -> Optional[tuple[Optional[str], list[str]]]:
+        """
+        Удалить продукт вместе с его файлами без загрузки сущностей
+
+        Returns:
+            Optional[tuple[Optional[str], list[str]]]: (изображение, пути файлов)
+            для удаления с диска или None если продукт не найден
+        """
+        files_result = await session.execute(
+            delete(File)
+            .where(File.product_id == product_id)
+            .returning(File.id, File.path)
+        )
+        file_rows = files_result.all()
+
+        result = await session.execute(
+            delete(Product)
+            .where(Product.id == product_id)
+            .returning(Product.image)
+        )
+        row = result.one_or_none()
+        if row is None:
+            await session.rollback()
+            return None
+
+        await add_tombstones(session, "file", (file_row.id for file_row in file_rows))
+        await add_tombstones(session, "product", [product_id])
+        for file_row in file_rows:
+            record_change(session, "file", file_row.id, "delete", product_id=product_id)
+        record_change(session, "product", product_id, "delete")
         await session.commit()
+        return row.image, [file_row.path for file_row in file_rows]
 
 
 product_crud = ProductCRUD()
-
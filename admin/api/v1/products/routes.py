@@ -1,18 +1,31 @@
 from typing import Optional
 from fastapi import APIRouter, HTTPException, status, Query, UploadFile, File
+from sqlalchemy.exc import IntegrityError
 
-from admin.api.v1.dependencies import DBSession
-from admin.api.v1.utils.file_utils import save_product_image, delete_product_image
-from admin.api.v1.categories.crud import category_crud
+from admin.api.v1.dependencies import DBSession, Loaders
+from admin.api.v1.utils.file_utils import save_product_image, delete_product_image, delete_product_file
+from admin.api.v1.utils.image_utils import get_image_metadata
+from admin.api.v1.utils.db_utils import is_foreign_key_violation
+from admin.api.v1.utils.fieldsets import get_field_set, model_response
+from admin.api.v1.utils.batch_utils import parse_ids, batch_response
+from core.config import IMAGES_DIR, settings
+from core.idempotency import IdempotentRoute, idempotent
+from core.deadline import request_timeout
 from .crud import product_crud
 from .schemas import (
     ProductCreate,
     ProductUpdate,
     ProductResponse,
-    ProductListResponse
+    ProductListResponse,
+    ProductBatchResponse
 )
 
-router = APIRouter(prefix="/products", tags=["Products"])
+# Создание и загрузки принимают Idempotency-Key (core.idempotency), загрузки файлов проходят
+# контроль допуска (core.admission), все маршруты - дедлайн (core.deadline)
+router = APIRouter(prefix="/products", tags=["Products"], route_class=IdempotentRoute)
+
+# Поля ProductResponse, которые являются связями и запрашиваются через include=
+PRODUCT_RELATIONS = frozenset({"files"})
 
 
 @router.post(
@@ -21,42 +34,69 @@ router = APIRouter(prefix="/products", tags=["Products"])
     status_code=status.HTTP_201_CREATED,
     summary="Создать продукт"
 )
+@idempotent
 async def create_product(
     product_in: ProductCreate,
     session: DBSession
 ):
     """Создать новый продукт"""
-    # Проверяем существование категории
-    category = await category_crud.get_by_id(session, product_in.category_id)
-    if not category:
+    try:
+        return await product_crud.create(session, product_in)
+    except IntegrityError as e:
+        if not is_foreign_key_violation(e):
+            raise
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Категория с ID {product_in.category_id} не найдена"
         )
-    return await product_crud.create(session, product_in)
 
 
 @router.get(
     "/",
-    response_model=ProductListResponse,
-    summary="Получить список продуктов"
+    response_model=ProductListResponse | ProductBatchResponse,
+    summary="Получить список продуктов или продукты по ID"
 )
 async def get_products(
-    session: DBSession,
+    loaders: Loaders,
+    ids: Optional[str] = Query(None, description="ID продуктов через запятую: выборка по ID вместо страницы"),
     skip: int = Query(0, ge=0, description="Количество пропускаемых записей"),
     limit: int = Query(100, ge=1, le=100, description="Максимальное количество записей"),
     category_id: Optional[int] = Query(None, description="Фильтр по категории"),
-    is_active: Optional[bool] = Query(None, description="Фильтр по активности")
+    include_descendants: bool = Query(False, description="С category_id: включая продукты всех подкатегорий"),
+    is_active: Optional[bool] = Query(None, description="Фильтр по активности"),
+    fields: Optional[str] = Query(None, description="Возвращаемые поля через запятую (id возвращается всегда)"),
+    include: Optional[str] = Query(None, description="Связи через запятую (files). По умолчанию без fields= файлы включены")
 ):
-    """Получить список всех продуктов с пагинацией и фильтрацией"""
-    products, total = await product_crud.get_all(
-        session,
+    """
+    Получить список всех продуктов с пагинацией и фильтрацией.
+    С fields= в запрос и ответ попадают только указанные колонки,
+    файлы загружаются только при include=files.
+
+    С include_descendants=true фильтр category_id охватывает все поддерево категории.
+
+    С ids= продукты загружаются одним запросом (файлы - одним дополнительным)
+    и возвращаются в порядке ids; ненайденные ID перечисляются в missing.
+    """
+    field_set = get_field_set(ProductResponse, fields, include, PRODUCT_RELATIONS)
+    if ids is not None:
+        if category_id is not None or is_active is not None or include_descendants:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="ids нельзя сочетать с фильтрами"
+            )
+        product_ids = parse_ids(ids)
+        products = await loaders.get(product_crud.get_by_ids, field_set).load_many(product_ids)
+        return batch_response(ProductResponse, ProductBatchResponse, field_set, product_ids, products)
+
+    page = await product_crud.get_list_response(
         skip=skip,
         limit=limit,
         category_id=category_id,
-        is_active=is_active
+        is_active=is_active,
+        fields=field_set,
+        include_descendants=include_descendants
     )
-    return ProductListResponse(items=products, total=total)
+    return model_response(page)
 
 
 @router.get(
@@ -66,16 +106,21 @@ async def get_products(
 )
 async def get_product(
     product_id: int,
-    session: DBSession
+    fields: Optional[str] = Query(None, description="Возвращаемые поля через запятую (id возвращается всегда)"),
+    include: Optional[str] = Query(None, description="Связи через запятую (files). По умолчанию без fields= файлы включены")
 ):
     """Получить продукт по ID"""
-    product = await product_crud.get_by_id(session, product_id)
+    field_set = get_field_set(ProductResponse, fields, include, PRODUCT_RELATIONS)
+    if field_set is None:
+        product = await product_crud.get_cached(product_id)
+    else:
+        product = await product_crud.get_response(product_id, fields=field_set)
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Продукт с ID {product_id} не найден"
         )
-    return product
+    return model_response(product)
 
 
 @router.patch(
@@ -89,23 +134,22 @@ async def update_product(
     session: DBSession
 ):
     """Обновить продукт"""
-    product = await product_crud.get_by_id(session, product_id)
+    try:
+        product = await product_crud.update(session, product_id, product_update)
+    except IntegrityError as e:
+        if not is_foreign_key_violation(e):
+            raise
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Категория с ID {product_update.category_id} не найдена"
+        )
+    
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Продукт с ID {product_id} не найден"
         )
-    
-    # Проверяем существование категории, если она обновляется
-    if product_update.category_id is not None:
-        category = await category_crud.get_by_id(session, product_update.category_id)
-        if not category:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Категория с ID {product_update.category_id} не найдена"
-            )
-    
-    return await product_crud.update(session, product, product_update)
+    return product
 
 
 @router.delete(
@@ -118,18 +162,19 @@ async def delete_product(
     session: DBSession
 ):
     """Удалить продукт"""
-    product = await product_crud.get_by_id(session, product_id)
-    if not product:
+    deleted = await product_crud.delete(session, product_id)
+    if deleted is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Продукт с ID {product_id} не найден"
         )
     
-    # Удаляем изображение продукта если оно есть
-    if product.image:
-        delete_product_image(product.image)
-    
-    await product_crud.delete(session, product)
+    # Удаляем изображение и файлы продукта с диска после фиксации транзакции
+    image, file_paths = deleted
+    if image:
+        delete_product_image(image)
+    for file_path in file_paths:
+        delete_product_file(file_path)
 
 
 @router.post(
@@ -137,6 +182,8 @@ async def delete_product(
     response_model=ProductResponse,
     summary="Загрузить изображение продукта"
 )
+@request_timeout(settings.upload_request_timeout_seconds)
+@idempotent
 async def upload_product_image(
     product_id: int,
     session: DBSession,
@@ -148,27 +195,35 @@ async def upload_product_image(
     
     Поддерживаемые форматы: JPG, JPEG, PNG, GIF, WEBP, SVG
     """
-    # Проверяем существование продукта
-    product = await product_crud.get_by_id(session, product_id)
-    if not product:
+    # Проверяем существование продукта, читая только путь к текущему изображению
+    current = await product_crud.get_columns(session, product_id, "image")
+    if current is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Продукт с ID {product_id} не найден"
         )
     
-    # Удаляем старое изображение если оно есть
-    if product.image:
-        delete_product_image(product.image)
-    
     # Сохраняем новое изображение
     image_path = await save_product_image(file)
     
-    # Обновляем путь к изображению в БД
-    product.image = image_path
-    await session.commit()
+    # Размеры и заглушка считаются в пуле процессов, не блокируя event loop
+    metadata = await get_image_metadata(IMAGES_DIR / image_path)
+    width, height, placeholder = metadata or (None, None, None)
+    
+    # Обновляем путь к изображению и его метаданные в БД
+    product = await product_crud.update_image(
+        session, product_id, image_path, width, height, placeholder
+    )
+    if not product:
+        # Продукт удалили, пока сохранялось изображение
+        delete_product_image(image_path)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Продукт с ID {product_id} не найден"
+        )
     
-    # Заново получаем продукт с загруженными файлами
-    updated_product = await product_crud.get_by_id(session, product_id)
+    # Старое изображение удаляем только после успешного обновления БД
+    if current.image:
+        delete_product_image(current.image)
     
-    return updated_product
-
+    return product
@@ -40,6 +40,10 @@ class FileInProduct(BaseModel):
 class ProductResponse(ProductBase):
     """Схема ответа продукта"""
     id: int
+    external_id: Optional[str] = None
+    image_width: Optional[int] = None
+    image_height: Optional[int] = None
+    image_placeholder: Optional[str] = None
     created_at: datetime
     updated_at: datetime
     files: List[FileInProduct] = []
@@ -52,3 +56,9 @@ class ProductListResponse(BaseModel):
     items: list[ProductResponse]
     total: int
 
+
+class ProductBatchResponse(BaseModel):
+    """Схема выборки продуктов по ID (ids=)"""
+    items: list[ProductResponse]
+    missing: list[int] = Field(default_factory=list, description="Запрошенные ID, которые не найдены")
+
@@ -1,8 +1,16 @@
 from .file_utils import save_upload_file, validate_file_extension, get_file_extension
+from .archive_utils import iter_files_zip
+from .db_utils import is_foreign_key_violation, add_tombstones
+from .batch_utils import parse_ids, batch_response
 
 __all__ = [
     "save_upload_file",
     "validate_file_extension",
     "get_file_extension",
+    "iter_files_zip",
+    "is_foreign_key_violation",
+    "add_tombstones",
+    "parse_ids",
+    "batch_response",
 ]
 
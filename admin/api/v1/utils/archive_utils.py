@@ -0,0 +1,111 @@
+import zipfile
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from core.config import FILES_DIR
+from .file_utils import get_file_extension, resolve_storage_path
+
+
+# Форматы, которые уже сжаты: повторное сжатие только тратит CPU
+STORED_EXTENSIONS = {
+    ".pdf", ".docx", ".xlsx", ".pptx", ".odt", ".ods",
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".zip",
+}
+
+# Размер блока чтения с диска и порог отдачи накопленных байт клиенту
+ZIP_CHUNK_SIZE = 64 * 1024
+
+
+class _ZipStreamBuffer:
+    """
+    Не поддерживающий seek приемник для zipfile.
+
+    Отсутствие tell()/seek() переводит ZipFile в потоковый режим:
+    размеры и CRC пишутся в data descriptor после каждой записи,
+    поэтому архив можно отдавать клиенту по мере формирования.
+    """
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def pop(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _unique_arcname(name: str, used: set[str]) -> str:
+    """Получить имя записи в архиве без путей и без повторов"""
+    arcname = Path(name.replace("\\", "/")).name or "file"
+    if arcname not in used:
+        used.add(arcname)
+        return arcname
+
+    stem, suffix = Path(arcname).stem, Path(arcname).suffix
+    counter = 2
+    while f"{stem} ({counter}){suffix}" in used:
+        counter += 1
+    arcname = f"{stem} ({counter}){suffix}"
+    used.add(arcname)
+    return arcname
+
+
+def iter_files_zip(
+    files: Iterable[tuple[str, str]],
+    base_directory: Path = FILES_DIR
+) -> Iterator[bytes]:
+    """
+    Сформировать ZIP архив на лету
+
+    Файлы читаются блоками, поэтому потребление памяти не зависит
+    от размера архива. Уже сжатые форматы добавляются без сжатия,
+    для больших файлов и архивов используется ZIP64.
+    Генератор синхронный: StreamingResponse выполняет его в пуле потоков,
+    и дисковый ввод-вывод не блокирует event loop.
+
+    Args:
+        files: Пары (имя файла в архиве, путь относительно base_directory)
+        base_directory: Базовая директория файлов
+
+    Yields:
+        bytes: Очередной фрагмент архива
+    """
+    buffer = _ZipStreamBuffer()
+    used_names: set[str] = set()
+
+    with zipfile.ZipFile(buffer, mode="w", allowZip64=True) as archive:
+        for name, relative_path in files:
+            full_path = resolve_storage_path(relative_path, base_directory)
+            if full_path is None:
+                # Запись в БД есть, а файла на диске нет - пропускаем
+                continue
+
+            arcname = _unique_arcname(name, used_names)
+            zinfo = zipfile.ZipInfo.from_file(full_path, arcname)
+            if get_file_extension(arcname) in STORED_EXTENSIONS:
+                zinfo.compress_type = zipfile.ZIP_STORED
+            else:
+                zinfo.compress_type = zipfile.ZIP_DEFLATED
+
+            with open(full_path, "rb") as source, archive.open(zinfo, mode="w") as target:
+                while chunk := source.read(ZIP_CHUNK_SIZE):
+                    target.write(chunk)
+                    data = buffer.pop()
+                    if data:
+                        yield data
+
+            data = buffer.pop()
+            if data:
+                yield data
+
+    # Центральный каталог записывается при закрытии архива
+    data = buffer.pop()
+    if data:
+        yield data
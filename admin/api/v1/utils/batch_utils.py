@@ -0,0 +1,57 @@
+from typing import Any, Optional, Sequence
+
+from fastapi import HTTPException, Response, status
+from pydantic import BaseModel
+
+from core.config import settings
+from .fieldsets import get_sparse_batch_schema, model_response
+
+
+def parse_ids(ids: str) -> list[int]:
+    """
+    Разобрать параметр ids= ("1,2,3") в список ID без повторов в порядке запроса
+
+    Raises:
+        HTTPException: Если ID некорректны или их больше batch_max_ids
+    """
+    try:
+        parsed = [int(item) for item in ids.split(",") if item.strip()]
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ids должен быть списком целых чисел через запятую"
+        )
+    unique = list(dict.fromkeys(parsed))
+    if not unique:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ids не должен быть пустым"
+        )
+    if len(unique) > settings.batch_max_ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Можно запросить не больше {settings.batch_max_ids} ID"
+        )
+    return unique
+
+
+def batch_response(
+    schema: type[BaseModel],
+    batch_schema: type[BaseModel],
+    fields: Optional[tuple[str, ...]],
+    ids: Sequence[int],
+    values: Sequence[Optional[Any]]
+) -> Response:
+    """
+    Сериализовать выборку по ID: найденные записи в порядке ids и список ненайденных ID
+
+    Args:
+        schema: Схема элемента (для ответа только с полями fields)
+        batch_schema: Полная схема выборки (items, missing)
+        values: Загруженные записи в порядке ids (None - не найдена)
+    """
+    model = batch_schema if fields is None else get_sparse_batch_schema(schema, fields)
+    return model_response(model(
+        items=[value for value in values if value is not None],
+        missing=[id_ for id_, value in zip(ids, values) if value is None]
+    ))
@@ -0,0 +1,37 @@
+from typing import Iterable
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.models.models import Tombstone
+
+
+# SQLSTATE нарушения внешнего ключа в PostgreSQL
+FOREIGN_KEY_VIOLATION = "23503"
+
+
+def is_foreign_key_violation(error: IntegrityError) -> bool:
+    """
+    Проверить, что ошибка вызвана ссылкой на несуществующую запись
+
+    Вместо отдельного SELECT на существование связанной записи
+    запись выполняется сразу, а нарушение внешнего ключа превращается в 404.
+    """
+    orig = error.orig
+    sqlstate = getattr(orig, "sqlstate", None) or getattr(orig, "pgcode", None)
+    if sqlstate is not None:
+        return sqlstate == FOREIGN_KEY_VIOLATION
+    # SQLite не сообщает код ошибки, только текст
+    return "FOREIGN KEY" in str(orig).upper()
+
+
+async def add_tombstones(session: AsyncSession, entity: str, entity_ids: Iterable[int]) -> None:
+    """
+    Записать факты удаления для ленты изменений одним INSERT
+
+    Вызывается в той же транзакции, что и DELETE, поэтому удаление
+    и запись о нем фиксируются атомарно.
+    """
+    rows = [{"entity": entity, "entity_id": entity_id} for entity_id in entity_ids]
+    if rows:
+        await session.execute(insert(Tombstone).values(rows))
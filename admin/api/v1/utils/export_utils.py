@@ -0,0 +1,84 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import AsyncIterator
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+# Порог отдачи накопленных байт клиенту
+EXPORT_FLUSH_SIZE = 64 * 1024
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Тип {type(value).__name__} не сериализуется в JSON")
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False, default=_json_default)
+    return value
+
+
+async def iter_ndjson(batches: AsyncIterator[list[dict]]) -> AsyncIterator[str]:
+    """Сериализовать пачки записей в NDJSON (одна пачка - один фрагмент)"""
+    dumps = json.JSONEncoder(ensure_ascii=False, default=_json_default).encode
+    async for batch in batches:
+        yield "".join(dumps(item) + "\n" for item in batch)
+
+
+async def iter_csv(batches: AsyncIterator[list[dict]], columns: list[str]) -> AsyncIterator[str]:
+    """
+    Сериализовать пачки записей в CSV с заголовком
+
+    Вложенные списки и словари (например, файлы продукта) записываются JSON строкой.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    async for batch in batches:
+        writer.writerows([_csv_value(item.get(column)) for column in columns] for item in batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+async def iter_encoded(chunks: AsyncIterator[str], compress: bool = False) -> AsyncIterator[bytes]:
+    """
+    Закодировать текстовые фрагменты в UTF-8 и при необходимости сжать gzip на лету
+
+    Мелкие фрагменты накапливаются до EXPORT_FLUSH_SIZE, чтобы не отправлять
+    клиенту каждую пачку отдельной записью в сокет.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16) if compress else None
+    pending: list[bytes] = []
+    pending_size = 0
+    async for chunk in chunks:
+        data = chunk.encode()
+        if compressor is not None:
+            data = compressor.compress(data)
+        if not data:
+            continue
+        pending.append(data)
+        pending_size += len(data)
+        if pending_size >= EXPORT_FLUSH_SIZE:
+            yield b"".join(pending)
+            pending.clear()
+            pending_size = 0
+
+    if compressor is not None:
+        pending.append(compressor.flush())
+    if pending:
+        yield b"".join(pending)
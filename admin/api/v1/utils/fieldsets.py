@@ -0,0 +1,97 @@
+from functools import lru_cache
+from typing import Optional
+
+from fastapi import HTTPException, Response, status
+from pydantic import BaseModel, ConfigDict, create_model
+
+
+def get_field_set(
+    schema: type[BaseModel],
+    fields: Optional[str],
+    include: Optional[str] = None,
+    relations: frozenset[str] = frozenset()
+) -> Optional[tuple[str, ...]]:
+    """
+    Разобрать параметры fields= и include= в набор полей ответа
+
+    Args:
+        schema: Полная схема ответа
+        fields: Колонки через запятую (id возвращается всегда)
+        include: Связи через запятую (например, "files")
+        relations: Поля схемы, которые являются связями, а не колонками
+
+    Returns:
+        Optional[tuple[str, ...]]: Поля ответа в порядке схемы или None,
+        если параметры не переданы и нужен полный ответ
+
+    Raises:
+        HTTPException: Если запрошено неизвестное поле или связь
+    """
+    if fields is None and include is None:
+        return None
+
+    columns = [name for name in schema.model_fields if name not in relations]
+    requested = set(columns)
+    if fields is not None:
+        requested = _split(fields)
+        unknown = requested - set(columns)
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Неизвестные поля: {', '.join(sorted(unknown))}. Доступны: {', '.join(columns)}"
+            )
+        requested.add("id")
+
+    included = _split(include) if include is not None else set()
+    unknown = included - relations
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Неизвестные связи: {', '.join(sorted(unknown))}. Доступны: {', '.join(sorted(relations))}"
+        )
+
+    return tuple(name for name in schema.model_fields if name in requested | included)
+
+
+def _split(value: str) -> set[str]:
+    return {item.strip() for item in value.split(",") if item.strip()}
+
+
+@lru_cache(maxsize=256)
+def get_sparse_schema(schema: type[BaseModel], fields: tuple[str, ...]) -> type[BaseModel]:
+    """Получить (и закэшировать) схему ответа только с указанными полями"""
+    return create_model(
+        f"{schema.__name__}Sparse",
+        __config__=ConfigDict(from_attributes=True),
+        **{
+            name: (info.annotation, info)
+            for name, info in schema.model_fields.items()
+            if name in fields
+        }
+    )
+
+
+@lru_cache(maxsize=256)
+def get_sparse_list_schema(schema: type[BaseModel], fields: tuple[str, ...]) -> type[BaseModel]:
+    """Получить (и закэшировать) схему списка только с указанными полями элементов"""
+    return create_model(
+        f"{schema.__name__}SparseList",
+        items=(list[get_sparse_schema(schema, fields)], ...),
+        total=(int, ...),
+    )
+
+
+@lru_cache(maxsize=256)
+def get_sparse_batch_schema(schema: type[BaseModel], fields: tuple[str, ...]) -> type[BaseModel]:
+    """Получить (и закэшировать) схему выборки по ID только с указанными полями элементов"""
+    return create_model(
+        f"{schema.__name__}SparseBatch",
+        items=(list[get_sparse_schema(schema, fields)], ...),
+        missing=(list[int], ...),
+    )
+
+
+def model_response(model: BaseModel) -> Response:
+    """Сериализовать уже проверенную схему ответа в JSON без повторной проверки"""
+    return Response(content=model.model_dump_json(), media_type="application/json")
+
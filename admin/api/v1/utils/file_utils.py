@@ -1,8 +1,12 @@
+import asyncio
+import hashlib
 import os
+import shutil
 import uuid
 from pathlib import Path
-from typing import Optional
+from typing import BinaryIO, Optional
 from fastapi import UploadFile, HTTPException, status
+from starlette.staticfiles import StaticFiles
 
 from core.config import IMAGES_DIR, FILES_DIR
 
@@ -15,6 +19,14 @@ ALLOWED_DOCUMENT_EXTENSIONS = {
 }
 
 
+# Размер блока копирования загруженного файла на диск
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Количество уровней вложенности шардированного хранилища: ab/cd/<uuid>.ext
+SHARD_LEVELS = 2
+SHARD_WIDTH = 2
+
+
 def get_file_extension(filename: str) -> str:
     """Получить расширение файла"""
     return Path(filename).suffix.lower()
@@ -26,19 +38,94 @@ def validate_file_extension(filename: str, allowed_extensions: set) -> bool:
     return extension in allowed_extensions
 
 
+def get_shard_key(filename: str) -> str:
+    """
+    Получить hex-ключ для шардирования по имени файла.
+    Для имен вида <uuid>.ext используется сам uuid, для остальных - md5 имени.
+    """
+    stem = Path(filename).stem
+    try:
+        return uuid.UUID(stem).hex
+    except ValueError:
+        return hashlib.md5(Path(filename).name.encode()).hexdigest()
+
+
+def get_sharded_path(filename: str) -> str:
+    """
+    Получить шардированный относительный путь файла
+
+    Пример: "a6b48212-....pdf" -> "a6/b4/a6b48212-....pdf"
+    """
+    key = get_shard_key(filename)
+    shards = [
+        key[level * SHARD_WIDTH:(level + 1) * SHARD_WIDTH]
+        for level in range(SHARD_LEVELS)
+    ]
+    return "/".join([*shards, Path(filename).name])
+
+
+def is_sharded_path(relative_path: str) -> bool:
+    """Проверить, что путь уже в шардированном формате"""
+    return relative_path == get_sharded_path(Path(relative_path).name)
+
+
+def resolve_storage_path(relative_path: str, base_directory: Path) -> Optional[Path]:
+    """
+    Найти файл в хранилище по пути из БД или URL
+
+    Сначала проверяется путь как есть, затем его шардированный вариант.
+    Так старые пути ("uuid.jpg", "product_name/uuid.pdf") продолжают
+    работать во время и после миграции на шардированную структуру.
+
+    Returns:
+        Optional[Path]: Полный путь к файлу или None если файл не найден
+    """
+    full_path = base_directory / relative_path
+    # Не выпускаем путь за пределы базовой директории ("../")
+    if not full_path.resolve().is_relative_to(base_directory.resolve()):
+        return None
+    if full_path.is_file():
+        return full_path
+
+    sharded_path = base_directory / get_sharded_path(Path(relative_path).name)
+    if sharded_path != full_path and sharded_path.is_file():
+        return sharded_path
+    return None
+
+
+class ShardedStaticFiles(StaticFiles):
+    """
+    StaticFiles с поддержкой шардированного хранилища.
+    Если файл не найден по запрошенному пути, ищет его шардированный вариант.
+    """
+
+    def lookup_path(self, path: str) -> tuple[str, Optional[os.stat_result]]:
+        full_path, stat_result = super().lookup_path(path)
+        if stat_result is None:
+            sharded_path = get_sharded_path(os.path.basename(path))
+            if sharded_path != path:
+                return super().lookup_path(sharded_path)
+        return full_path, stat_result
+
+
+def _copy_upload(source: BinaryIO, target: Path) -> None:
+    target.parent.mkdir(parents=True, exist_ok=True)
+    source.seek(0)
+    with open(target, "wb") as f:
+        shutil.copyfileobj(source, f, UPLOAD_CHUNK_SIZE)
+
+
 async def save_upload_file(
     file: UploadFile,
     directory: Path,
-    subdirectory: Optional[str] = None,
     allowed_extensions: Optional[set] = None
 ) -> tuple[str, str]:
     """
-    Сохранить загруженный файл
+    Сохранить загруженный файл в шардированную директорию (ab/cd/<uuid>.ext)
     
     Args:
         file: Загруженный файл
         directory: Основная директория для сохранения
-        subdirectory: Поддиректория (например, название продукта)
         allowed_extensions: Разрешенные расширения файлов
     
     Returns:
@@ -67,20 +154,14 @@ async def save_upload_file(
     # Генерируем уникальное имя файла
     unique_filename = f"{uuid.uuid4()}{extension}"
     
-    # Определяем директорию для сохранения
-    save_directory = directory
-    if subdirectory:
-        save_directory = directory / subdirectory
-        save_directory.mkdir(parents=True, exist_ok=True)
-    
-    # Полный путь к файлу
-    file_path = save_directory / unique_filename
+    # Определяем шардированный путь
+    relative_path = get_sharded_path(unique_filename)
+    file_path = directory / relative_path
     
-    # Сохраняем файл
+    # Создаем директорию и сохраняем файл блоками в пуле потоков:
+    # файл не читается в память целиком, диск не блокирует цикл событий
     try:
-        content = await file.read()
-        with open(file_path, "wb") as f:
-            f.write(content)
+        await asyncio.to_thread(_copy_upload, file.file, file_path)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -88,11 +169,6 @@ async def save_upload_file(
         )
     
     # Возвращаем относительный путь и полный путь
-    if subdirectory:
-        relative_path = f"{subdirectory}/{unique_filename}"
-    else:
-        relative_path = unique_filename
-    
     return relative_path, str(file_path)
 
 
@@ -101,7 +177,7 @@ async def save_product_image(file: UploadFile) -> str:
     Сохранить изображение продукта в /images/
     
     Returns:
-        str: Путь к файлу для сохранения в БД (например, "uuid.jpg")
+        str: Путь к файлу для сохранения в БД (например, "ab/cd/uuid.jpg")
     """
     relative_path, _ = await save_upload_file(
         file=file,
@@ -111,27 +187,19 @@ async def save_product_image(file: UploadFile) -> str:
     return relative_path
 
 
-async def save_product_file(file: UploadFile, product_name: str) -> str:
+async def save_product_file(file: UploadFile) -> str:
     """
-    Сохранить файл продукта в /files/{product_name}/
+    Сохранить файл продукта в /files/
     
     Args:
         file: Загруженный файл
-        product_name: Название продукта (используется как имя поддиректории)
     
     Returns:
-        str: Путь к файлу для сохранения в БД (например, "product_name/uuid.pdf")
+        str: Путь к файлу для сохранения в БД (например, "ab/cd/uuid.pdf")
     """
-    # Очищаем название продукта от недопустимых символов
-    clean_product_name = "".join(
-        c if c.isalnum() or c in (' ', '-', '_') else '_' 
-        for c in product_name
-    ).strip().replace(' ', '_')
-    
     relative_path, _ = await save_upload_file(
         file=file,
         directory=FILES_DIR,
-        subdirectory=clean_product_name,
         allowed_extensions=ALLOWED_DOCUMENT_EXTENSIONS
     )
     return relative_path
@@ -149,13 +217,20 @@ def delete_file(file_path: str, base_directory: Path) -> bool:
         bool: True если файл успешно удален, False если файл не найден
     """
     try:
-        full_path = base_directory / file_path
-        if full_path.exists():
+        full_path = resolve_storage_path(file_path, base_directory)
+        if full_path is not None:
             full_path.unlink()
             
-            # Удаляем пустую поддиректорию если она есть
+            # Шардированные директории не удаляем: их число ограничено,
+            # а повторное создание конкурирует с параллельной загрузкой.
+            # Опустевшую директорию старой структуры (по имени продукта) удаляем.
             parent_dir = full_path.parent
-            if parent_dir != base_directory and not any(parent_dir.iterdir()):
+            relative_path = full_path.relative_to(base_directory).as_posix()
+            if (
+                parent_dir != base_directory
+                and not is_sharded_path(relative_path)
+                and next(parent_dir.iterdir(), None) is None
+            ):
                 parent_dir.rmdir()
             
             return True
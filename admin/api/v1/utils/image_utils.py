@@ -0,0 +1,254 @@
+import asyncio
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from core.config import IMAGE_CACHE_DIR, settings
+
+
+# Форматы, в которые можно конвертировать уменьшенную копию
+RESIZE_FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg"),
+    "png": ("PNG", "image/png"),
+    "webp": ("WEBP", "image/webp"),
+}
+# Исходные форматы, которые умеет открывать Pillow (SVG - векторный, не уменьшаем)
+RESIZABLE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+class ImageDecodeError(ValueError):
+    """Исходное изображение не удалось прочитать (поврежденный или не тот формат файл)"""
+
+
+def get_image_pool() -> ProcessPoolExecutor:
+    """
+    Получить пул процессов для обработки изображений
+
+    Пул создается лениво. Используется spawn, чтобы дочерние процессы
+    не наследовали event loop и соединения с БД родителя.
+    """
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(
+            max_workers=settings.image_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _process_pool
+
+
+def shutdown_image_pool() -> None:
+    """Остановить пул процессов (вызывается при завершении приложения)"""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+def parse_size(size: str) -> Optional[tuple[int, int]]:
+    """Разобрать размер вида "200x200", если он разрешен настройками"""
+    if size not in settings.image_resize_sizes:
+        return None
+    width, height = size.split("x")
+    return int(width), int(height)
+
+
+def resize_image(source: str, target: str, width: int, height: int, image_format: str) -> int:
+    """
+    Уменьшить изображение с сохранением пропорций и записать в target
+
+    Выполняется в дочернем процессе. Файл пишется во временный и атомарно
+    переименовывается, чтобы читатели никогда не видели недописанный файл.
+
+    Returns:
+        int: Размер результата в байтах
+
+    Raises:
+        ImageDecodeError: Если исходное изображение не удалось прочитать;
+            ошибки записи копии пробрасываются как есть
+    """
+    from PIL import Image, ImageOps
+
+    pil_format, _ = RESIZE_FORMATS[image_format]
+    try:
+        image = Image.open(source)
+        # Pillow декодирует лениво: ошибки данных должны проявиться здесь, а не при записи
+        image.load()
+    except (OSError, Image.DecompressionBombError) as e:
+        # UnidentifiedImageError - подкласс OSError
+        raise ImageDecodeError(str(e)) from e
+    with image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((width, height))
+        if pil_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        target_path = Path(target)
+        target_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = target_path.with_name(f".{target_path.name}.{os.getpid()}.tmp")
+        image.save(tmp_path, format=pil_format, optimize=True)
+        os.replace(tmp_path, target_path)
+    return target_path.stat().st_size
+
+
+# Длинная сторона миниатюры-заглушки: ~200 байт в base64
+PLACEHOLDER_SIZE = 16
+
+
+def compute_image_metadata(source: str) -> tuple[int, int, str]:
+    """
+    Получить размеры изображения и миниатюру-заглушку (LQIP)
+
+    Выполняется в дочернем процессе. Заглушка - крошечная WebP миниатюра
+    в виде data URI, которую клиент растягивает с размытием до загрузки оригинала.
+
+    Returns:
+        tuple[int, int, str]: (ширина, высота, data URI заглушки)
+    """
+    import base64
+    import io
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        width, height = image.size
+        image.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+        buffer = io.BytesIO()
+        image.save(buffer, format="WEBP", quality=30)
+    placeholder = base64.b64encode(buffer.getvalue()).decode("ascii")
+    return width, height, f"data:image/webp;base64,{placeholder}"
+
+
+async def get_image_metadata(source: Path) -> Optional[tuple[int, int, str]]:
+    """
+    Посчитать размеры и заглушку изображения в пуле процессов
+
+    Returns:
+        Optional[tuple[int, int, str]]: Метаданные или None,
+        если формат не поддерживается или файл не удалось прочитать
+    """
+    if source.suffix.lower() not in RESIZABLE_EXTENSIONS:
+        return None
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(get_image_pool(), compute_image_metadata, str(source))
+    except Exception:
+        return None
+
+
+class ImageCache:
+    """
+    Дисковый кэш уменьшенных копий с LRU-вытеснением по общему размеру
+
+    Учет ведется в памяти воркера и восстанавливается сканированием директории
+    при первом обращении. Несколько воркеров делят одну директорию: если файл
+    вытеснен другим воркером, он просто будет сгенерирован заново.
+    Одновременные запросы одной и той же копии объединяются в одну генерацию.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[Path, int] = OrderedDict()
+        self._total_bytes = 0
+        self._loaded = False
+        self._in_flight: dict[Path, asyncio.Future] = {}
+
+    def _scan(self) -> list[tuple[Path, int, float]]:
+        entries = []
+        for path in self.directory.rglob("*"):
+            if path.is_file() and not path.name.startswith("."):
+                stat = path.stat()
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    async def _load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        for path, size, _ in await asyncio.to_thread(self._scan):
+            self._entries[path] = size
+            self._total_bytes += size
+
+    def get_path(self, name: str, size: str, image_format: str) -> Path:
+        """Путь уменьшенной копии в кэше"""
+        return self.directory / size / Path(name).with_suffix(f".{image_format}")
+
+    def _remember(self, target: Path, file_size: int) -> None:
+        """Отметить копию как последнюю использованную и вытеснить старые при превышении бюджета"""
+        if target in self._entries:
+            self._total_bytes -= self._entries.pop(target)
+        self._entries[target] = file_size
+        self._total_bytes += file_size
+
+        victims = []
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            path, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            victims.append(path)
+        if victims:
+            asyncio.get_running_loop().run_in_executor(None, _unlink_all, victims)
+
+    def _on_created(self, target: Path, future: asyncio.Future) -> None:
+        self._in_flight.pop(target, None)
+        if not future.cancelled() and future.exception() is None:
+            self._remember(target, future.result())
+
+    async def get_or_create(
+        self,
+        source: Path,
+        name: str,
+        size: str,
+        image_format: str
+    ) -> Path:
+        """
+        Получить уменьшенную копию из кэша или сгенерировать ее в пуле процессов
+        """
+        await self._load()
+        target = self.get_path(name, size, image_format)
+
+        # Копия могла быть создана и другим воркером - проверяем диск
+        file_size = await asyncio.to_thread(_file_size, target)
+        if file_size is not None:
+            self._remember(target, file_size)
+            return target
+
+        future = self._in_flight.get(target)
+        if future is None:
+            width, height = parse_size(size)
+            future = asyncio.get_running_loop().run_in_executor(
+                get_image_pool(),
+                resize_image, str(source), str(target), width, height, image_format
+            )
+            self._in_flight[target] = future
+            future.add_done_callback(lambda done: self._on_created(target, done))
+
+        # Генерацию ждут все одинаковые запросы; разрыв соединения одного из них
+        # не должен отменять общую работу
+        await asyncio.shield(future)
+        return target
+
+
+def _file_size(path: Path) -> Optional[int]:
+    try:
+        return path.stat().st_size
+    except FileNotFoundError:
+        return None
+
+
+def _unlink_all(paths: list[Path]) -> None:
+    for path in paths:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+image_cache = ImageCache(IMAGE_CACHE_DIR, settings.image_cache_max_bytes)
@@ -0,0 +1,133 @@
+import asyncio
+import codecs
+import csv
+import json
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+IMPORT_FORMATS = ("csv", "jsonl")
+READ_CHUNK_SIZE = 1024 * 1024
+
+# Строка источника: (номер строки данных, начиная с 1; поля)
+SourceRow = tuple[int, dict]
+
+
+def detect_import_format(content_type: Optional[str] = None, filename: Optional[str] = None) -> Optional[str]:
+    """Определить формат импорта по Content-Type или расширению файла"""
+    if content_type:
+        media_type = content_type.split(";")[0].strip().lower()
+        if media_type in ("text/csv", "application/csv"):
+            return "csv"
+        if media_type in ("application/x-ndjson", "application/jsonl", "application/x-jsonlines"):
+            return "jsonl"
+    if filename:
+        suffix = Path(filename).suffix.lower()
+        if suffix == ".csv":
+            return "csv"
+        if suffix in (".jsonl", ".ndjson"):
+            return "jsonl"
+    return None
+
+
+async def iter_file_chunks(path: Path, chunk_size: int = READ_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Читать файл с диска кусками без блокировки цикла событий"""
+    with open(path, "rb") as f:
+        while chunk := await asyncio.to_thread(f.read, chunk_size):
+            yield chunk
+
+
+async def _iter_records(chunks: AsyncIterator[bytes], csv_quoting: bool) -> AsyncIterator[list[str]]:
+    """
+    Разбить поток байтов на пачки полных записей
+
+    Для CSV запись может занимать несколько строк (перевод строки в кавычках),
+    поэтому строки склеиваются, пока число кавычек в записи нечетное.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    tail = ""
+    pending = ""
+    async for chunk in chunks:
+        text = tail + decoder.decode(chunk)
+        lines = text.split("\n")
+        tail = lines.pop()
+        records = []
+        for line in lines:
+            pending += line + "\n"
+            if csv_quoting and pending.count('"') % 2:
+                continue
+            records.append(pending)
+            pending = ""
+        if records:
+            yield records
+
+    last = pending + tail + decoder.decode(b"", final=True)
+    if last.strip():
+        yield [last]
+
+
+def _parse_csv(records: list[str]) -> list[list[str] | Exception]:
+    """Разобрать пачку полных записей CSV; при ошибке разбора - по одной записи"""
+    try:
+        return list(csv.reader(records))
+    except csv.Error:
+        pass
+    parsed = []
+    for record in records:
+        try:
+            parsed.append(next(csv.reader((record,)), []))
+        except csv.Error as e:
+            parsed.append(e)
+    return parsed
+
+
+async def iter_import_rows(
+    chunks: AsyncIterator[bytes],
+    import_format: str,
+    batch_size: int
+) -> AsyncIterator[list[SourceRow | tuple[int, Exception]]]:
+    """
+    Разобрать CSV (с заголовком) или JSONL поток в пачки по batch_size строк
+
+    Пустые ячейки CSV пропускаются, чтобы сработали значения по умолчанию схемы.
+    Строка, которую не удалось разобрать, возвращается как (номер, ошибка).
+    """
+    header: Optional[list[str]] = None
+    number = 0
+    rows = []
+    async for records in _iter_records(chunks, csv_quoting=import_format == "csv"):
+        if import_format == "csv":
+            for values in _parse_csv(records):
+                if not values:
+                    continue
+                if header is None:
+                    header = [name.strip() for name in values]
+                    continue
+                number += 1
+                if isinstance(values, Exception):
+                    rows.append((number, values))
+                elif len(values) != len(header):
+                    rows.append((number, ValueError(f"Ожидалось {len(header)} колонок, получено {len(values)}")))
+                elif "" in values:
+                    rows.append((number, {name: value for name, value in zip(header, values) if value != ""}))
+                else:
+                    rows.append((number, dict(zip(header, values))))
+        else:
+            for record in records:
+                if not record.strip():
+                    continue
+                number += 1
+                try:
+                    data = json.loads(record)
+                except ValueError as e:
+                    rows.append((number, e))
+                    continue
+                if not isinstance(data, dict):
+                    rows.append((number, ValueError("Ожидался JSON объект")))
+                    continue
+                rows.append((number, data))
+        while len(rows) >= batch_size:
+            yield rows[:batch_size]
+            rows = rows[batch_size:]
+
+    if rows:
+        yield rows
@@ -0,0 +1,63 @@
+"""
+Отдача файлов хранилища обратным прокси (X-Accel-Redirect / X-Sendfile)
+
+Приложение проверяет доступ и находит файл на диске, а байты отдает прокси
+через sendfile: ответ содержит только заголовок с путем и пустое тело.
+Заголовок выбирается настройкой settings.file_offload_mode:
+
+- accel - X-Accel-Redirect (nginx): путь во внутреннем location
+  settings.file_offload_internal_prefix, отображенном на BASE_DIR;
+- sendfile - X-Sendfile (Apache mod_xsendfile, lighttpd): абсолютный путь к файлу.
+
+Прокси подтверждает, что стоит перед приложением, заголовком запроса
+X-Sendfile-Type с тем же значением (как Rack::Sendfile). Без него или с другим
+значением (запрос напрямую к uvicorn) файл отдается самим приложением: клиент
+не может выбрать режим сам и получить, например, абсолютный путь на сервере.
+"""
+import mimetypes
+from pathlib import Path
+from typing import Optional
+from urllib.parse import quote
+
+from fastapi import Request, Response
+from fastapi.responses import FileResponse
+
+from core.config import BASE_DIR, settings
+
+SENDFILE_TYPE_HEADER = "x-sendfile-type"
+ACCEL_REDIRECT = "X-Accel-Redirect"
+SENDFILE = "X-Sendfile"
+# Заголовок ответа по режиму settings.file_offload_mode
+OFFLOAD_HEADERS = {"accel": ACCEL_REDIRECT, "sendfile": SENDFILE}
+
+
+def content_disposition(filename: str) -> str:
+    """Content-Disposition для показа в браузере с исходным именем файла"""
+    return f"inline; filename*=UTF-8''{quote(filename)}"
+
+
+def offload_response(
+    request: Request,
+    full_path: Path,
+    headers: Optional[dict] = None
+) -> Response:
+    """
+    Ответ с файлом хранилища: заголовок для прокси или сам файл
+
+    Args:
+        request: Запрос (заголовок X-Sendfile-Type от прокси)
+        full_path: Путь к существующему файлу внутри BASE_DIR
+        headers: Дополнительные заголовки ответа
+    """
+    headers = dict(headers or {})
+    media_type = mimetypes.guess_type(full_path.name)[0] or "application/octet-stream"
+    offload_header = OFFLOAD_HEADERS[settings.file_offload_mode]
+    if request.headers.get(SENDFILE_TYPE_HEADER, "").lower() != offload_header.lower():
+        return FileResponse(full_path, media_type=media_type, headers=headers)
+
+    if offload_header == ACCEL_REDIRECT:
+        relative_path = full_path.relative_to(BASE_DIR).as_posix()
+        headers[ACCEL_REDIRECT] = quote(f"{settings.file_offload_internal_prefix.rstrip('/')}/{relative_path}")
+    else:
+        headers[SENDFILE] = str(full_path.resolve())
+    return Response(media_type=media_type, headers=headers)
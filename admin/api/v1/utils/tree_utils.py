@@ -0,0 +1,48 @@
+"""
+Материализованный путь дерева категорий
+
+Путь категории - ID ее предков от корня и ее собственный ID через "/"
+с "/" в конце: "1/5/12/". Поддерево категории - все пути с префиксом ее пути,
+то есть диапазон строк [path, path без последнего "/" + "0"): в ASCII "0" идет
+сразу за "/". Поэтому выборка поддерева - один проход по диапазону индекса
+ix_categories_path без рекурсии (на PostgreSQL у колонки collation "C",
+чтобы строки сравнивались побайтово).
+"""
+from sqlalchemy import String, and_, func, select
+from sqlalchemy.orm import aliased
+from sqlalchemy.sql import ColumnElement, Select
+
+from core.models.models import Category
+
+PATH_SEPARATOR = "/"
+# Ключ pg_advisory_xact_lock дерева категорий: переносы и удаления поддеревьев
+# берут его монопольно, создание подкатегорий - разделяемо
+TREE_LOCK_KEY = 0x63617474  # "catt"
+# Символ, следующий за разделителем: верхняя граница диапазона поддерева
+_AFTER_SEPARATOR = chr(ord(PATH_SEPARATOR) + 1)
+
+
+def child_path(parent_path: str, category_id: int) -> str:
+    """Путь категории с ID category_id под родителем с путем parent_path ("" - корень)"""
+    return f"{parent_path}{category_id}{PATH_SEPARATOR}"
+
+
+def in_subtree(path_column, path: str) -> ColumnElement[bool]:
+    """Условие: путь path_column лежит в поддереве с корнем path (включая сам корень)"""
+    return and_(path_column >= path, path_column < path[:-1] + _AFTER_SEPARATOR)
+
+
+def in_subtree_of(path_column, root_path_column) -> ColumnElement[bool]:
+    """in_subtree, когда путь корня - колонка другой строки (JOIN), а не значение"""
+    upper = func.substr(root_path_column, 1, func.length(root_path_column) - 1, type_=String)
+    return and_(path_column >= root_path_column, path_column < upper.concat(_AFTER_SEPARATOR))
+
+
+def subtree_category_ids(category_id: int) -> Select:
+    """SELECT ID категорий поддерева category_id (включая ее саму) одним запросом по индексу пути"""
+    root = aliased(Category)
+    return (
+        select(Category.id)
+        .join(root, in_subtree_of(Category.path, root.path))
+        .where(root.id == category_id)
+    )
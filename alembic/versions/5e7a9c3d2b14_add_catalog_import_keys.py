@@ -0,0 +1,37 @@
+"""add catalog import keys
+
+Revision ID: 5e7a9c3d2b14
+Revises: 8b2d4e6f1a93
+Create Date: 2026-10-19 14:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e7a9c3d2b14'
+down_revision: Union[str, None] = '8b2d4e6f1a93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('products', sa.Column('external_id', sa.String(), nullable=True))
+    op.create_unique_constraint('uq_products_external_id', 'products', ['external_id'])
+    # Дубликаты одного пути у продукта не имеют смысла, оставляем самую раннюю запись
+    op.execute(
+        "DELETE FROM files f USING files d "
+        "WHERE f.product_id = d.product_id AND f.path = d.path AND f.id > d.id"
+    )
+    op.create_unique_constraint('uq_files_product_id_path', 'files', ['product_id', 'path'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_files_product_id_path', 'files', type_='unique')
+    op.drop_constraint('uq_products_external_id', 'products', type_='unique')
+    op.drop_column('products', 'external_id')
@@ -0,0 +1,41 @@
+"""add category tree
+
+Revision ID: c4f6a8b0d2e3
+Revises: b3e5a7c9d1f2
+Create Date: 2026-10-19 19:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4f6a8b0d2e3'
+down_revision: Union[str, None] = 'b3e5a7c9d1f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('categories', sa.Column('parent_id', sa.Integer(), nullable=True))
+    op.add_column('categories', sa.Column('path', sa.String(collation='C'), nullable=True))
+    # Существующие категории становятся корнями дерева
+    op.execute("UPDATE categories SET path = CAST(id AS VARCHAR) || '/'")
+    op.alter_column('categories', 'path', nullable=False)
+    op.create_foreign_key('categories_parent_id_fkey', 'categories', 'categories', ['parent_id'], ['id'])
+    op.create_index(op.f('ix_categories_parent_id'), 'categories', ['parent_id'], unique=False)
+    op.create_index('ix_categories_path', 'categories', ['path'], unique=False)
+    op.create_index('ix_products_category_id_is_active', 'products', ['category_id', 'is_active'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_products_category_id_is_active', table_name='products')
+    op.drop_index('ix_categories_path', table_name='categories')
+    op.drop_index(op.f('ix_categories_parent_id'), table_name='categories')
+    op.drop_constraint('categories_parent_id_fkey', 'categories', type_='foreignkey')
+    op.drop_column('categories', 'path')
+    op.drop_column('categories', 'parent_id')
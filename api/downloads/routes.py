@@ -0,0 +1,58 @@
+import asyncio
+from pathlib import Path
+from fastapi import APIRouter, HTTPException, Request, status
+
+from core.config import IMAGES_DIR, FILES_DIR
+from core.deadline import DeadlineRoute
+from admin.api.v1.dependencies import DBSession
+from admin.api.v1.files.crud import file_crud
+from admin.api.v1.products.crud import product_crud
+from admin.api.v1.utils.file_utils import get_sharded_path, resolve_storage_path
+from admin.api.v1.utils.offload_utils import content_disposition, offload_response
+
+# Подключается вместо монтирования /images и /files при settings.file_offload_enabled
+router = APIRouter(tags=["Downloads"], route_class=DeadlineRoute)
+
+
+def _storage_paths(path: str) -> list[str]:
+    """Путь из URL и его шардированный вариант: в БД может храниться любой из них"""
+    return list(dict.fromkeys([path, get_sharded_path(Path(path).name)]))
+
+
+def _not_found(detail: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=detail)
+
+
+@router.get(
+    "/images/{path:path}",
+    summary="Получить изображение продукта"
+)
+async def download_image(path: str, request: Request, session: DBSession):
+    """
+    Отдать изображение активного продукта.
+    За прокси (X-Sendfile-Type) байты отдает прокси, иначе - приложение.
+    """
+    if not await product_crud.has_active_image(session, _storage_paths(path)):
+        raise _not_found("Изображение не найдено")
+    full_path = await asyncio.to_thread(resolve_storage_path, path, IMAGES_DIR)
+    if full_path is None:
+        raise _not_found("Изображение не найдено")
+    return offload_response(request, full_path)
+
+
+@router.get(
+    "/files/{path:path}",
+    summary="Получить файл продукта"
+)
+async def download_file(path: str, request: Request, session: DBSession):
+    """
+    Отдать файл активного продукта под исходным именем.
+    За прокси (X-Sendfile-Type) байты отдает прокси, иначе - приложение.
+    """
+    file = await file_crud.get_active_by_path(session, _storage_paths(path))
+    if file is None:
+        raise _not_found("Файл не найден")
+    full_path = await asyncio.to_thread(resolve_storage_path, path, FILES_DIR)
+    if full_path is None:
+        raise _not_found("Файл не найден")
+    return offload_response(request, full_path, {"Content-Disposition": content_disposition(file.name)})
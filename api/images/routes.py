@@ -0,0 +1,89 @@
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, HTTPException, status, Query
+from fastapi.responses import FileResponse
+
+from core.config import IMAGES_DIR
+from admin.api.v1.utils.file_utils import get_file_extension, resolve_storage_path
+from admin.api.v1.utils.image_utils import (
+    RESIZE_FORMATS,
+    RESIZABLE_EXTENSIONS,
+    ImageDecodeError,
+    image_cache,
+    parse_size,
+)
+
+router = APIRouter(prefix="/images", tags=["Images"])
+
+# Формат по умолчанию: сохраняем исходный, GIF отдаем как PNG (без анимации)
+DEFAULT_FORMATS = {
+    ".jpg": "jpeg",
+    ".jpeg": "jpeg",
+    ".png": "png",
+    ".gif": "png",
+    ".webp": "webp",
+}
+
+
+@router.get(
+    "/{width:int}x{height:int}/{name:path}",
+    response_class=FileResponse,
+    summary="Получить уменьшенную копию изображения"
+)
+async def get_resized_image(
+    width: int,
+    height: int,
+    name: str,
+    format: Optional[str] = Query(
+        None,
+        pattern="^(jpeg|png|webp)$",
+        description="Формат результата (по умолчанию - как у оригинала)"
+    )
+):
+    """
+    Получить уменьшенную копию изображения, вписанную в размер {width}x{height}.
+    Разрешены только размеры из настроек. Копии кэшируются на диске.
+    """
+    size = f"{width}x{height}"
+    if parse_size(size) is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Недопустимый размер изображения"
+        )
+
+    extension = get_file_extension(name)
+    if extension not in RESIZABLE_EXTENSIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Недопустимый тип изображения. Разрешены: {', '.join(RESIZABLE_EXTENSIONS)}"
+        )
+
+    source = await asyncio.to_thread(resolve_storage_path, name, IMAGES_DIR)
+    if source is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Изображение не найдено"
+        )
+
+    image_format = format or DEFAULT_FORMATS[extension]
+    try:
+        # Старый и шардированный путь одного файла дают одну и ту же копию
+        target = await image_cache.get_or_create(
+            source,
+            source.relative_to(IMAGES_DIR).as_posix(),
+            size,
+            image_format
+        )
+    except ImageDecodeError:
+        # Остальные ошибки (пул процессов, запись в кэш) - ошибки сервера, 5xx
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Не удалось обработать изображение"
+        )
+
+    _, media_type = RESIZE_FORMATS[image_format]
+    return FileResponse(
+        target,
+        media_type=media_type,
+        headers={"Cache-Control": "public, max-age=31536000, immutable"}
+    )
@@ -0,0 +1,48 @@
+from fastapi import APIRouter, HTTPException, Request, Response, status
+
+from core.deadline import DeadlineRoute
+from core.compression import available_encodings, negotiate_encoding, variant_etag
+from .schemas import CategoryProductsResponse
+from .snapshots import category_snapshots
+
+router = APIRouter(prefix="/categories", tags=["Categories"], route_class=DeadlineRoute)
+
+
+def _etag_matches(if_none_match: str, etags: tuple[str, ...]) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    candidates = {candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")}
+    return any(etag in candidates for etag in etags)
+
+
+@router.get(
+    "/{category_id}/products",
+    response_model=CategoryProductsResponse,
+    summary="Витрина категории: активные продукты с файлами"
+)
+async def get_category_products(category_id: int, request: Request):
+    """
+    Получить категорию и все ее активные продукты с файлами.
+    Ответ отдается из готового снимка (сжатый br/zstd/gzip вариант - по Accept-Encoding)
+    и поддерживает ETag / If-None-Match. После изменения каталога снимок
+    пересобирается в фоне, поэтому новые данные появляются с небольшой задержкой.
+    """
+    snapshot = await category_snapshots.get(category_id)
+    if snapshot is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Категория с ID {category_id} не найдена"
+        )
+
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    # У сжатого варианта свой ETag: это другое представление ресурса
+    etag = f'"{snapshot.etag}"'
+    headers = {"ETag": variant_etag(etag, encoding), "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    variants = (etag, *(variant_etag(etag, variant) for variant in available_encodings()))
+    if if_none_match and _etag_matches(if_none_match, variants):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return Response(content=await snapshot.content.get(encoding), media_type="application/json", headers=headers)
@@ -0,0 +1,11 @@
+from pydantic import BaseModel
+
+from admin.api.v1.categories.schemas import CategoryResponse
+from admin.api.v1.products.schemas import ProductResponse
+
+
+class CategoryProductsResponse(BaseModel):
+    """Витрина категории: активные продукты с файлами"""
+    category: CategoryResponse
+    items: list[ProductResponse]
+    total: int
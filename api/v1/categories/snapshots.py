@@ -0,0 +1,245 @@
+"""
+Снимки витрины категорий
+
+Для каждой категории воркер хранит готовый JSON документ ее активных продуктов
+с файлами и его сжатые варианты (core.compression), поэтому запрос витрины отдает байты без ORM
+и pydantic. Снимки собираются в фоне:
+
+- событие изменения (core.events) увеличивает счетчик версии затронутых категорий
+  и ставит пересборку; несколько изменений подряд дают одну пересборку,
+  а снимок, собранный на текущей версии, не пересобирается;
+- пока идет пересборка, отдается предыдущий снимок (stale-while-revalidate);
+- при старте все категории собираются параллельно (snapshot_build_concurrency).
+
+Категорию продукта до изменения снимки помнят сами (продукты собранных снимков),
+после изменения - из события (ChangeEvent.category_id).
+Пока доставка событий не гарантирована, снимки не используются.
+Массовые изменения без событий на каждую строку (импорт, скрипты обслуживания
+в scripts/) заканчиваются сбросом (core.events.record_reset): воркеры очищают
+снимки и кэши целиком и собирают их заново.
+"""
+import asyncio
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from admin.api.v1.categories.schemas import CategoryResponse
+from admin.api.v1.products.schemas import ProductResponse
+from core.compression import CompressedBody, available_encodings
+from core.config import settings
+from core.events import (
+    ChangeEvent,
+    add_change_handler,
+    add_commit_handler,
+    add_reset_handler,
+    change_events_available,
+)
+from core.models import Category, Product, db_helper
+from .schemas import CategoryProductsResponse
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class CategorySnapshot:
+    """Закодированная витрина категории"""
+    version: int
+    etag: str
+    content: CompressedBody
+    product_ids: frozenset[int]
+
+
+class CategorySnapshots:
+    """Снимки витрин категорий воркера"""
+
+    def __init__(self, concurrency: int):
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._snapshots: dict[int, CategorySnapshot] = {}
+        # Счетчик изменений категории; снимок с меньшей версией устарел
+        self._versions: dict[int, int] = {}
+        self._builds: dict[int, asyncio.Task] = {}
+        # Категория продукта по собранным снимкам
+        self._product_categories: dict[int, int] = {}
+        self.builds = 0
+        self.skipped = 0
+
+    def _version(self, category_id: int) -> int:
+        return self._versions.get(category_id, 0)
+
+    def _touch(self, category_id: Optional[int]) -> None:
+        if category_id is None:
+            return
+        self._versions[category_id] = self._version(category_id) + 1
+        # Пересобираем только уже собранные витрины; остальные соберутся по запросу
+        if category_id in self._snapshots:
+            self._schedule(category_id)
+
+    def handle_change(self, change: ChangeEvent) -> None:
+        if change.entity == "category":
+            if change.op == "delete":
+                self._drop(change.id)
+            else:
+                self._touch(change.id)
+        elif change.entity == "product":
+            self._touch(self._product_categories.get(change.id))
+            if change.op != "delete":
+                self._touch(change.category_id)
+        elif change.product_id is not None:
+            self._touch(self._product_categories.get(change.product_id))
+
+    def clear(self) -> None:
+        """Пропущены события: все снимки устарели"""
+        for category_id in list(self._snapshots):
+            self._touch(category_id)
+
+    def _drop(self, category_id: int) -> None:
+        """Категория удалена: снимок устарел и больше не нужен"""
+        self._versions[category_id] = self._version(category_id) + 1
+        self._remove(category_id)
+
+    def _remove(self, category_id: int) -> None:
+        snapshot = self._snapshots.pop(category_id, None)
+        if snapshot is not None:
+            self._forget_products(category_id, snapshot.product_ids)
+
+    def _forget_products(self, category_id: int, product_ids: frozenset[int]) -> None:
+        for product_id in product_ids:
+            if self._product_categories.get(product_id) == category_id:
+                del self._product_categories[product_id]
+
+    def _schedule(self, category_id: int) -> asyncio.Task:
+        task = self._builds.get(category_id)
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.get_running_loop().create_task(self._rebuild(category_id))
+            self._builds[category_id] = task
+        return task
+
+    async def _rebuild(self, category_id: int) -> Optional[CategorySnapshot]:
+        try:
+            # Изменения во время сборки - повод собрать еще раз
+            while True:
+                snapshot = self._snapshots.get(category_id)
+                version = self._version(category_id)
+                if snapshot is not None and snapshot.version == version:
+                    self.skipped += 1
+                    return snapshot
+                async with self._semaphore:
+                    snapshot = await self._build(category_id, version)
+                if self._version(category_id) == version:
+                    return snapshot
+        except Exception:
+            logger.exception("Не удалось собрать витрину категории %s", category_id)
+            raise
+        finally:
+            if self._builds.get(category_id) is asyncio.current_task():
+                del self._builds[category_id]
+
+    async def _build(self, category_id: int, version: int) -> Optional[CategorySnapshot]:
+        async with db_helper.session_factory() as session:
+            category = await session.get(Category, category_id)
+            if category is None:
+                self._remove(category_id)
+                return None
+            result = await session.execute(
+                select(Product)
+                .options(selectinload(Product.files))
+                .where(Product.category_id == category_id, Product.is_active.is_(True))
+                .order_by(Product.id)
+            )
+            products = result.scalars().all()
+            document = CategoryProductsResponse(
+                category=CategoryResponse.model_validate(category),
+                items=[ProductResponse.model_validate(product) for product in products],
+                total=len(products),
+            )
+        self.builds += 1
+        # Сериализация и сжатие больших витрин - в пуле потоков, не блокируя цикл событий;
+        # сжатые варианты готовятся заранее для всех доступных кодировок
+        body = await asyncio.to_thread(_serialize, document)
+        etag = hashlib.sha1(body).hexdigest()[:20]
+        previous = self._snapshots.get(category_id)
+        if previous is not None and previous.etag == etag:
+            # Содержимое не изменилось: переиспользуем сжатые варианты
+            content = previous.content
+        else:
+            content = await asyncio.to_thread(CompressedBody(body).prepare, available_encodings())
+        product_ids = frozenset(product.id for product in document.items)
+
+        if self._version(category_id) != version and previous is not None:
+            # Пока собирали, категорию удалили или снова изменили - не публикуем
+            return previous
+        if previous is not None:
+            self._forget_products(category_id, previous.product_ids - product_ids)
+        for product_id in product_ids:
+            self._product_categories[product_id] = category_id
+        snapshot = CategorySnapshot(version, etag, content, product_ids)
+        self._snapshots[category_id] = snapshot
+        return snapshot
+
+    async def get(self, category_id: int) -> Optional[CategorySnapshot]:
+        """
+        Снимок витрины категории или None, если категории нет
+
+        Устаревший снимок отдается, пока в фоне собирается новый.
+        """
+        if not change_events_available():
+            async with self._semaphore:
+                return await self._build_uncached(category_id)
+        snapshot = self._snapshots.get(category_id)
+        if snapshot is None:
+            return await asyncio.shield(self._schedule(category_id))
+        if snapshot.version != self._version(category_id):
+            self._schedule(category_id)
+        return snapshot
+
+    async def _build_uncached(self, category_id: int) -> Optional[CategorySnapshot]:
+        # Без событий снимок нельзя поддерживать в актуальном состоянии
+        version = self._version(category_id)
+        snapshot = await self._build(category_id, version)
+        self._snapshots.pop(category_id, None)
+        return snapshot
+
+    async def warm_up(self) -> None:
+        """Собрать витрины всех категорий параллельно (не больше concurrency одновременно)"""
+        async with db_helper.session_factory() as session:
+            category_ids = (await session.scalars(select(Category.id))).all()
+        results = await asyncio.gather(
+            *(self._schedule(category_id) for category_id in category_ids),
+            return_exceptions=True
+        )
+        logger.info(
+            "Собраны витрины категорий: %s из %s",
+            sum(1 for result in results if isinstance(result, CategorySnapshot)), len(category_ids)
+        )
+
+
+def _serialize(document: CategoryProductsResponse) -> bytes:
+    return document.model_dump_json().encode()
+
+
+category_snapshots = CategorySnapshots(settings.snapshot_build_concurrency)
+add_change_handler(category_snapshots.handle_change)
+# Свои изменения учитываем сразу, не дожидаясь возврата события через NOTIFY
+add_commit_handler(category_snapshots.handle_change)
+add_reset_handler(category_snapshots.clear)
+
+_warm_up_task: Optional[asyncio.Task] = None
+
+
+def start_category_snapshots() -> None:
+    """Собрать витрины в фоне при старте воркера"""
+    global _warm_up_task
+    if settings.snapshot_warm_up:
+        _warm_up_task = asyncio.create_task(category_snapshots.warm_up())
+
+
+async def stop_category_snapshots() -> None:
+    global _warm_up_task
+    if _warm_up_task is not None:
+        _warm_up_task.cancel()
+        await asyncio.gather(_warm_up_task, return_exceptions=True)
+        _warm_up_task = None
@@ -0,0 +1,41 @@
+from urllib.parse import quote
+from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import StreamingResponse
+
+from core.deadline import DeadlineRoute
+from admin.api.v1.products.crud import product_crud
+from admin.api.v1.utils.archive_utils import iter_files_zip
+
+router = APIRouter(prefix="/products", tags=["Products"], route_class=DeadlineRoute)
+
+
+@router.get(
+    "/{product_id}/files.zip",
+    response_class=StreamingResponse,
+    summary="Скачать все файлы продукта одним архивом"
+)
+async def download_product_files(product_id: int):
+    """
+    Скачать все документы продукта одним ZIP архивом.
+    Архив формируется на лету при каждом запросе и отдается потоком.
+    """
+    product = await product_crud.get_cached(product_id)
+    if not product or not product.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Продукт с ID {product_id} не найден"
+        )
+
+    files = [(file.name, file.path) for file in product.files]
+    archive_name = quote(f"{product.name}.zip")
+
+    return StreamingResponse(
+        iter_files_zip(files),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": (
+                f"attachment; filename=\"product_{product_id}_files.zip\"; "
+                f"filename*=UTF-8''{archive_name}"
+            )
+        }
+    )
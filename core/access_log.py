@@ -0,0 +1,246 @@
+"""
+Журнал запросов (access log) в формате JSON
+
+Для каждого запроса к app и admin_app пишется JSON строка: метод, шаблон маршрута,
+путь, статус, длительность, число и время запросов к базе, байты тела запроса
+(загрузки) и ответа. Цикл событий только собирает поля и кладет их в очередь,
+а LogRecord собирает, форматирует и пишет в stdout или файл фоновый поток
+(QueueListener). Если поток не успевает и очередь заполнена, запись отбрасывается
+и учитывается в счетчике dropped, но запрос не ждет диска.
+
+Пишется доля запросов access_log_sample_rate (своя доля у шаблонов маршрутов
+из access_log_route_sample_rates); ошибки (5xx, необработанные исключения)
+и запросы дольше access_log_slow_ms пишутся всегда.
+"""
+import asyncio
+import json
+import logging
+import queue
+import random
+import sys
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueListener, WatchedFileHandler
+from typing import Optional
+
+from pydantic import BaseModel
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from core.config import settings
+
+# Имя логгера в записях журнала
+ACCESS_LOGGER = "access"
+
+
+class AccessLogStats(BaseModel):
+    """Счетчики журнала запросов воркера"""
+    logged: int
+    sampled_out: int
+    dropped: int
+    queued: int
+
+
+class _RequestStats:
+    __slots__ = ("statements", "db_time", "request_bytes", "response_bytes")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_time = 0.0
+        self.request_bytes = 0
+        self.response_bytes = 0
+
+
+_request_stats: ContextVar[Optional[_RequestStats]] = ContextVar("access_log_request_stats", default=None)
+
+# Ключ контекста выполнения с моментом начала запроса к базе
+STARTED_KEY = "_access_log_started"
+
+
+class JsonFormatter(logging.Formatter):
+    """Запись журнала одной JSON строкой (выполняется в потоке QueueListener)"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = getattr(record, "access", None)
+        if fields is None:
+            fields = {"level": record.levelname, "logger": record.name, "message": record.getMessage()}
+        at = datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds")
+        return json.dumps({"at": at, **fields}, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+class _AccessQueueListener(QueueListener):
+    """QueueListener, который сам собирает LogRecord из полей записи"""
+
+    def prepare(self, item: tuple[float, dict]) -> logging.LogRecord:
+        created, fields = item
+        return logging.makeLogRecord({
+            "name": ACCESS_LOGGER,
+            "levelno": logging.INFO,
+            "levelname": "INFO",
+            "msg": "access",
+            "created": created,
+            "access": fields,
+        })
+
+
+class AccessLog:
+    """
+    Очередь записей журнала запросов и фоновый поток, который их пишет
+
+    Цикл событий кладет в SimpleQueue только время и поля записи: вызов
+    logger.info с QueueHandler (LogRecord, блокировки обработчика и Queue)
+    стоит в цикле на два порядка дороже. LogRecord собирает поток QueueListener.
+    """
+
+    def __init__(self, queue_size: int):
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._queue_size = queue_size
+        self._listener: Optional[QueueListener] = None
+        self.logged = 0
+        self.sampled_out = 0
+        self.dropped = 0
+
+    def install(self, engine: AsyncEngine) -> None:
+        """Считать запросы движка к базе в записи журнала"""
+        event.listen(engine.sync_engine, "before_cursor_execute", self._before_execute)
+        event.listen(engine.sync_engine, "after_cursor_execute", self._after_execute)
+
+    @staticmethod
+    def _before_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+        if _request_stats.get() is not None:
+            context.__dict__[STARTED_KEY] = time.perf_counter()
+
+    @staticmethod
+    def _after_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+        started = context.__dict__.pop(STARTED_KEY, None)
+        stats = _request_stats.get()
+        if started is None or stats is None:
+            return
+        stats.statements += 1
+        stats.db_time += time.perf_counter() - started
+
+    def start(self) -> None:
+        if self._listener is not None:
+            return
+        if settings.access_log_file:
+            # WatchedFileHandler переоткрывает файл после logrotate
+            handler = WatchedFileHandler(settings.access_log_file, encoding="utf-8")
+        else:
+            handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(JsonFormatter())
+        self._listener = _AccessQueueListener(self._queue, handler)
+        self._listener.start()
+
+    async def stop(self) -> None:
+        """Дописать очередь и остановить поток"""
+        if self._listener is None:
+            return
+        listener, self._listener = self._listener, None
+        await asyncio.to_thread(listener.stop)
+        for handler in listener.handlers:
+            handler.close()
+
+    def record(
+        self,
+        scope: dict,
+        status_code: int,
+        duration: float,
+        stats: _RequestStats,
+        error: Optional[BaseException] = None
+    ) -> None:
+        route = _route_template(scope)
+        always = error is not None or status_code >= 500 or duration * 1000 >= settings.access_log_slow_ms
+        if not always:
+            rate = settings.access_log_route_sample_rates.get(route or "", settings.access_log_sample_rate)
+            if rate < 1.0 and random.random() >= rate:
+                self.sampled_out += 1
+                return
+        if self._queue.qsize() >= self._queue_size:
+            # Поток записи не успевает: теряем запись, но не задерживаем запрос
+            self.dropped += 1
+            return
+        self.logged += 1
+        client = scope.get("client")
+        fields = {
+            "method": scope["method"],
+            "route": route,
+            "path": scope["path"],
+            "status": status_code,
+            "duration_ms": round(duration * 1000, 3),
+            "db_statements": stats.statements,
+            "db_ms": round(stats.db_time * 1000, 3),
+            "request_bytes": stats.request_bytes,
+            "response_bytes": stats.response_bytes,
+            "client": client[0] if client else None,
+        }
+        if error is not None:
+            fields["error"] = type(error).__name__
+        self._queue.put((time.time(), fields))
+
+    def stats(self) -> AccessLogStats:
+        return AccessLogStats(
+            logged=self.logged,
+            sampled_out=self.sampled_out,
+            dropped=self.dropped,
+            queued=self._queue.qsize(),
+        )
+
+
+def _route_template(scope: dict) -> Optional[str]:
+    # Шаблон маршрута вместо пути: записи одного маршрута группируются, а id не раздувают число значений
+    path = getattr(scope.get("route"), "path_format", None)
+    if path is None:
+        return None
+    return scope.get("root_path", "") + path
+
+
+access_log = AccessLog(settings.access_log_queue_size)
+
+
+def start_access_log() -> None:
+    if settings.access_log_enabled:
+        access_log.start()
+
+
+async def stop_access_log() -> None:
+    await access_log.stop()
+
+
+class AccessLogMiddleware:
+    """ASGI middleware: запись журнала на каждый HTTP запрос"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        stats = _RequestStats()
+        status_code = 500
+        error = None
+
+        async def receive_counted():
+            message = await receive()
+            if message["type"] == "http.request":
+                stats.request_bytes += len(message.get("body", b""))
+            return message
+
+        async def send_counted(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                stats.response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        token = _request_stats.set(stats)
+        try:
+            await self.app(scope, receive_counted, send_counted)
+        except BaseException as exc:
+            error = exc
+            raise
+        finally:
+            _request_stats.reset(token)
+            access_log.record(scope, status_code, time.perf_counter() - started, stats, error)
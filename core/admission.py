@@ -0,0 +1,204 @@
+"""
+Контроль допуска загрузок файлов
+
+Загрузки ограничиваются в каждом воркере числом одновременных запросов
+и суммарным объемом тел запросов (по Content-Length). Запрос, которому не
+хватило места, ждет в ограниченной очереди (FIFO); если очередь заполнена
+или ожидание превысило таймаут, запрос сразу получает 503 с Retry-After.
+Допуск проверяется до чтения тела запроса, поэтому всплеск больших загрузок
+не занимает память воркера и не отнимает его у дешевых GET запросов.
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Optional
+
+from fastapi import HTTPException, Request, Response, params, status
+from pydantic import BaseModel
+
+from core.config import settings
+from core.deadline import DeadlineRoute
+
+
+class AdmissionStats(BaseModel):
+    """Метрики контроля допуска загрузок воркера"""
+    active: int
+    in_flight_bytes: int
+    queued: int
+    max_concurrency: int
+    max_in_flight_bytes: int
+    max_queue: int
+    admitted: int
+    rejected_queue_full: int
+    rejected_timeout: int
+    rejected_too_large: int
+    wait_seconds_total: float
+
+
+class AdmissionRejected(Exception):
+    """Запрос не допущен: status_code и текст ответа"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class AdmissionController:
+    """Семафор по числу запросов и по байтам с ограниченной очередью ожидания"""
+
+    def __init__(self, max_concurrency: int, max_in_flight_bytes: int, max_queue: int, queue_timeout: float):
+        self.max_concurrency = max_concurrency
+        self.max_in_flight_bytes = max_in_flight_bytes
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.in_flight_bytes = 0
+        # Ожидающие запросы: (объем, future допуска)
+        self._waiters: deque[tuple[int, asyncio.Future]] = deque()
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.rejected_too_large = 0
+        self.wait_seconds_total = 0.0
+
+    def _fits(self, size: int) -> bool:
+        return self.active < self.max_concurrency and self.in_flight_bytes + size <= self.max_in_flight_bytes
+
+    def _take(self, size: int) -> None:
+        self.active += 1
+        self.in_flight_bytes += size
+        self.admitted += 1
+
+    def _release(self, size: int) -> None:
+        self.active -= 1
+        self.in_flight_bytes -= size
+        self._wake()
+
+    def _wake(self) -> None:
+        """Допустить ожидающих по порядку, пока первый из них помещается"""
+        while self._waiters:
+            size, waiter = self._waiters[0]
+            if not self._fits(size):
+                return
+            self._waiters.popleft()
+            self._take(size)
+            waiter.set_result(None)
+
+    async def _acquire(self, size: int) -> None:
+        if size > self.max_in_flight_bytes:
+            self.rejected_too_large += 1
+            raise AdmissionRejected(
+                status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                f"Размер запроса превышает {self.max_in_flight_bytes} байт"
+            )
+        # Без очереди впереди допускаем сразу, иначе - строго по порядку
+        if not self._waiters and self._fits(size):
+            self._take(size)
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.rejected_queue_full += 1
+            raise AdmissionRejected(status.HTTP_503_SERVICE_UNAVAILABLE, "Сервер перегружен загрузками")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append((size, waiter))
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.done():
+                # Допуск пришел одновременно с таймаутом - пользуемся им
+                return
+            self._forget(size, waiter)
+            self.rejected_timeout += 1
+            raise AdmissionRejected(status.HTTP_503_SERVICE_UNAVAILABLE, "Превышено время ожидания загрузки")
+        except asyncio.CancelledError:
+            # Клиент ушел: если допуск уже выдан, возвращаем его
+            if waiter.done() and not waiter.cancelled():
+                self._release(size)
+            else:
+                self._forget(size, waiter)
+            raise
+        finally:
+            self.wait_seconds_total += time.monotonic() - started
+
+    def _forget(self, size: int, waiter: asyncio.Future) -> None:
+        """Убрать ожидающего из очереди; следующие за ним могут поместиться"""
+        waiter.cancel()
+        self._waiters.remove((size, waiter))
+        self._wake()
+
+    @asynccontextmanager
+    async def admit(self, size: int) -> AsyncIterator[None]:
+        """
+        Занять место для запроса объемом size байт на время блока
+
+        Raises:
+            AdmissionRejected: Если запрос не допущен (413 или 503)
+        """
+        await self._acquire(size)
+        try:
+            yield
+        finally:
+            self._release(size)
+
+    def stats(self) -> AdmissionStats:
+        return AdmissionStats(
+            active=self.active,
+            in_flight_bytes=self.in_flight_bytes,
+            queued=len(self._waiters),
+            max_concurrency=self.max_concurrency,
+            max_in_flight_bytes=self.max_in_flight_bytes,
+            max_queue=self.max_queue,
+            admitted=self.admitted,
+            rejected_queue_full=self.rejected_queue_full,
+            rejected_timeout=self.rejected_timeout,
+            rejected_too_large=self.rejected_too_large,
+            wait_seconds_total=round(self.wait_seconds_total, 3),
+        )
+
+
+upload_admission = AdmissionController(
+    max_concurrency=settings.upload_max_concurrency,
+    max_in_flight_bytes=settings.upload_max_in_flight_bytes,
+    max_queue=settings.upload_max_queue,
+    queue_timeout=settings.upload_queue_timeout_seconds,
+)
+
+
+def _has_file_params(route: DeadlineRoute) -> bool:
+    return any(isinstance(field.field_info, params.File) for field in route.dependant.body_params)
+
+
+class UploadAdmissionRoute(DeadlineRoute):
+    """
+    Маршрут, который пропускает загрузку файлов через upload_admission
+
+    Допуск выдается до разбора multipart тела и освобождается после
+    выполнения обработчика. Маршруты без файловых параметров не затрагиваются.
+    Дедлайн запроса (DeadlineRoute) начинает действовать после допуска.
+    """
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        if not _has_file_params(self):
+            return handler
+
+        async def admitted_handler(request: Request) -> Response:
+            content_length = request.headers.get("content-length")
+            if content_length is None or not content_length.isdigit():
+                raise HTTPException(
+                    status_code=status.HTTP_411_LENGTH_REQUIRED,
+                    detail="Для загрузки нужен заголовок Content-Length"
+                )
+            try:
+                async with upload_admission.admit(int(content_length)):
+                    return await handler(request)
+            except AdmissionRejected as e:
+                headers: Optional[dict] = None
+                if e.status_code == status.HTTP_503_SERVICE_UNAVAILABLE:
+                    headers = {"Retry-After": str(settings.upload_retry_after_seconds)}
+                raise HTTPException(status_code=e.status_code, detail=e.detail, headers=headers)
+
+        return admitted_handler
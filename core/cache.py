@@ -0,0 +1,147 @@
+"""
+Кэш сущностей каталога в памяти воркера
+
+Записи сбрасываются по событиям изменений (core.events), которые на PostgreSQL
+приходят во все воркеры через LISTEN/NOTIFY, поэтому TTL может быть длинным.
+Пока доставка событий не гарантирована (LISTEN соединение еще не установлено
+или оборвано), кэш не используется, а после переподключения очищается целиком.
+"""
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Hashable, Iterable, Optional, TypeVar
+
+from core.config import settings
+from core.events import (
+    ChangeEvent,
+    add_change_handler,
+    add_commit_handler,
+    add_reset_handler,
+    change_events_available,
+)
+
+T = TypeVar("T")
+Key = tuple[str, Hashable]
+
+
+class EntityCache:
+    """
+    TTL + LRU кэш по ключу (сущность, ID)
+
+    Запись может зависеть от других сущностей (продукт - от своих файлов):
+    изменение зависимости сбрасывает и запись.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # ключ -> (момент устаревания, значение, зависимости)
+        self._entries: OrderedDict[Key, tuple[float, object, tuple[Key, ...]]] = OrderedDict()
+        self._dependents: dict[Key, set[Key]] = {}
+        # Номер последнего сброса каждого ключа: загрузка, начатая раньше сброса,
+        # не должна положить в кэш уже устаревшее значение
+        self._version = 0
+        self._invalidated: OrderedDict[Key, int] = OrderedDict()
+        self._forgotten_version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Key):
+        """Получить значение или None, если его нет или оно устарело"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: Key, value, version: int, depends_on: Iterable[Key] = ()) -> None:
+        """
+        Сохранить значение, загруженное начиная с версии version
+
+        Если ключ был сброшен после начала загрузки, значение не сохраняется.
+        """
+        if version <= self._forgotten_version or self._invalidated.get(key, -1) >= version:
+            return
+        self._remove(key)
+        dependencies = tuple(depends_on)
+        self._entries[key] = (time.monotonic() + self.ttl, value, dependencies)
+        for dependency in dependencies:
+            self._dependents.setdefault(dependency, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: Key) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for dependency in entry[2]:
+            dependents = self._dependents.get(dependency)
+            if dependents is not None:
+                dependents.discard(key)
+                if not dependents:
+                    del self._dependents[dependency]
+
+    def invalidate(self, key: Key) -> None:
+        """Сбросить запись и все записи, которые от нее зависят"""
+        self._version += 1
+        self._invalidated[key] = self._version
+        self._invalidated.move_to_end(key)
+        # Журнал сбросов ограничен: для забытых сбросов отвергаем все более ранние загрузки
+        while len(self._invalidated) > self.max_entries:
+            _, version = self._invalidated.popitem(last=False)
+            self._forgotten_version = version
+
+        for dependent in self._dependents.pop(key, set()):
+            self._remove(dependent)
+        self._remove(key)
+
+    def clear(self) -> None:
+        """Сбросить все записи (например, после пропуска событий)"""
+        self._version += 1
+        self._forgotten_version = self._version
+        self._invalidated.clear()
+        self._entries.clear()
+        self._dependents.clear()
+
+    def handle_change(self, change: ChangeEvent) -> None:
+        self.invalidate((change.entity, change.id))
+        if change.product_id is not None:
+            self.invalidate(("product", change.product_id))
+
+    async def get_or_load(
+        self,
+        key: Key,
+        loader: Callable[[], Awaitable[Optional[T]]],
+        depends_on: Callable[[T], Iterable[Key]] = lambda value: ()
+    ) -> Optional[T]:
+        """
+        Получить значение из кэша или загрузить его
+
+        None (сущность не найдена) не кэшируется.
+        """
+        if not change_events_available():
+            return await loader()
+
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        version = self._version + 1
+        value = await loader()
+        if value is not None:
+            self.set(key, value, version, depends_on(value))
+        return value
+
+
+entity_cache = EntityCache(
+    max_entries=settings.entity_cache_max_entries,
+    ttl=settings.entity_cache_ttl_seconds,
+)
+add_change_handler(entity_cache.handle_change)
+# Свои изменения сбрасываем сразу, чтобы следующий запрос в этот же воркер их увидел
+add_commit_handler(entity_cache.handle_change)
+add_reset_handler(entity_cache.clear)
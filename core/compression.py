@@ -0,0 +1,260 @@
+"""
+Сжатие ответов (Content-Encoding: br, zstd, gzip)
+
+Кодировка выбирается по Accept-Encoding клиента (с учетом q) среди доступных:
+gzip есть всегда, br и zstd - если установлены brotli и zstandard. При равном q
+выигрывает порядок предпочтения сервера (compression_encodings).
+
+- CompressionMiddleware сжимает ответы app и admin_app целиком одним сообщением:
+  JSON и текст от compression_min_size байт. Потоковые ответы (выгрузки, архивы),
+  уже сжатые (Content-Encoding), частичные (206, Content-Range) и двоичные
+  (изображения, файлы) идут как есть.
+- CompressedBody - тело из кэша (снимок витрины) вместе со сжатыми вариантами:
+  каждая кодировка сжимается один раз, а не на каждом запросе. Маршрут,
+  отдающий такое тело, сам ставит Content-Encoding, и middleware его не трогает.
+
+Тела больше compression_thread_min_size сжимаются в пуле потоков, чтобы
+не блокировать цикл событий.
+
+У сжатого ответа свой ETag ("<etag>-<кодировка>"). Приложение (StaticFiles,
+FileResponse) знает только исходный, поэтому middleware убирает суффикс
+согласованной кодировки из If-None-Match перед вызовом приложения, а в ответ
+304 возвращает ETag сжатого варианта.
+"""
+import asyncio
+import gzip
+from typing import Callable, Iterable, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from core.config import settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Типы, которые имеет смысл сжимать; изображения и архивы уже сжаты
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/problem+json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/",
+)
+
+
+def _gzip(body: bytes) -> bytes:
+    # mtime=0: одинаковое тело - одинаковые байты (и ETag у кэшей)
+    return gzip.compress(body, compresslevel=settings.compression_gzip_level, mtime=0)
+
+
+def _brotli(body: bytes) -> bytes:
+    return brotli.compress(body, quality=settings.compression_brotli_quality)
+
+
+def _zstd(body: bytes) -> bytes:
+    return zstandard.ZstdCompressor(level=settings.compression_zstd_level).compress(body)
+
+
+_CODECS: dict[str, Callable[[bytes], bytes]] = {"gzip": _gzip}
+if brotli is not None:
+    _CODECS["br"] = _brotli
+if zstandard is not None:
+    _CODECS["zstd"] = _zstd
+
+
+def available_encodings() -> list[str]:
+    """Доступные кодировки в порядке предпочтения сервера"""
+    return [encoding for encoding in settings.compression_encodings if encoding in _CODECS]
+
+
+def _parse_accept_encoding(accept_encoding: str) -> dict[str, float]:
+    """Кодировки из Accept-Encoding с их q"""
+    qualities: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip().lower()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[coding] = quality
+    return qualities
+
+
+def accepts_encoding(accept_encoding: Optional[str], encoding: str) -> bool:
+    """Принимает ли клиент кодировку: явная запись важнее "*" (например, "*;q=0, gzip")"""
+    if not accept_encoding:
+        return False
+    qualities = _parse_accept_encoding(accept_encoding)
+    return qualities.get(encoding, qualities.get("*", 0.0)) > 0
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Кодировка ответа по заголовку Accept-Encoding
+
+    Returns:
+        br/zstd/gzip или None, если клиент не принимает ни одну доступную кодировку
+    """
+    if not accept_encoding:
+        return None
+    qualities = _parse_accept_encoding(accept_encoding)
+    wildcard = qualities.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for encoding in available_encodings():
+        quality = qualities.get(encoding, wildcard)
+        # Строго больше: при равном q остается кодировка, предпочтительная для сервера
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    return _CODECS[encoding](body)
+
+
+async def compress_async(body: bytes, encoding: str) -> bytes:
+    """Сжать тело; большое - в пуле потоков"""
+    if len(body) >= settings.compression_thread_min_size:
+        return await asyncio.to_thread(compress, body, encoding)
+    return compress(body, encoding)
+
+
+class CompressedBody:
+    """Тело ответа из кэша и его сжатые варианты (каждый сжимается один раз)"""
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self._variants: dict[str, bytes] = {}
+
+    def prepare(self, encodings: Iterable[str]) -> "CompressedBody":
+        """Сжать заранее (синхронно, например в потоке сборки кэша)"""
+        for encoding in encodings:
+            if encoding not in self._variants:
+                self._variants[encoding] = compress(self.body, encoding)
+        return self
+
+    async def get(self, encoding: Optional[str]) -> bytes:
+        """Тело в кодировке encoding (None - без сжатия)"""
+        if encoding is None:
+            return self.body
+        variant = self._variants.get(encoding)
+        if variant is None:
+            variant = self._variants[encoding] = await compress_async(self.body, encoding)
+        return variant
+
+
+def variant_etag(etag: str, encoding: Optional[str]) -> str:
+    """ETag сжатого варианта: другое представление ресурса - другой ETag"""
+    if encoding is None:
+        return etag
+    if etag.endswith('"'):
+        return f'{etag[:-1]}-{encoding}"'
+    return f"{etag}-{encoding}"
+
+
+def _strip_variant_etags(if_none_match: str, encoding: str) -> tuple[str, set[str]]:
+    """
+    Заменить ETag сжатого варианта в If-None-Match на исходный
+
+    Снимается только суффикс кодировки текущего ответа: 304 на тег другой
+    кодировки подтвердил бы клиенту тело, которого у него нет.
+
+    Returns:
+        tuple[str, set[str]]: (новое значение заголовка, исходные ETag замененных тегов)
+    """
+    suffix = f'-{encoding}"'
+    tags, stripped = [], set()
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.endswith(suffix):
+            tag = f'{tag[:-len(suffix)]}"'
+            stripped.add(tag)
+        tags.append(tag)
+    return ", ".join(tags), stripped
+
+
+def _compressible(headers: Headers) -> bool:
+    # Content-Range описывает байты исходного тела: сжатие сломало бы докачку
+    if "content-encoding" in headers or "content-range" in headers:
+        return False
+    content_type = headers.get("content-type", "").lower()
+    if not content_type.startswith(COMPRESSIBLE_TYPES):
+        return False
+    content_length = headers.get("content-length")
+    return content_length is None or int(content_length) >= settings.compression_min_size
+
+
+class CompressionMiddleware:
+    """ASGI middleware: сжатие ответов, отданных одним сообщением"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        request_headers = Headers(scope=scope)
+        encoding = negotiate_encoding(request_headers.get("accept-encoding"))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        stripped: set[str] = set()
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match:
+            if_none_match, stripped = _strip_variant_etags(if_none_match, encoding)
+            if stripped:
+                scope = dict(scope)
+                scope["headers"] = [
+                    (name, value) for name, value in scope["headers"] if name != b"if-none-match"
+                ] + [(b"if-none-match", if_none_match.encode("latin-1"))]
+
+        start = None
+
+        async def send_compressed(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                if message["status"] == 304 and stripped:
+                    headers = MutableHeaders(raw=list(message["headers"]))
+                    # Приложение подтвердило исходный ETag - клиенту возвращаем его сжатый вариант
+                    if headers.get("etag") in stripped:
+                        headers["ETag"] = variant_etag(headers["etag"], encoding)
+                        headers.add_vary_header("Accept-Encoding")
+                        message = {**message, "headers": headers.raw}
+                elif message["status"] not in (204, 206, 304) and _compressible(Headers(raw=message["headers"])):
+                    # Заголовки отправим вместе с телом, когда станет ясно, сжимать ли
+                    start = message
+                    return
+            elif message["type"] == "http.response.body" and start is not None:
+                response_start, start = start, None
+                body = message.get("body", b"")
+                if message.get("more_body", False) or len(body) < settings.compression_min_size:
+                    # Потоковый или маленький ответ - как есть
+                    await send(response_start)
+                else:
+                    body = await compress_async(body, encoding)
+                    headers = MutableHeaders(raw=list(response_start["headers"]))
+                    headers["Content-Encoding"] = encoding
+                    headers["Content-Length"] = str(len(body))
+                    headers.add_vary_header("Accept-Encoding")
+                    if "etag" in headers:
+                        headers["ETag"] = variant_etag(headers["etag"], encoding)
+                    await send({**response_start, "headers": headers.raw})
+                    message = {"type": "http.response.body", "body": body}
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
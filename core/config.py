@@ -1,4 +1,5 @@
 from pathlib import Path
+from typing import Literal
 from pydantic_settings import BaseSettings
 import os 
 from dotenv import load_dotenv
@@ -10,10 +11,15 @@ BASE_DIR = Path(__file__).parent.parent
 # Директории для загрузки файлов
 IMAGES_DIR = BASE_DIR / "images"
 FILES_DIR = BASE_DIR / "files"
+# Кэш уменьшенных копий изображений
+IMAGE_CACHE_DIR = BASE_DIR / "cache" / "images"
+# Профили запросов (создается при записи первого профиля)
+PROFILES_DIR = BASE_DIR / "cache" / "profiles"
 
 # Создаем директории если их нет
 IMAGES_DIR.mkdir(exist_ok=True)
 FILES_DIR.mkdir(exist_ok=True)
+IMAGE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
 # static files (для обратной совместимости)
 UPLOAD_DIR = "images"
@@ -35,5 +41,133 @@ class Setting(BaseSettings):
     db_echo: bool = False
     # db_echo: bool = True
 
+    # image resizing settings
+    image_resize_sizes: list[str] = ["100x100", "200x200", "400x400", "800x800"]
+    image_cache_max_bytes: int = 512 * 1024 * 1024
+    image_workers: int = 2
+
+    # change feed settings: отставание от текущего времени,
+    # чтобы не пропустить еще не зафиксированные транзакции
+    change_feed_lag_seconds: int = 5
+
+    # change events settings (SSE/WebSocket)
+    events_replay_size: int = 1000
+    events_queue_size: int = 100
+    events_keepalive_seconds: int = 15
+
+    # in-process entity cache settings (сбрасывается по событиям изменений)
+    entity_cache_ttl_seconds: int = 3600
+    entity_cache_max_entries: int = 10000
+
+    # catalog import settings
+    import_batch_size: int = 5000
+    import_max_errors: int = 1000
+
+    # catalog export settings: строк за одно чтение серверного курсора
+    export_batch_size: int = 1000
+
+    # upload admission control (на воркер): одновременные загрузки, суммарный
+    # объем тел запросов, очередь ожидания и подсказка клиенту при отказе
+    upload_max_concurrency: int = 4
+    upload_max_in_flight_bytes: int = 256 * 1024 * 1024
+    upload_max_queue: int = 16
+    upload_queue_timeout_seconds: float = 10.0
+    upload_retry_after_seconds: int = 5
+
+    # single-flight: одинаковые параллельные чтения воркера выполняются одним запросом
+    single_flight_enabled: bool = True
+
+    # batch fetch (?ids=): наибольшее число ID в запросе и в одном IN
+    batch_max_ids: int = 500
+
+    # request deadlines: время обработки по умолчанию, предел для X-Request-Timeout
+    # и время обработки загрузок файлов
+    request_timeout_seconds: float = 30.0
+    request_timeout_max_seconds: float = 300.0
+    upload_request_timeout_seconds: float = 300.0
+
+    # request profiling: секрет подписи токенов X-Profile, доля случайно
+    # профилируемых запросов, профилировщик ("sampling" - speedscope,
+    # "cprofile" - pstats), интервал сэмплирования и число хранимых профилей.
+    # Без секрета и с нулевой долей профилирование не подключается
+    profiling_secret: str = ""
+    profiling_sample_rate: float = 0.0
+    profiling_mode: Literal["sampling", "cprofile"] = "sampling"
+    profiling_interval_ms: float = 1.0
+    profiling_max_files: int = 50
+
+    # slow query log: порог записи в лог, доля медленных SELECT с EXPLAIN ANALYZE
+    # (PostgreSQL) и его таймаут, размер таблицы статистики, число длительностей
+    # для p95 на запрос и число последних медленных запросов
+    slow_query_threshold_ms: float = 200.0
+    slow_query_explain_sample_rate: float = 0.1
+    slow_query_explain_timeout_ms: float = 5000.0
+    slow_query_max_statements: int = 1000
+    slow_query_samples: int = 200
+    slow_query_recent_size: int = 100
+
+    # event loop monitor: период замера задержки цикла событий; в отладочном
+    # режиме - стек кода, заблокировавшего цикл дольше порога; строгий режим
+    # для тестов (> 0) - ошибка запроса, заблокировавшего цикл дольше порога
+    loop_monitor_enabled: bool = True
+    loop_monitor_interval_ms: float = 100.0
+    loop_monitor_debug: bool = False
+    loop_block_threshold_ms: float = 100.0
+    loop_block_fail_ms: float = 0.0
+
+    # idempotency keys: срок хранения ответа, ожидание повтором результата первого
+    # запроса и срок, после которого незавершенный запрос считается брошенным
+    idempotency_ttl_seconds: int = 24 * 60 * 60
+    idempotency_wait_seconds: float = 30.0
+    idempotency_lock_timeout_seconds: float = 600.0
+
+    # file offload: /images и /files отдаются через маршруты с проверкой доступа,
+    # а сами байты - обратным прокси: accel - X-Accel-Redirect (nginx), sendfile -
+    # X-Sendfile (Apache, lighttpd); прокси подтверждает режим заголовком
+    # X-Sendfile-Type. internal location nginx для BASE_DIR
+    file_offload_enabled: bool = False
+    file_offload_mode: Literal["accel", "sendfile"] = "accel"
+    file_offload_internal_prefix: str = "/protected"
+
+    # category snapshots: сборка витрин всех категорий при старте и число
+    # витрин, собираемых одновременно
+    snapshot_warm_up: bool = True
+    snapshot_build_concurrency: int = 4
+
+    # access log: JSON запись на запрос через очередь в фоновый поток; файл
+    # (пусто - stdout), доля записываемых запросов - общая и по шаблону маршрута
+    # (например {"/api/v1/categories/{category_id}/products": 0.01}); ошибки
+    # и запросы дольше access_log_slow_ms пишутся всегда; размер очереди
+    access_log_enabled: bool = False
+    access_log_file: str = ""
+    access_log_sample_rate: float = 1.0
+    access_log_route_sample_rates: dict[str, float] = {}
+    access_log_slow_ms: float = 1000.0
+    access_log_queue_size: int = 10000
+
+    # compression: сжатие ответов по Accept-Encoding (порядок предпочтения сервера;
+    # br и zstd - если установлены brotli и zstandard) от compression_min_size байт;
+    # тела от compression_thread_min_size сжимаются в пуле потоков; уровни сжатия
+    compression_enabled: bool = True
+    compression_encodings: list[str] = ["br", "zstd", "gzip"]
+    compression_min_size: int = 1024
+    compression_thread_min_size: int = 64 * 1024
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4
+    compression_zstd_level: int = 3
+
+    # server (python -m server): число воркеров (0 - по числу CPU), очередь
+    # принятых ядром соединений, keep-alive (дольше keepalive_timeout прокси,
+    # чтобы прокси не попадал на закрываемое воркером соединение), предел
+    # одновременных соединений воркера (дальше - 503) и перезапуск воркера
+    # после числа запросов (0 - без ограничений)
+    server_host: str = "0.0.0.0"
+    server_port: int = 8000
+    server_workers: int = 0
+    server_backlog: int = 2048
+    server_keep_alive_seconds: int = 75
+    server_limit_concurrency: int = 0
+    server_max_requests: int = 0
+
 
 settings = Setting()
\ No newline at end of file
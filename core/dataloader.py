@@ -0,0 +1,118 @@
+"""
+Пакетная загрузка по ключам в пределах одного запроса (DataLoader)
+
+Вызовы load() в одной итерации цикла событий собираются в пачку и выполняются
+одним запросом (WHERE id IN (...)), поэтому код, который перебирает ID
+в цикле или через asyncio.gather, не порождает N+1 запросов. Результаты
+запоминаются до конца запроса: повторная загрузка того же ключа не идет в базу.
+"""
+import asyncio
+from typing import Awaitable, Callable, Generic, Hashable, Iterable, Optional, Sequence, TypeVar
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+# Загрузка пачки ключей: найденные значения по ключу (отсутствующих ключей в словаре нет)
+BatchLoadFunction = Callable[[list[K]], Awaitable[dict[K, V]]]
+# CRUD метод get_by_ids(session, ids, fields)
+GetByIds = Callable[[AsyncSession, Sequence[int], Optional[Sequence[str]]], Awaitable[dict]]
+
+
+class DataLoader(Generic[K, V]):
+    """Загрузчик сущностей по ключу с объединением вызовов в пачки"""
+
+    def __init__(self, batch_load: BatchLoadFunction, max_batch_size: int, lock: Optional[asyncio.Lock] = None):
+        """
+        Args:
+            batch_load: Загрузка пачки ключей
+            max_batch_size: Наибольший размер пачки (больше - несколько запросов подряд)
+            lock: Общая блокировка загрузчиков одной сессии: AsyncSession нельзя
+                использовать параллельно, поэтому пачки выполняются по очереди
+        """
+        self._batch_load = batch_load
+        self._max_batch_size = max_batch_size
+        self._lock = lock or asyncio.Lock()
+        self._results: dict[K, asyncio.Future] = {}
+        self._queue: list[K] = []
+        self._tasks: set[asyncio.Task] = set()
+        self.batches = 0
+
+    def _schedule(self, key: K) -> asyncio.Future:
+        future = self._results.get(key)
+        if future is not None:
+            return future
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._results[key] = future
+        if not self._queue:
+            # Пачка уходит, когда текущая итерация цикла соберет все ключи
+            loop.call_soon(self._dispatch)
+        self._queue.append(key)
+        return future
+
+    def _dispatch(self) -> None:
+        keys, self._queue = self._queue, []
+        task = asyncio.ensure_future(self._load_keys(keys))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _load_keys(self, keys: list[K]) -> None:
+        async with self._lock:
+            for start in range(0, len(keys), self._max_batch_size):
+                await self._load_batch(keys[start:start + self._max_batch_size])
+
+    async def _load_batch(self, keys: list[K]) -> None:
+        self.batches += 1
+        try:
+            values = await self._batch_load(keys)
+        except Exception as e:
+            for key in keys:
+                # Ошибку получают ожидающие; повторная загрузка начнется заново
+                future = self._results.pop(key)
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for key in keys:
+            future = self._results[key]
+            if not future.done():
+                future.set_result(values.get(key))
+
+    async def load(self, key: K) -> Optional[V]:
+        """Загрузить значение по ключу (None, если его нет)"""
+        return await asyncio.shield(self._schedule(key))
+
+    async def load_many(self, keys: Iterable[K]) -> list[Optional[V]]:
+        """Загрузить значения по ключам одной пачкой в порядке ключей"""
+        futures = [self._schedule(key) for key in keys]
+        return list(await asyncio.shield(asyncio.gather(*futures)))
+
+
+class RequestLoaders:
+    """
+    Загрузчики сущностей по ID в пределах одного запроса
+
+    Загрузчик создается на каждый CRUD метод get_by_ids и набор полей (fields=):
+    loaders.get(product_crud.get_by_ids).load_many(ids). Все загрузчики работают
+    в сессии запроса и выполняют пачки по очереди.
+    """
+
+    def __init__(self, session: AsyncSession):
+        self._session = session
+        self._lock = asyncio.Lock()
+        self._loaders: dict[tuple, DataLoader] = {}
+
+    def get(self, get_by_ids: GetByIds, fields: Optional[tuple[str, ...]] = None) -> DataLoader:
+        key = (get_by_ids, fields)
+        loader = self._loaders.get(key)
+        if loader is None:
+            loader = DataLoader(
+                lambda ids: get_by_ids(self._session, ids, fields),
+                settings.batch_max_ids,
+                self._lock
+            )
+            self._loaders[key] = loader
+        return loader
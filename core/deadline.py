@@ -0,0 +1,159 @@
+"""
+Дедлайны запросов
+
+Каждый запрос получает время на обработку: значение маршрута по умолчанию
+(settings.request_timeout_seconds или @request_timeout) или заголовок
+X-Request-Timeout (в секундах, не больше request_timeout_max_seconds).
+Дедлайн действует в трех местах:
+
+- каждая транзакция сессии в запросе начинается с SET LOCAL statement_timeout
+  на оставшееся время (PostgreSQL), поэтому долгий запрос или ожидание
+  блокировки прерывается самой базой;
+- по истечении дедлайна обработчик отменяется, клиент получает 504;
+- если клиент отключился (маршруты без тела запроса), обработчик отменяется сразу.
+
+Отмена закрывает сессию запроса, и соединение возвращается в пул.
+"""
+import asyncio
+import time
+from contextvars import ContextVar
+from typing import Callable, Optional, TypeVar
+
+from fastapi import HTTPException, Request, Response, status
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from core.config import settings
+
+TIMEOUT_HEADER = "x-request-timeout"
+# SQLSTATE отмены запроса (statement_timeout) в PostgreSQL
+QUERY_CANCELED = "57014"
+# Код ответа, который nginx пишет в лог для запроса, закрытого клиентом
+CLIENT_CLOSED_REQUEST = 499
+
+F = TypeVar("F", bound=Callable)
+
+# Момент (time.monotonic), к которому должна завершиться обработка текущего запроса
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+def request_timeout(seconds: Optional[float]) -> Callable[[F], F]:
+    """
+    Задать время обработки маршрута по умолчанию (None - без дедлайна,
+    если клиент не передал X-Request-Timeout)
+    """
+    def decorator(endpoint: F) -> F:
+        endpoint.request_timeout = seconds
+        return endpoint
+    return decorator
+
+
+def remaining() -> Optional[float]:
+    """Сколько секунд осталось до дедлайна текущего запроса (None - дедлайна нет)"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def set_timeout(seconds: float) -> None:
+    """Задать дедлайн через seconds в текущем контексте (для задач, переживающих запрос)"""
+    _deadline.set(time.monotonic() + seconds)
+
+
+def is_query_canceled(error: DBAPIError) -> bool:
+    """Проверить, что запрос к базе прерван по statement_timeout"""
+    orig = error.orig
+    sqlstate = getattr(orig, "sqlstate", None) or getattr(orig, "pgcode", None)
+    return sqlstate == QUERY_CANCELED
+
+
+@event.listens_for(Session, "after_begin")
+def _set_statement_timeout(session: Session, transaction, connection) -> None:
+    left = remaining()
+    if left is None or connection.dialect.name != "postgresql":
+        return
+    # SET LOCAL действует до конца транзакции; 0 в PostgreSQL отключает таймаут
+    connection.exec_driver_sql(f"SET LOCAL statement_timeout = {max(1, int(left * 1000))}")
+
+
+def _get_timeout(request: Request, default: Optional[float]) -> Optional[float]:
+    header = request.headers.get(TIMEOUT_HEADER)
+    if header is None:
+        return default
+    try:
+        timeout = float(header)
+    except ValueError:
+        timeout = 0
+    if not timeout > 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="X-Request-Timeout должен быть положительным числом секунд"
+        )
+    return min(timeout, settings.request_timeout_max_seconds)
+
+
+async def _wait_disconnect(request: Request) -> None:
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+def _deadline_exceeded() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+        detail="Превышено время обработки запроса"
+    )
+
+
+class DeadlineRoute(APIRoute):
+    """
+    Маршрут с дедлайном обработки
+
+    Отключение клиента отслеживается только у маршрутов без тела: чтение
+    сообщений ASGI до обработчика забрало бы у него тело запроса.
+    """
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        default = getattr(self.endpoint, "request_timeout", settings.request_timeout_seconds)
+        watch_disconnect = self.body_field is None
+
+        async def deadline_handler(request: Request) -> Response:
+            timeout = _get_timeout(request, default)
+            if timeout is None and not watch_disconnect:
+                return await handler(request)
+
+            token = _deadline.set(time.monotonic() + timeout if timeout is not None else None)
+            try:
+                # Задача наследует контекст с дедлайном
+                work = asyncio.ensure_future(handler(request))
+            finally:
+                _deadline.reset(token)
+            waiters = {work}
+            if watch_disconnect:
+                waiters.add(asyncio.ensure_future(_wait_disconnect(request)))
+
+            try:
+                done, _ = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for task in waiters:
+                    task.cancel()
+            if work not in done:
+                # Дождаться отмены: сессия закроется и вернет соединение в пул
+                await asyncio.gather(work, return_exceptions=True)
+                if done:
+                    return Response(status_code=CLIENT_CLOSED_REQUEST)
+                raise _deadline_exceeded()
+
+            try:
+                return work.result()
+            except DBAPIError as e:
+                if is_query_canceled(e):
+                    raise _deadline_exceeded()
+                raise
+
+        return deadline_handler
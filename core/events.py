@@ -0,0 +1,430 @@
+"""
+События изменения каталога
+
+CRUD операции регистрируют событие в сессии через record_change. На PostgreSQL
+при фиксации транзакции события отправляются через NOTIFY (в откатившейся
+транзакции они не доставляются), и каждый воркер получает их по своему
+LISTEN соединению. На других СУБД (SQLite в разработке) события доставляются
+только обработчикам текущего процесса после фиксации.
+"""
+import asyncio
+import json
+import logging
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Callable, Literal, Optional
+
+from pydantic import BaseModel
+from sqlalchemy import Text, bindparam, event, func, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Канал NOTIFY для событий каталога
+CHANNEL = "catalog_changes"
+# Ключи session.info: события незафиксированной транзакции и признак отправки NOTIFY
+PENDING_KEY = "pending_change_events"
+NOTIFIED_KEY = "change_events_notified"
+# Ключ session.info с запросом сброса и его сообщение в канале
+RESET_KEY = "pending_change_reset"
+RESET_PAYLOAD = "reset"
+# URL базы разбирается один раз: change_events_available вызывается на каждом чтении кэша
+DATABASE_URL = make_url(settings.db_url)
+# Между воркерами события доставляются через LISTEN/NOTIFY только на PostgreSQL
+NOTIFY_AVAILABLE = DATABASE_URL.get_backend_name() == "postgresql"
+
+
+class ChangeEvent(BaseModel):
+    """Компактное событие изменения сущности каталога"""
+    entity: Literal["category", "product", "file"]
+    id: int
+    op: Literal["create", "update", "delete"]
+    updated_at: Optional[datetime] = None
+    # Для файлов - продукт, к которому относится файл
+    product_id: Optional[int] = None
+    # Для продуктов - категория продукта после изменения
+    category_id: Optional[int] = None
+
+
+ChangeHandler = Callable[[ChangeEvent], None]
+ResetHandler = Callable[[], None]
+
+_change_handlers: list[ChangeHandler] = []
+_commit_handlers: list[ChangeHandler] = []
+_reset_handlers: list[ResetHandler] = []
+
+
+def add_change_handler(handler: ChangeHandler) -> None:
+    """Подписать обработчик на события изменений (вызывается в цикле событий воркера)"""
+    _change_handlers.append(handler)
+
+
+def add_commit_handler(handler: ChangeHandler) -> None:
+    """
+    Подписать обработчик на изменения, зафиксированные в этом процессе
+
+    Вызывается сразу после COMMIT, не дожидаясь возврата события через NOTIFY.
+    """
+    _commit_handlers.append(handler)
+
+
+def add_reset_handler(handler: ResetHandler) -> None:
+    """Подписать обработчик на потерю событий (например, после переподключения LISTEN)"""
+    _reset_handlers.append(handler)
+
+
+def dispatch_change(change: ChangeEvent) -> None:
+    """Передать событие всем обработчикам текущего процесса"""
+    for handler in _change_handlers:
+        try:
+            handler(change)
+        except Exception:
+            logger.exception("Ошибка обработчика события %s", change)
+
+
+def dispatch_reset() -> None:
+    """Сообщить обработчикам, что часть событий могла быть пропущена"""
+    for handler in _reset_handlers:
+        try:
+            handler()
+        except Exception:
+            logger.exception("Ошибка обработчика сброса событий")
+
+
+def record_change(
+    session,
+    entity: str,
+    entity_id: int,
+    op: str,
+    updated_at: Optional[datetime] = None,
+    product_id: Optional[int] = None,
+    category_id: Optional[int] = None
+) -> None:
+    """
+    Зарегистрировать событие изменения в текущей транзакции
+
+    Событие будет отправлено только после успешной фиксации транзакции.
+    """
+    # AsyncSession и Session хранят info в одном словаре
+    session.info.setdefault(PENDING_KEY, []).append(
+        ChangeEvent(
+            entity=entity,
+            id=entity_id,
+            op=op,
+            updated_at=updated_at,
+            product_id=product_id,
+            category_id=category_id
+        )
+    )
+
+
+def record_reset(session) -> None:
+    """
+    Запросить сброс вместо отдельных событий после фиксации транзакции
+
+    Для массовых изменений (импорт): подписчики получают reset и догоняют
+    изменения через ленту, кэши воркеров очищаются целиком.
+    """
+    session.info[RESET_KEY] = True
+
+
+@event.listens_for(Session, "before_commit")
+def _notify_pending(session: Session) -> None:
+    changes = session.info.get(PENDING_KEY, [])
+    reset = session.info.get(RESET_KEY, False)
+    if not (changes or reset) or session.get_bind().dialect.name != "postgresql":
+        return
+    # Один запрос на все события транзакции; PostgreSQL доставит их после COMMIT
+    payloads = bindparam(
+        "payloads",
+        [RESET_PAYLOAD] if reset else [change.model_dump_json() for change in changes],
+        type_=ARRAY(Text)
+    )
+    session.execute(select(func.pg_notify(CHANNEL, func.unnest(payloads))))
+    session.info[NOTIFIED_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _dispatch_pending(session: Session) -> None:
+    changes = session.info.pop(PENDING_KEY, [])
+    reset = session.info.pop(RESET_KEY, False)
+    if not session.info.pop(NOTIFIED_KEY, False):
+        # Без NOTIFY события доставляются только внутри процесса
+        if reset:
+            dispatch_reset()
+            return
+        for change in changes:
+            dispatch_change(change)
+        return
+    for change in changes:
+        for handler in _commit_handlers:
+            try:
+                handler(change)
+            except Exception:
+                logger.exception("Ошибка обработчика события %s", change)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending(session: Session) -> None:
+    session.info.pop(PENDING_KEY, None)
+    session.info.pop(NOTIFIED_KEY, None)
+    session.info.pop(RESET_KEY, None)
+
+
+class ChangeListener:
+    """
+    Выделенное LISTEN соединение воркера
+
+    При обрыве соединение восстанавливается с паузой. NOTIFY, отправленные
+    во время обрыва, теряются, поэтому после переподключения вызывается dispatch_reset.
+    """
+
+    def __init__(self, url: str, channel: str = CHANNEL, retry_seconds: float = 1.0):
+        self.url = url
+        self.channel = channel
+        self.retry_seconds = retry_seconds
+        self._task: Optional[asyncio.Task] = None
+        # Установлено ли LISTEN соединение прямо сейчас
+        self.connected = False
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _on_notify(self, connection, pid, channel, payload: str) -> None:
+        if payload == RESET_PAYLOAD:
+            dispatch_reset()
+            return
+        try:
+            change = ChangeEvent.model_validate_json(payload)
+        except ValueError:
+            logger.warning("Некорректное событие в канале %s: %s", channel, payload)
+            return
+        dispatch_change(change)
+
+    async def _run(self) -> None:
+        import asyncpg
+
+        connected_before = False
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.url)
+                lost = asyncio.Event()
+                connection.add_termination_listener(lambda _: lost.set())
+                await connection.add_listener(self.channel, self._on_notify)
+                self.connected = True
+                if connected_before:
+                    dispatch_reset()
+                connected_before = True
+                await lost.wait()
+                logger.warning("LISTEN соединение потеряно, переподключение")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Не удалось подключиться к LISTEN, повтор через %s с", self.retry_seconds)
+            finally:
+                self.connected = False
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(self.retry_seconds)
+
+
+class ChangeMessage:
+    """Событие с номером и заранее сериализованными кадрами SSE и WebSocket"""
+
+    __slots__ = ("seq", "event_id", "sse", "ws")
+
+    def __init__(self, seq: int, event_id: str, sse: str, ws: Optional[str]):
+        self.seq = seq
+        self.event_id = event_id
+        self.sse = sse
+        self.ws = ws
+
+    @classmethod
+    def from_change(cls, seq: int, event_id: str, change: ChangeEvent) -> "ChangeMessage":
+        data = change.model_dump(mode="json")
+        return cls(
+            seq,
+            event_id,
+            f"id: {event_id}\nevent: change\ndata: {json.dumps(data)}\n\n",
+            json.dumps({"type": "change", "event_id": event_id, **data})
+        )
+
+
+# Комментарий SSE, который держит простаивающее соединение открытым через прокси.
+# В WebSocket не отправляется: там есть ping на уровне протокола
+KEEPALIVE = ChangeMessage(0, "", ": ping\n\n", None)
+
+
+class Subscriber:
+    """Подписчик с ограниченной очередью"""
+
+    __slots__ = ("queue",)
+
+    def __init__(self, queue_size: int):
+        # Место под маркер переполнения
+        self.queue: asyncio.Queue[Optional[ChangeMessage]] = asyncio.Queue(queue_size + 1)
+
+    def put(self, message: ChangeMessage) -> bool:
+        """Положить событие в очередь; False если подписчик не успевает читать"""
+        if self.queue.qsize() >= self.queue.maxsize - 1:
+            return False
+        self.queue.put_nowait(message)
+        return True
+
+    def close(self) -> None:
+        """Завершить подписку: None в очереди означает конец потока"""
+        self.queue.put_nowait(None)
+
+
+class ChangeBroadcaster:
+    """
+    Рассылка событий подписчикам SSE/WebSocket одного воркера
+
+    Каждое событие сериализуется один раз и кладется в очереди подписчиков.
+    Подписчик, очередь которого заполнена, отключается: клиент переподключается
+    с Last-Event-ID и дочитывает пропущенное из буфера повтора. Номера событий
+    локальны для воркера, поэтому идентификатор содержит метку эпохи - если она
+    не совпадает (другой воркер, перезапуск, потеря событий) или событие уже
+    вытеснено из буфера, клиент получает reset и должен синхронизироваться
+    через ленту изменений.
+    """
+
+    def __init__(self, replay_size: int, queue_size: int):
+        self.queue_size = queue_size
+        self._buffer: deque[ChangeMessage] = deque(maxlen=replay_size)
+        self._subscribers: set[Subscriber] = set()
+        self._new_epoch()
+
+    def _new_epoch(self) -> None:
+        self.epoch = uuid.uuid4().hex[:12]
+        self._seq = 0
+        self._buffer.clear()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, change: ChangeEvent) -> None:
+        self._seq += 1
+        message = ChangeMessage.from_change(self._seq, f"{self.epoch}-{self._seq}", change)
+        self._buffer.append(message)
+        overflowed = [subscriber for subscriber in self._subscribers if not subscriber.put(message)]
+        for subscriber in overflowed:
+            self._subscribers.discard(subscriber)
+            subscriber.close()
+
+    def keepalive(self) -> None:
+        """
+        Положить KEEPALIVE простаивающим подписчикам
+
+        Один общий таймер вместо таймаута ожидания в каждом соединении:
+        при тысячах подписчиков это заметно дешевле.
+        """
+        for subscriber in self._subscribers:
+            if subscriber.queue.empty():
+                subscriber.queue.put_nowait(KEEPALIVE)
+
+    async def run_keepalive(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            self.keepalive()
+
+    def reset(self) -> None:
+        """Начать новую эпоху и отключить всех подписчиков: им нужна полная синхронизация"""
+        self._new_epoch()
+        for subscriber in self._subscribers:
+            subscriber.close()
+        self._subscribers.clear()
+
+    def subscribe(self, last_event_id: Optional[str] = None) -> tuple[Subscriber, list[ChangeMessage], bool]:
+        """
+        Подписаться на события
+
+        Returns:
+            tuple: (подписчик, события для повтора, нужен ли клиенту reset)
+        """
+        replay: list[ChangeMessage] = []
+        need_reset = False
+        if last_event_id:
+            epoch, _, seq = last_event_id.partition("-")
+            if epoch == self.epoch and seq.isdigit() and self._can_replay(int(seq)):
+                replay = [message for message in self._buffer if message.seq > int(seq)]
+            else:
+                need_reset = True
+
+        subscriber = Subscriber(self.queue_size)
+        self._subscribers.add(subscriber)
+        return subscriber, replay, need_reset
+
+    def _can_replay(self, seq: int) -> bool:
+        if seq > self._seq:
+            return False
+        oldest = self._buffer[0].seq if self._buffer else self._seq + 1
+        return seq + 1 >= oldest
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self._subscribers.discard(subscriber)
+
+
+broadcaster = ChangeBroadcaster(
+    replay_size=settings.events_replay_size,
+    queue_size=settings.events_queue_size,
+)
+add_change_handler(broadcaster.publish)
+add_reset_handler(broadcaster.reset)
+
+
+_listener: Optional[ChangeListener] = None
+_keepalive_task: Optional[asyncio.Task] = None
+
+
+def start_change_events() -> None:
+    """Запустить таймер keepalive и LISTEN соединение воркера (LISTEN только для PostgreSQL)"""
+    global _listener, _keepalive_task
+    if _keepalive_task is None:
+        _keepalive_task = asyncio.create_task(broadcaster.run_keepalive(settings.events_keepalive_seconds))
+
+    if not NOTIFY_AVAILABLE or _listener is not None:
+        return
+    # asyncpg принимает обычный DSN без имени драйвера SQLAlchemy
+    dsn = DATABASE_URL.set(drivername="postgresql").render_as_string(hide_password=False)
+    _listener = ChangeListener(dsn)
+    _listener.start()
+
+
+def change_events_available() -> bool:
+    """
+    Доставляются ли сейчас события изменений в этот воркер
+
+    На PostgreSQL - только пока установлено LISTEN соединение. На других СУБД
+    события доставляются внутри процесса и доступны всегда.
+    """
+    if not NOTIFY_AVAILABLE:
+        return True
+    return _listener is not None and _listener.connected
+
+
+async def stop_change_events() -> None:
+    """Остановить таймер keepalive и LISTEN соединение воркера"""
+    global _listener, _keepalive_task
+    if _keepalive_task is not None:
+        _keepalive_task.cancel()
+        _keepalive_task = None
+    if _listener is not None:
+        await _listener.stop()
+        _listener = None
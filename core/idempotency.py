@@ -0,0 +1,248 @@
+"""
+Идемпотентные запросы создания и загрузки (заголовок Idempotency-Key)
+
+Клиент, повторяющий запрос после таймаута, передает тот же Idempotency-Key.
+Первый запрос с ключом занимает строку в таблице idempotency_keys и выполняется;
+его ответ сохраняется в той же строке на idempotency_ttl_seconds.
+Повтор с этим ключом получает сохраненный ответ (заголовок Idempotent-Replayed),
+не читая тело запроса и не трогая диск и таблицы каталога. Повтор, пришедший,
+пока первый запрос выполняется, ждет его результата.
+
+Ключ привязан к запросу: метод, путь, Content-Length и тело (кроме multipart,
+чтобы не читать загрузку в память). Тот же ключ с другим запросом - 422.
+Если обработчик завершился ошибкой (HTTPException, 5xx) или прерван,
+ключ освобождается, и повтор выполняется заново.
+"""
+import asyncio
+import hashlib
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional, TypeVar
+
+from fastapi import HTTPException, Request, Response, status
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+
+from core.admission import UploadAdmissionRoute
+from core.config import settings
+from core.models import IdempotencyKey, db_helper
+
+IDEMPOTENCY_HEADER = "idempotency-key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+# Период проверки результата запроса, выполняющегося в другом воркере
+POLL_INTERVAL_SECONDS = 0.2
+
+F = TypeVar("F", bound=Callable)
+
+
+def idempotent(endpoint: F) -> F:
+    """Поддерживать Idempotency-Key у маршрута (роутер с route_class=IdempotentRoute)"""
+    endpoint.idempotent = True
+    return endpoint
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class IdempotencyStore:
+    """Ключи идемпотентности и сохраненные ответы в таблице idempotency_keys"""
+
+    def __init__(self):
+        # Ключи, которые выполняет этот воркер: повторы ждут future, а не опрашивают базу
+        self._in_flight: dict[str, asyncio.Future] = {}
+        self._purged_at = 0.0
+
+    async def claim(self, key: str, fingerprint: str) -> Optional[IdempotencyKey]:
+        """
+        Занять ключ для выполнения запроса
+
+        Returns:
+            None, если ключ занят этим вызовом, иначе существующая запись
+        """
+        now = _utcnow()
+        async with db_helper.session_factory() as session:
+            while True:
+                session.add(IdempotencyKey(
+                    key=key,
+                    fingerprint=fingerprint,
+                    created_at=now,
+                    expires_at=now + timedelta(seconds=settings.idempotency_ttl_seconds),
+                ))
+                try:
+                    await session.commit()
+                except IntegrityError:
+                    await session.rollback()
+                else:
+                    self._in_flight[key] = asyncio.get_running_loop().create_future()
+                    return None
+
+                record = await self._get(session, key)
+                if record is None:
+                    # Ключ освободили между INSERT и SELECT
+                    continue
+                stale = now - timedelta(seconds=settings.idempotency_lock_timeout_seconds)
+                if record.expires_at > now and (record.status_code is not None or record.created_at > stale):
+                    return record
+                # Истекший ответ или запрос, брошенный упавшим воркером: ключ можно занять заново
+                await session.execute(
+                    delete(IdempotencyKey)
+                    .where(IdempotencyKey.id == record.id)
+                )
+                await session.commit()
+
+    @staticmethod
+    async def _get(session, key: str) -> Optional[IdempotencyKey]:
+        return await session.scalar(select(IdempotencyKey).where(IdempotencyKey.key == key))
+
+    async def get(self, key: str) -> Optional[IdempotencyKey]:
+        async with db_helper.session_factory() as session:
+            return await self._get(session, key)
+
+    async def wait(self, key: str, timeout: float) -> Optional[IdempotencyKey]:
+        """
+        Дождаться результата запроса, занявшего ключ
+
+        Returns:
+            Запись с ответом или None, если ключ освобожден (запрос нужно выполнить заново)
+
+        Raises:
+            HTTPException: 409, если запрос не завершился за timeout
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            done = self._in_flight.get(key)
+            left = deadline - time.monotonic()
+            try:
+                if done is not None and done.get_loop() is asyncio.get_running_loop():
+                    await asyncio.wait_for(asyncio.shield(done), max(0.0, left))
+                else:
+                    await asyncio.sleep(max(0.0, min(POLL_INTERVAL_SECONDS, left)))
+            except asyncio.TimeoutError:
+                pass
+            record = await self.get(key)
+            if record is None or record.status_code is not None:
+                return record
+            if time.monotonic() >= deadline:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Запрос с этим Idempotency-Key еще выполняется"
+                )
+
+    async def complete(self, key: str, response: Response) -> None:
+        """Сохранить ответ запроса и разбудить ожидающих"""
+        try:
+            async with db_helper.session_factory() as session:
+                record = await self._get(session, key)
+                if record is not None:
+                    record.status_code = response.status_code
+                    record.media_type = response.media_type
+                    record.response_body = bytes(response.body)
+                    await session.commit()
+            await self._purge_expired()
+        finally:
+            self._finish(key)
+
+    async def release(self, key: str) -> None:
+        """Освободить ключ без ответа (повтор выполнит запрос заново)"""
+        try:
+            async with db_helper.session_factory() as session:
+                await session.execute(delete(IdempotencyKey).where(IdempotencyKey.key == key))
+                await session.commit()
+        finally:
+            self._finish(key)
+
+    def _finish(self, key: str) -> None:
+        done = self._in_flight.pop(key, None)
+        if done is not None and not done.done():
+            done.set_result(None)
+
+    async def _purge_expired(self) -> None:
+        # Истекшие ключи удаляются не чаще раза в минуту на воркер
+        if time.monotonic() - self._purged_at < 60:
+            return
+        self._purged_at = time.monotonic()
+        async with db_helper.session_factory() as session:
+            await session.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= _utcnow()))
+            await session.commit()
+
+
+idempotency_store = IdempotencyStore()
+
+
+def _check_key(key: str) -> None:
+    if not key or len(key) > MAX_KEY_LENGTH or not key.isprintable():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Idempotency-Key должен быть непустой строкой до {MAX_KEY_LENGTH} символов"
+        )
+
+
+async def _fingerprint(request: Request) -> str:
+    digest = hashlib.sha256()
+    digest.update(f"{request.method} {request.url.path}?{request.url.query}\n".encode())
+    digest.update(f"{request.headers.get('content-length', '')}\n".encode())
+    # Тело загрузки не читаем: multipart разбирается потоком после допуска
+    if not request.headers.get("content-type", "").startswith("multipart/"):
+        digest.update(await request.body())
+    return digest.hexdigest()
+
+
+def _replay(record: IdempotencyKey) -> Response:
+    return Response(
+        content=record.response_body,
+        status_code=record.status_code,
+        media_type=record.media_type,
+        headers={REPLAYED_HEADER: "true"},
+    )
+
+
+class IdempotentRoute(UploadAdmissionRoute):
+    """
+    Маршрут с поддержкой Idempotency-Key для обработчиков с @idempotent
+
+    Проверка ключа выполняется раньше контроля допуска загрузок и дедлайна:
+    повтор не ждет очереди загрузок и не читает тело запроса.
+    """
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        if not getattr(self.endpoint, "idempotent", False):
+            return handler
+
+        async def idempotent_handler(request: Request) -> Response:
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if key is None:
+                return await handler(request)
+            _check_key(key)
+            fingerprint = await _fingerprint(request)
+
+            while True:
+                record = await idempotency_store.claim(key, fingerprint)
+                if record is None:
+                    break
+                if record.fingerprint != fingerprint:
+                    raise HTTPException(
+                        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                        detail="Idempotency-Key уже использован с другим запросом"
+                    )
+                if record.status_code is None:
+                    record = await idempotency_store.wait(key, settings.idempotency_wait_seconds)
+                    if record is None:
+                        # Первый запрос не удался - выполняем сами
+                        continue
+                return _replay(record)
+
+            try:
+                response = await handler(request)
+            except BaseException:
+                await asyncio.shield(idempotency_store.release(key))
+                raise
+            if response.status_code >= 500 or not hasattr(response, "body"):
+                await asyncio.shield(idempotency_store.release(key))
+            else:
+                await asyncio.shield(idempotency_store.complete(key, response))
+            return response
+
+        return idempotent_handler
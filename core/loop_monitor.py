@@ -0,0 +1,210 @@
+"""
+Мониторинг цикла событий
+
+- Задержка цикла: фоновая задача засыпает на loop_monitor_interval_ms и меряет,
+  насколько позже срока она проснулась. Задержки копятся в гистограмме
+  (GET /admin/api/v1/metrics/event-loop).
+- Отладочный режим (loop_monitor_debug): сторожевой поток замечает, что цикл
+  не отвечает дольше loop_block_threshold_ms, и пишет в лог стек потока цикла
+  в этот момент, то есть код, который его заблокировал.
+- Строгий режим для тестов (loop_block_fail_ms > 0): время каждого шага цикла
+  меряется, и запрос, шаг которого занял дольше порога, завершается
+  BlockingCallError (в тестах с TestClient - падением теста).
+
+Строгий режим подменяет asyncio.Handle._run и работает только
+со стандартным циклом asyncio.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from asyncio import events
+from contextvars import ContextVar
+from typing import Optional
+
+from pydantic import BaseModel
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Верхние границы корзин гистограммы задержки, мс
+LAG_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+# Блокировки цикла шагами текущего запроса (строгий режим): (мс, шаг)
+_request_blocks: ContextVar[Optional[list[tuple[float, str]]]] = ContextVar("loop_request_blocks", default=None)
+
+
+class LagBucket(BaseModel):
+    """Корзина гистограммы: число замеров с задержкой не больше le мс (None - +Inf)"""
+    le: Optional[float]
+    count: int
+
+
+class LoopLagStats(BaseModel):
+    """Гистограмма задержки цикла событий воркера"""
+    interval_ms: float
+    count: int
+    sum_ms: float
+    max_ms: float
+    last_ms: float
+    buckets: list[LagBucket]
+    blocked: int
+
+
+class BlockingCallError(RuntimeError):
+    """Запрос заблокировал цикл событий дольше loop_block_fail_ms (строгий режим)"""
+
+
+class LoopMonitor:
+    """Замер задержки цикла событий и сторожевой поток отладочного режима"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+        # Момент последнего пробуждения задачи замера (time.monotonic)
+        self._heartbeat = 0.0
+        self._counts = [0] * (len(LAG_BUCKETS_MS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.last = 0.0
+        self.blocked = 0
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        if settings.loop_monitor_debug:
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._stopped.set()
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        if self._watchdog is not None:
+            await asyncio.to_thread(self._watchdog.join)
+            self._watchdog = None
+
+    async def _run(self) -> None:
+        interval = settings.loop_monitor_interval_ms / 1000
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(interval)
+            self._heartbeat = time.monotonic()
+            self._observe(max(0.0, self._heartbeat - started - interval) * 1000)
+
+    def _observe(self, lag_ms: float) -> None:
+        self.count += 1
+        self.sum += lag_ms
+        self.max = max(self.max, lag_ms)
+        self.last = lag_ms
+        for index, bound in enumerate(LAG_BUCKETS_MS):
+            if lag_ms <= bound:
+                self._counts[index] += 1
+                return
+        self._counts[-1] += 1
+
+    def _watch(self) -> None:
+        threshold = settings.loop_block_threshold_ms / 1000
+        interval = settings.loop_monitor_interval_ms / 1000
+        reported = None
+        while not self._stopped.wait(threshold / 2):
+            heartbeat = self._heartbeat
+            stalled = time.monotonic() - heartbeat - interval
+            # Одна запись на каждую блокировку, пока цикл не проснется
+            if stalled < threshold or reported == heartbeat:
+                continue
+            reported = heartbeat
+            self.blocked += 1
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "стек недоступен"
+            logger.warning("Цикл событий заблокирован дольше %.0f мс:\n%s", stalled * 1000, stack)
+
+    def stats(self) -> LoopLagStats:
+        buckets = []
+        total = 0
+        for bound, count in zip((*LAG_BUCKETS_MS, None), self._counts):
+            total += count
+            buckets.append(LagBucket(le=bound, count=total))
+        return LoopLagStats(
+            interval_ms=settings.loop_monitor_interval_ms,
+            count=self.count,
+            sum_ms=round(self.sum, 3),
+            max_ms=round(self.max, 3),
+            last_ms=round(self.last, 3),
+            buckets=buckets,
+            blocked=self.blocked,
+        )
+
+
+loop_monitor = LoopMonitor()
+
+
+def start_loop_monitor() -> None:
+    if settings.loop_monitor_enabled:
+        loop_monitor.start()
+
+
+async def stop_loop_monitor() -> None:
+    await loop_monitor.stop()
+
+
+_original_run = events.Handle._run
+# Начало выполняющегося шага цикла (строгий режим)
+_step_started = 0.0
+
+
+def _timed_run(self: events.Handle) -> None:
+    global _step_started
+    started = _step_started = time.perf_counter()
+    _original_run(self)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if elapsed_ms < settings.loop_block_fail_ms or self._context is None:
+        return
+    blocks = self._context.get(_request_blocks)
+    if blocks is not None:
+        blocks.append((elapsed_ms, repr(self)))
+
+
+def install_blocking_detector() -> None:
+    """Мерить каждый шаг цикла событий (строгий режим)"""
+    events.Handle._run = _timed_run
+
+
+class BlockingDetectorMiddleware:
+    """ASGI middleware строгого режима: ошибка, если запрос заблокировал цикл событий"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        blocks: list[tuple[float, str]] = []
+        token = _request_blocks.set(blocks)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            # Текущий шаг еще не завершен: запрос мог заблокировать цикл в нем же
+            current_ms = (time.perf_counter() - _step_started) * 1000
+            if current_ms >= settings.loop_block_fail_ms:
+                blocks.append((current_ms, "текущий шаг запроса"))
+            _request_blocks.reset(token)
+        if blocks:
+            elapsed_ms, step = max(blocks)
+            raise BlockingCallError(
+                f"{scope['method']} {scope['path']} заблокировал цикл событий на {elapsed_ms:.1f} мс "
+                f"(порог {settings.loop_block_fail_ms} мс): {step}"
+            )
@@ -5,8 +5,10 @@ __all__ = (
     "Category",
     "Product", 
     "File",
+    "Tombstone",
+    "IdempotencyKey",
 )
 
 from .base import Base
 from .db_helper import DatabaseHelper, db_helper
-from .models import Category, Product, File
+from .models import Category, Product, File, Tombstone, IdempotencyKey
@@ -1,8 +1,11 @@
+import os
 from asyncio import current_task
 
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker, async_scoped_session
 
+from core.access_log import access_log
 from core.config import settings
+from core.slow_queries import slow_query_log
 
 
 class DatabaseHelper:
@@ -17,6 +20,17 @@ class DatabaseHelper:
             autocommit=False,
             expire_on_commit=False,
         )
+        slow_query_log.install(self.engine)
+        access_log.install(self.engine)
+
+    def reset_after_fork(self) -> None:
+        """
+        Новый пул соединений в дочернем процессе после fork
+
+        Соединения пула родителя принадлежат ему: дочерний процесс их не закрывает
+        (close=False) и не использует, а открывает свои.
+        """
+        self.engine.sync_engine.dispose(close=False)
 
     def get_scoped_session(self):
         session = async_scoped_session(
@@ -40,3 +54,6 @@ db_helper = DatabaseHelper(
     url=settings.db_url,
     echo=settings.db_echo,
 )
+
+# Воркеры, созданные fork из процесса с загруженным приложением (python -m server)
+os.register_at_fork(after_in_child=db_helper.reset_after_fork)
@@ -1,14 +1,25 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, TIMESTAMP, DateTime, Numeric, UniqueConstraint, Boolean, func
+from sqlalchemy import Column, Integer, String, ForeignKey, TIMESTAMP, DateTime, Numeric, UniqueConstraint, Boolean, Index, LargeBinary, func
 from sqlalchemy.orm import relationship
 from .base import Base
 
 
 class Category(Base):
     __tablename__ = "categories"
+    __table_args__ = (
+        # Курсор ленты изменений: (updated_at, id)
+        Index("ix_categories_updated_at_id", "updated_at", "id"),
+        # Поддерево категории - диапазон путей (admin/api/v1/utils/tree_utils.py)
+        Index("ix_categories_path", "path"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
     description = Column(String, nullable=True)
+    # Родительская категория (NULL - корень дерева)
+    parent_id = Column(Integer, ForeignKey("categories.id"), nullable=True, index=True)
+    # Материализованный путь: ID предков и самой категории через "/" ("1/5/12/");
+    # на PostgreSQL collation "C", чтобы диапазон путей совпадал с префиксом
+    path = Column(String().with_variant(String(collation="C"), "postgresql"), nullable=False)
     created_at = Column(TIMESTAMP, server_default=func.now())
     updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
     # Add relationship to products (one category - many products)
@@ -17,11 +28,25 @@ class Category(Base):
 
 class Product(Base):
     __tablename__ = "products"
+    __table_args__ = (
+        Index("ix_products_updated_at_id", "updated_at", "id"),
+        UniqueConstraint("external_id", name="uq_products_external_id"),
+        # Проверка доступа к изображению по пути из URL
+        Index("ix_products_image", "image"),
+        # Продукты категории и поддерева категорий (счетчики активных - только по индексу)
+        Index("ix_products_category_id_is_active", "category_id", "is_active"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
+    # Артикул поставщика: ключ для импорта каталога
+    external_id = Column(String, nullable=True)
     name = Column(String, nullable=False)
     description = Column(String, nullable=True)
     image = Column(String, nullable=True)
+    # Размеры изображения и миниатюра-заглушка (data URI) для отображения до загрузки оригинала
+    image_width = Column(Integer, nullable=True)
+    image_height = Column(Integer, nullable=True)
+    image_placeholder = Column(String, nullable=True)
     is_active = Column(Boolean, default=True)
     category_id = Column(Integer, ForeignKey("categories.id"), nullable=False)
     # Many products can belong to one category
@@ -34,6 +59,13 @@ class Product(Base):
 
 class File(Base):
     __tablename__ = "files"
+    __table_args__ = (
+        Index("ix_files_updated_at_id", "updated_at", "id"),
+        # Ключ для импорта каталога: один путь у продукта не повторяется
+        UniqueConstraint("product_id", "path", name="uq_files_product_id_path"),
+        # Проверка доступа к файлу по пути из URL
+        Index("ix_files_path", "path"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
     path = Column(String, nullable=False)
@@ -42,3 +74,31 @@ class File(Base):
     product = relationship("Product", back_populates="files")
     created_at = Column(TIMESTAMP, server_default=func.now())
     updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
+
+
+class Tombstone(Base):
+    __tablename__ = "tombstones"
+    __table_args__ = (Index("ix_tombstones_deleted_at_id", "deleted_at", "id"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    # Удаленная сущность: "category", "product" или "file"
+    entity = Column(String, nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    deleted_at = Column(TIMESTAMP, server_default=func.now())
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (UniqueConstraint("key", name="uq_idempotency_keys_key"),)
+
+    id = Column(Integer, primary_key=True)
+    # Значение заголовка Idempotency-Key
+    key = Column(String, nullable=False)
+    # Отпечаток запроса (метод, путь, тело): повтор ключа с другим запросом - ошибка
+    fingerprint = Column(String, nullable=False)
+    # Сохраненный ответ; пока status_code пуст, запрос еще выполняется
+    status_code = Column(Integer, nullable=True)
+    media_type = Column(String, nullable=True)
+    response_body = Column(LargeBinary, nullable=True)
+    created_at = Column(TIMESTAMP, nullable=False)
+    expires_at = Column(TIMESTAMP, nullable=False, index=True)
@@ -0,0 +1,238 @@
+"""
+Профилирование отдельных запросов по требованию
+
+Профилирование включается для одного запроса:
+- подписанным токеном в заголовке X-Profile или параметре __profile
+  (HMAC от settings.profiling_secret, см. scripts/profile_token.py);
+- или случайно с вероятностью settings.profiling_sample_rate.
+
+Профиль снимается сэмплирующим профилировщиком (стеки потока цикла событий
+раз в profiling_interval_ms, формат speedscope) или cProfile (формат pstats)
+и сохраняется в ограниченную директорию PROFILES_DIR. Оба профилировщика видят
+весь поток цикла событий, поэтому одновременно профилируется один запрос
+воркера, а в профиль попадает и работа параллельных запросов.
+
+Если секрет не задан и сэмплирование выключено, middleware не подключается.
+"""
+import asyncio
+import cProfile
+import hashlib
+import hmac
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qs
+
+from pydantic import BaseModel
+
+from core.config import PROFILES_DIR, settings
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_QUERY = "__profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+# Решение в scope: профилируется ли запрос (вложенное приложение не выбирает повторно)
+SCOPE_KEY = "profiling"
+
+PROFILE_SUFFIXES = {"sampling": ".speedscope.json", "cprofile": ".pstats"}
+
+# Профилируется не больше одного запроса воркера одновременно
+_busy = threading.Lock()
+
+
+class ProfileInfo(BaseModel):
+    """Сохраненный профиль запроса"""
+    name: str
+    size: int
+    created_at: float
+
+
+def profiling_enabled() -> bool:
+    return bool(settings.profiling_secret) or settings.profiling_sample_rate > 0
+
+
+def sign_profile_token(path: str, ttl_seconds: int = 300) -> str:
+    """Токен, разрешающий профилировать запросы к path в течение ttl_seconds"""
+    expires = int(time.time()) + ttl_seconds
+    return f"{expires}.{_signature(expires, path)}"
+
+
+def _signature(expires: int, path: str) -> str:
+    return hmac.new(settings.profiling_secret.encode(), f"{expires}:{path}".encode(), hashlib.sha256).hexdigest()
+
+
+def _valid_token(token: str, path: str) -> bool:
+    if not settings.profiling_secret:
+        return False
+    expires, _, signature = token.partition(".")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(signature, _signature(int(expires), path))
+
+
+def _requested(scope: dict) -> bool:
+    token = None
+    for name, value in scope["headers"]:
+        if name == PROFILE_HEADER:
+            token = value.decode("latin-1")
+            break
+    if token is None and PROFILE_QUERY.encode() in scope["query_string"]:
+        token = parse_qs(scope["query_string"].decode("latin-1")).get(PROFILE_QUERY, [None])[0]
+    if token is not None:
+        return _valid_token(token, scope["path"])
+    return settings.profiling_sample_rate > 0 and random.random() < settings.profiling_sample_rate
+
+
+class _SamplingProfiler:
+    """Снимает стек потока цикла событий из отдельного потока через sys._current_frames()"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._frames: dict[tuple[str, str, int], int] = {}
+        self._samples: list[list[int]] = []
+        self._weights: list[float] = []
+
+    def start(self) -> None:
+        self._started = time.perf_counter()
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._sampler.join()
+        self._duration = time.perf_counter() - self._started
+
+    def _run(self) -> None:
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            now = time.perf_counter()
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                key = (code.co_qualname, code.co_filename, code.co_firstlineno)
+                stack.append(self._frames.setdefault(key, len(self._frames)))
+                frame = frame.f_back
+            stack.reverse()
+            self._samples.append(stack)
+            self._weights.append(now - last)
+            last = now
+
+    def dump(self, path: Path, name: str) -> None:
+        frames = [{"name": function, "file": file, "line": line} for function, file, line in self._frames]
+        data = {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": self._duration,
+                "samples": self._samples,
+                "weights": self._weights,
+            }],
+            "name": name,
+            "exporter": "amicus-backend",
+        }
+        path.write_text(json.dumps(data))
+
+
+class _CProfileProfiler:
+    def __init__(self):
+        self._profile = cProfile.Profile()
+
+    def start(self) -> None:
+        self._profile.enable()
+
+    def stop(self) -> None:
+        self._profile.disable()
+
+    def dump(self, path: Path, name: str) -> None:
+        self._profile.dump_stats(path)
+
+
+def _profile_name(scope: dict, mode: str) -> str:
+    path = re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_") or "root"
+    stamp = time.strftime("%Y%m%dT%H%M%S")
+    return f"{stamp}-{scope['method']}-{path[:80]}-{uuid.uuid4().hex[:8]}{PROFILE_SUFFIXES[mode]}"
+
+
+def _stat_profiles() -> list[tuple[Path, os.stat_result]]:
+    """Файлы профилей с их stat, новые первыми; удаленные другим воркером пропускаются"""
+    if not PROFILES_DIR.is_dir():
+        return []
+    profiles = []
+    for path in PROFILES_DIR.iterdir():
+        try:
+            profiles.append((path, path.stat()))
+        except FileNotFoundError:
+            continue
+    return sorted(profiles, key=lambda profile: profile[1].st_mtime, reverse=True)
+
+
+def _write_profile(profiler, name: str) -> None:
+    PROFILES_DIR.mkdir(parents=True, exist_ok=True)
+    profiler.dump(PROFILES_DIR / name, name)
+    # Храним не больше profiling_max_files последних профилей
+    for old, _ in _stat_profiles()[settings.profiling_max_files:]:
+        old.unlink(missing_ok=True)
+
+
+def list_profiles() -> list[ProfileInfo]:
+    """Сохраненные профили, новые первыми"""
+    return [
+        ProfileInfo(name=path.name, size=stat.st_size, created_at=stat.st_mtime)
+        for path, stat in _stat_profiles()
+    ]
+
+
+def get_profile_path(name: str) -> Optional[Path]:
+    """Путь к сохраненному профилю или None (имя без путей)"""
+    path = PROFILES_DIR / Path(name).name
+    return path if path.is_file() else None
+
+
+class ProfilingMiddleware:
+    """ASGI middleware: профилирует запрос целиком, включая отдачу тела ответа"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or SCOPE_KEY in scope:
+            return await self.app(scope, receive, send)
+        # Решение (в том числе отрицательное) принимается один раз на запрос
+        scope[SCOPE_KEY] = _requested(scope) and _busy.acquire(blocking=False)
+        if not scope[SCOPE_KEY]:
+            return await self.app(scope, receive, send)
+
+        mode = settings.profiling_mode
+        name = _profile_name(scope, mode)
+        if mode == "cprofile":
+            profiler = _CProfileProfiler()
+        else:
+            profiler = _SamplingProfiler(settings.profiling_interval_ms / 1000)
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), (PROFILE_ID_HEADER, name.encode())]}
+            await send(message)
+
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profiler.stop()
+            try:
+                await asyncio.to_thread(_write_profile, profiler, name)
+            finally:
+                _busy.release()
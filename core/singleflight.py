@@ -0,0 +1,153 @@
+"""
+Объединение одинаковых параллельных чтений (single-flight)
+
+Когда популярную ссылку открывают сотни клиентов одновременно, одинаковые
+запросы внутри воркера ждут один общий запрос к базе и получают один и тот же
+результат. Общий запрос выполняется отдельной задачей со своей сессией, поэтому
+уход (отмена) любого из клиентов, включая первого, не прерывает его для остальных;
+задача отменяется, только когда ее больше никто не ждет.
+
+После изменения каталога выполняющиеся запросы забываются: запрос, пришедший
+после фиксации изменения, не присоединится к чтению, начатому до нее.
+"""
+import asyncio
+import contextvars
+import functools
+from typing import Awaitable, Callable, Hashable, Optional, TypeVar
+
+from pydantic import BaseModel
+
+from core.config import settings
+from core.deadline import set_timeout
+from core.events import ChangeEvent, add_change_handler, add_commit_handler, add_reset_handler
+
+T = TypeVar("T")
+
+
+class SingleFlightStats(BaseModel):
+    """Метрики группы объединяемых запросов"""
+    name: str
+    in_flight: int
+    executed: int
+    coalesced: int
+    abandoned: int
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Группа объединяемых запросов с общими метриками"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._flights: dict[Hashable, _Flight] = {}
+        # Выполнено общих запросов / присоединилось к уже выполняющимся / отменено без ожидающих
+        self.executed = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+    async def do(self, key: Hashable, loader: Callable[[], Awaitable[T]]) -> T:
+        """Выполнить loader или дождаться результата уже выполняющегося запроса с тем же ключом"""
+        flight = self._flights.get(key)
+        if flight is None:
+            # Общий запрос не наследует дедлайн первого клиента: каждый ожидающий ждет со своим.
+            # Но и без дедлайна он не остается: отмена ожидающих не прерывает запрос в базе,
+            # поэтому statement_timeout задается по наибольшему допустимому времени запроса
+            context = contextvars.copy_context()
+            context.run(set_timeout, settings.request_timeout_max_seconds)
+            flight = _Flight(asyncio.get_running_loop().create_task(loader(), context=context))
+            self._flights[key] = flight
+            flight.task.add_done_callback(functools.partial(self._finish, key, flight))
+            self.executed += 1
+        else:
+            self.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                # Результат больше никому не нужен; новые вызовы начнут свой запрос
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+                self.abandoned += 1
+
+    def _finish(self, key: Hashable, flight: _Flight, task: asyncio.Task) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not task.cancelled():
+            # Исключение уже получили ожидающие; не даем asyncio ругаться на необработанное
+            task.exception()
+
+    def forget(self) -> None:
+        """Не присоединять новые запросы к уже выполняющимся (они завершатся для своих ожидающих)"""
+        self._flights.clear()
+
+    def stats(self) -> SingleFlightStats:
+        return SingleFlightStats(
+            name=self.name,
+            in_flight=len(self._flights),
+            executed=self.executed,
+            coalesced=self.coalesced,
+            abandoned=self.abandoned,
+        )
+
+
+_groups: list[SingleFlight] = []
+
+
+def single_flight_group(name: str) -> SingleFlight:
+    """Создать группу, которая забывает выполняющиеся запросы при изменениях каталога"""
+    group = SingleFlight(name)
+    _groups.append(group)
+    return group
+
+
+def single_flight_stats() -> list[SingleFlightStats]:
+    return [group.stats() for group in _groups]
+
+
+def _default_key(*args, **kwargs) -> Hashable:
+    return args, tuple(sorted(kwargs.items()))
+
+
+def coalesce(group: SingleFlight, key: Optional[Callable[..., Hashable]] = None):
+    """
+    Объединять одинаковые параллельные вызовы асинхронной функции
+
+    Функция вызывается без сессии запроса и должна открыть свою, а ее результат
+    разделяется между ожидающими, поэтому его нельзя изменять.
+
+    Args:
+        group: Группа запросов (метрики и сброс)
+        key: Ключ по аргументам вызова (по умолчанию - все аргументы)
+    """
+    make_key = key or _default_key
+
+    def decorator(function: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs) -> T:
+            if not settings.single_flight_enabled:
+                return await function(*args, **kwargs)
+            return await group.do(make_key(*args, **kwargs), lambda: function(*args, **kwargs))
+        return wrapper
+
+    return decorator
+
+
+def _forget_all(change: Optional[ChangeEvent] = None) -> None:
+    for group in _groups:
+        group.forget()
+
+
+add_change_handler(_forget_all)
+add_commit_handler(_forget_all)
+add_reset_handler(_forget_all)
@@ -0,0 +1,272 @@
+"""
+Журнал медленных запросов к базе
+
+Каждый запрос движка учитывается в таблице по нормализованному SQL (число
+выполнений, суммарное время, p95). Запрос дольше slow_query_threshold_ms
+пишется в лог с нормализованным SQL, параметрами (секреты скрыты, длинные
+значения обрезаны), маршрутом, из которого он выполнен, и длительностью.
+Для доли медленных SELECT (slow_query_explain_sample_rate) на PostgreSQL
+в фоне снимается EXPLAIN (ANALYZE, BUFFERS) по отдельному соединению.
+
+Маршрут берется из scope запроса, который QueryContextMiddleware кладет
+в контекст, поэтому запросы вне HTTP (скрипты, фоновые задачи) идут без маршрута.
+"""
+import asyncio
+import functools
+import json
+import logging
+import random
+import re
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from pydantic import BaseModel
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Опция выполнения: не учитывать запросы соединения (EXPLAIN самого журнала)
+SKIP_OPTION = "slow_query_log"
+# Ключ контекста выполнения с моментом начала запроса
+STARTED_KEY = "_slow_query_started"
+REDACTED = "***"
+MAX_PARAM_LENGTH = 64
+MAX_PARAMS = 20
+
+_SENSITIVE_NAME = re.compile(r"password|secret|token|key|auth", re.IGNORECASE)
+_PLACEHOLDER = r"(?:\$\d+|\?|%s|%\(\w+\)s|(?<!:):\w+|__\[POSTCOMPILE_\w+\])"
+# IN (...) с любым числом параметров - один нормализованный запрос
+_PLACEHOLDER_LIST = re.compile(rf"\(\s*{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})+\s*\)")
+_SINGLE_PLACEHOLDER = re.compile(_PLACEHOLDER)
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+
+_request_scope: ContextVar[Optional[dict]] = ContextVar("slow_query_request_scope", default=None)
+
+
+class QueryStats(BaseModel):
+    """Статистика нормализованного запроса"""
+    statement: str
+    count: int
+    total_ms: float
+    mean_ms: float
+    p95_ms: float
+    max_ms: float
+    slow: int
+
+
+class SlowQuery(BaseModel):
+    """Запись журнала медленных запросов"""
+    at: datetime
+    statement: str
+    parameters: Any
+    route: Optional[str]
+    duration_ms: float
+    plan: Optional[Any] = None
+
+
+class _Entry:
+    __slots__ = ("count", "total", "max", "slow", "durations")
+
+    def __init__(self, samples: int):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.slow = 0
+        # Последние длительности для p95
+        self.durations: deque[float] = deque(maxlen=samples)
+
+
+# SQLAlchemy повторяет одни и те же скомпилированные строки: регулярные выражения
+# выполняются один раз на строку, а не на каждый запрос
+@functools.lru_cache(maxsize=settings.slow_query_max_statements)
+def normalize_sql(statement: str) -> str:
+    """SQL без значений: параметры и литералы заменены на ?, списки IN свернуты"""
+    statement = _STRING_LITERAL.sub("?", statement)
+    statement = _PLACEHOLDER_LIST.sub("(...)", statement)
+    statement = _SINGLE_PLACEHOLDER.sub("?", statement)
+    statement = _NUMBER_LITERAL.sub("?", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+def _redact_value(value: Any) -> Any:
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f"<{len(value)} bytes>"
+    if isinstance(value, str) and len(value) > MAX_PARAM_LENGTH:
+        return value[:MAX_PARAM_LENGTH] + "..."
+    if isinstance(value, (list, tuple)) and len(value) > MAX_PARAMS:
+        return [_redact_value(item) for item in value[:MAX_PARAMS]] + [f"... {len(value)} всего"]
+    if isinstance(value, (list, tuple)):
+        return [_redact_value(item) for item in value]
+    if isinstance(value, (int, float, bool)) or value is None:
+        return value
+    return str(value)[:MAX_PARAM_LENGTH]
+
+
+def redact_parameters(parameters: Any) -> Any:
+    """Параметры для лога: значения с «секретными» именами скрыты, длинные обрезаны"""
+    if isinstance(parameters, dict):
+        return {
+            name: REDACTED if _SENSITIVE_NAME.search(str(name)) else _redact_value(value)
+            for name, value in parameters.items()
+        }
+    return _redact_value(parameters)
+
+
+def _current_route() -> Optional[str]:
+    scope = _request_scope.get()
+    if scope is None:
+        return None
+    route = scope.get("route")
+    path = getattr(route, "path_format", None)
+    if path is None:
+        return f"{scope['method']} {scope['path']}"
+    return f"{scope['method']} {scope.get('root_path', '')}{path}"
+
+
+class SlowQueryLog:
+    """Таблица статистики запросов и журнал медленных запросов процесса"""
+
+    def __init__(self):
+        self._engine: Optional[AsyncEngine] = None
+        self._entries: dict[str, _Entry] = {}
+        self._recent: deque[SlowQuery] = deque(maxlen=settings.slow_query_recent_size)
+        self._explaining = False
+        self._tasks: set[asyncio.Task] = set()
+
+    def install(self, engine: AsyncEngine) -> None:
+        """Подключить учет запросов к движку (EXPLAIN выполняется через него же)"""
+        self._engine = engine
+        event.listen(engine.sync_engine, "before_cursor_execute", self._before_execute)
+        event.listen(engine.sync_engine, "after_cursor_execute", self._after_execute)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        context.__dict__[STARTED_KEY] = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        started = context.__dict__.pop(STARTED_KEY, None)
+        if started is None or not context.execution_options.get(SKIP_OPTION, True):
+            return
+        duration = time.perf_counter() - started
+        normalized = normalize_sql(statement)
+        entry = self._entry(normalized)
+        entry.count += 1
+        entry.total += duration
+        entry.max = max(entry.max, duration)
+        entry.durations.append(duration)
+        if duration * 1000 < settings.slow_query_threshold_ms:
+            return
+
+        entry.slow += 1
+        record = SlowQuery(
+            at=datetime.now(timezone.utc),
+            statement=normalized,
+            parameters=redact_parameters(parameters),
+            route=_current_route(),
+            duration_ms=round(duration * 1000, 3),
+        )
+        self._recent.append(record)
+        logger.warning(
+            "Медленный запрос %.1f мс [%s]: %s; параметры: %s",
+            record.duration_ms, record.route or "-", record.statement, record.parameters
+        )
+        if (
+            not executemany
+            and conn.dialect.name == "postgresql"
+            and normalized[:6].upper() == "SELECT"
+            and random.random() < settings.slow_query_explain_sample_rate
+        ):
+            self._schedule_explain(record, statement, parameters)
+
+    def _entry(self, normalized: str) -> _Entry:
+        entry = self._entries.get(normalized)
+        if entry is None:
+            if len(self._entries) >= settings.slow_query_max_statements:
+                # Вытесняем запрос с наименьшим суммарным временем
+                cheapest = min(self._entries, key=lambda key: self._entries[key].total)
+                del self._entries[cheapest]
+            entry = self._entries[normalized] = _Entry(settings.slow_query_samples)
+        return entry
+
+    def _schedule_explain(self, record: SlowQuery, statement: str, parameters: Any) -> None:
+        # Не больше одного EXPLAIN одновременно: журнал не должен сам нагружать базу
+        if self._explaining:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._explaining = True
+        task = loop.create_task(self._explain(record, statement, parameters))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _explain(self, record: SlowQuery, statement: str, parameters: Any) -> None:
+        try:
+            async with self._engine.connect() as connection:
+                connection = await connection.execution_options(**{SKIP_OPTION: False})
+                async with connection.begin() as transaction:
+                    timeout = max(1, int(settings.slow_query_explain_timeout_ms))
+                    await connection.exec_driver_sql(f"SET LOCAL statement_timeout = {timeout}")
+                    result = await connection.exec_driver_sql(
+                        f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {statement}", parameters
+                    )
+                    plan = result.scalar()
+                    await transaction.rollback()
+            record.plan = json.loads(plan) if isinstance(plan, str) else plan
+            logger.info("План медленного запроса [%s]: %s", record.route or "-", json.dumps(record.plan))
+        except Exception:
+            logger.exception("Не удалось снять EXPLAIN медленного запроса: %s", record.statement)
+        finally:
+            self._explaining = False
+
+    def top(self, limit: int, order_by: str = "total") -> list[QueryStats]:
+        """Самые дорогие нормализованные запросы"""
+        stats = [self._stats(statement, entry) for statement, entry in self._entries.items()]
+        key = {"total": "total_ms", "p95": "p95_ms", "count": "count", "max": "max_ms"}[order_by]
+        stats.sort(key=lambda item: getattr(item, key), reverse=True)
+        return stats[:limit]
+
+    def recent(self) -> list[SlowQuery]:
+        """Последние медленные запросы, новые первыми"""
+        return list(reversed(self._recent))
+
+    @staticmethod
+    def _stats(statement: str, entry: _Entry) -> QueryStats:
+        durations = sorted(entry.durations)
+        p95 = durations[min(len(durations) - 1, int(len(durations) * 0.95))] if durations else 0.0
+        return QueryStats(
+            statement=statement,
+            count=entry.count,
+            total_ms=round(entry.total * 1000, 3),
+            mean_ms=round(entry.total * 1000 / entry.count, 3) if entry.count else 0.0,
+            p95_ms=round(p95 * 1000, 3),
+            max_ms=round(entry.max * 1000, 3),
+            slow=entry.slow,
+        )
+
+
+slow_query_log = SlowQueryLog()
+
+
+class QueryContextMiddleware:
+    """ASGI middleware: делает scope запроса доступным журналу медленных запросов"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        token = _request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_scope.reset(token)
@@ -1,16 +1,37 @@
 from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
 from core.config import STATIC_DIR, STATIC_MOUNT_PATH, IMAGES_DIR, FILES_DIR, settings
 from core.models import Base, db_helper
+from core.events import start_change_events, stop_change_events
+from core.access_log import AccessLogMiddleware, start_access_log, stop_access_log
+from core.compression import CompressionMiddleware
+from core.profiling import ProfilingMiddleware, profiling_enabled
+from core.slow_queries import QueryContextMiddleware
+from core.loop_monitor import (
+    BlockingDetectorMiddleware, install_blocking_detector, start_loop_monitor, stop_loop_monitor
+)
 from admin.api.routes import router as admin_router
+from admin.api.v1.utils.file_utils import ShardedStaticFiles
+from admin.api.v1.utils.image_utils import shutdown_image_pool
 from api.routes import router as client_router
+from api.images import router as images_router
+from api.downloads import router as downloads_router
+from api.v1.categories.snapshots import start_category_snapshots, stop_category_snapshots
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    start_access_log()
+    start_change_events()
+    start_loop_monitor()
+    start_category_snapshots()
     yield
+    await stop_category_snapshots()
+    await stop_loop_monitor()
+    await stop_change_events()
+    shutdown_image_pool()
+    await stop_access_log()
 
 # Основное приложение
 app = FastAPI(
@@ -33,15 +54,34 @@ admin_app = FastAPI(
 # Подключение роутеров
 admin_app.include_router(router=admin_router, prefix="/api/v1")  # Префикс внутри admin_app
 app.include_router(router=client_router, prefix="/api/v1")
+# Уменьшенные копии изображений: роут должен быть раньше монтирования /images
+app.include_router(router=images_router)
 
-# Монтирование статических файлов
-app.mount("/images", StaticFiles(directory=str(IMAGES_DIR)), name="images")
-app.mount("/files", StaticFiles(directory=str(FILES_DIR)), name="files")
+if settings.file_offload_enabled:
+    # Доступ проверяет приложение, байты отдает прокси (X-Accel-Redirect/X-Sendfile)
+    app.include_router(router=downloads_router)
+else:
+    # Монтирование статических файлов
+    app.mount("/images", ShardedStaticFiles(directory=str(IMAGES_DIR)), name="images")
+    app.mount("/files", ShardedStaticFiles(directory=str(FILES_DIR)), name="files")
 
 # Монтирование приложений на разные пути
 app.mount("/admin", admin_app)
 
 
+# Маршрут запроса для журнала медленных запросов (покрывает и смонтированный admin_app)
+app.add_middleware(QueryContextMiddleware)
+
+# Строгий режим (тесты): запрос, заблокировавший цикл событий дольше порога, падает
+if settings.loop_block_fail_ms > 0:
+    install_blocking_detector()
+    app.add_middleware(BlockingDetectorMiddleware)
+
+# Профилирование запросов по токену или доле (без настроек middleware не подключается).
+# Только на app: запрос к /admin проходит через него, второе решение удвоило бы долю
+if profiling_enabled():
+    app.add_middleware(ProfilingMiddleware)
+
 # Настройка CORS
 app.add_middleware(
     CORSMiddleware,
@@ -50,3 +90,11 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+
+# Сжатие ответов app и admin_app (смонтированное приложение проходит через middleware app)
+if settings.compression_enabled:
+    app.add_middleware(CompressionMiddleware)
+
+# Журнал запросов снаружи остальных middleware: длительность и статус - как у клиента
+if settings.access_log_enabled:
+    app.add_middleware(AccessLogMiddleware)
@@ -0,0 +1,111 @@
+"""
+Заполнение размеров и миниатюр-заглушек для уже загруженных изображений продуктов
+
+Обрабатывает продукты с изображением, у которых еще не посчитаны метаданные,
+пачками по возрастанию ID. Изображения пачки обрабатываются параллельно
+в пуле процессов. Повторный запуск продолжает с необработанных записей.
+
+Строки обновляются без событий изменений, поэтому в конце отправляется сброс
+(core.events.record_reset): воркеры очищают кэши и снимки витрины. Сброс между
+процессами доставляется через NOTIFY PostgreSQL; на других базах после запуска
+приложение нужно перезапустить.
+
+Запуск:
+    python -m scripts.backfill_image_metadata --batch-size 200
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import select, update
+
+from core.config import IMAGES_DIR, settings
+from core.events import record_reset
+from core.models import db_helper, Product
+from admin.api.v1.utils.file_utils import resolve_storage_path
+from admin.api.v1.utils.image_utils import get_image_metadata, shutdown_image_pool
+
+
+async def backfill(batch_size: int) -> None:
+    """Посчитать метаданные изображений пачками"""
+    last_id = 0
+    processed = failed = 0
+
+    while True:
+        async with db_helper.session_factory() as session:
+            result = await session.execute(
+                select(Product.id, Product.image)
+                .where(
+                    Product.id > last_id,
+                    Product.image.is_not(None),
+                    Product.image_width.is_(None),
+                )
+                .order_by(Product.id)
+                .limit(batch_size)
+            )
+            rows = result.all()
+            if not rows:
+                break
+
+            sources = await asyncio.gather(*(
+                asyncio.to_thread(resolve_storage_path, image, IMAGES_DIR)
+                for _, image in rows
+            ))
+            metadata = await asyncio.gather(*(
+                get_image_metadata(source) if source is not None else asyncio.sleep(0)
+                for source in sources
+            ))
+
+            for (product_id, image), item in zip(rows, metadata):
+                if item is None:
+                    failed += 1
+                    continue
+                width, height, placeholder = item
+                # Условие на путь защищает от гонки с загрузкой нового изображения,
+                # updated_at сохраняем: это не изменение данных продукта
+                await session.execute(
+                    update(Product)
+                    .where(Product.id == product_id, Product.image == image)
+                    .values(
+                        image_width=width,
+                        image_height=height,
+                        image_placeholder=placeholder,
+                        updated_at=Product.updated_at,
+                    )
+                )
+                processed += 1
+
+            await session.commit()
+
+        last_id = rows[-1][0]
+        print(f"Обработано до ID {last_id}: готово {processed}, пропущено {failed}")
+
+    print(f"Готово: обработано {processed}, пропущено {failed}")
+
+
+async def notify_reset() -> None:
+    """Сбросить кэши и снимки витрины воркеров: метаданные менялись без событий"""
+    async with db_helper.session_factory() as session:
+        record_reset(session)
+        await session.commit()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Заполнение метаданных изображений продуктов")
+    parser.add_argument("--batch-size", type=int, default=200, help="Размер пачки")
+    parser.add_argument("--workers", type=int, default=settings.image_workers, help="Число процессов")
+    args = parser.parse_args()
+
+    # Пул создается лениво, поэтому достаточно поменять настройку до первой задачи
+    settings.image_workers = args.workers
+
+    try:
+        await backfill(args.batch_size)
+    finally:
+        shutdown_image_pool()
+        # И после прерванного запуска: уже зафиксированные пачки должны стать видны
+        await notify_reset()
+        await db_helper.engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
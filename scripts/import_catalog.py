@@ -0,0 +1,73 @@
+"""
+Импорт каталога поставщика из CSV/JSONL файлов
+
+Продукты импортируются раньше файлов, чтобы файлы могли сослаться
+на только что созданные продукты по артикулу. Каждый файл импортируется
+одной транзакцией: строки проверяются пачками, загружаются во временную
+таблицу (COPY на PostgreSQL) и переносятся одним upsert.
+
+Запуск:
+    python -m scripts.import_catalog --products products.csv --files files.jsonl
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+from core.config import settings
+from core.models import db_helper
+from admin.api.v1.imports.crud import catalog_import_crud
+from admin.api.v1.utils.import_utils import detect_import_format, iter_file_chunks, iter_import_rows
+
+
+async def import_file(kind: str, path: Path, import_format: str, batch_size: int) -> bool:
+    """Импортировать один файл и напечатать прогресс и ошибки"""
+    started = time.perf_counter()
+
+    def on_progress(rows: int, valid: int, failed: int) -> None:
+        elapsed = time.perf_counter() - started
+        print(f"[{kind}] прочитано {rows}, ошибок {failed}, {rows / elapsed:.0f} строк/с", flush=True)
+
+    batches = iter_import_rows(iter_file_chunks(path), import_format, batch_size)
+    async with db_helper.session_factory() as session:
+        report = await catalog_import_crud.run(session, kind, batches, on_progress=on_progress)
+
+    for error in report.errors:
+        print(f"[{kind}] строка {error.row}: {error.error}", file=sys.stderr)
+    if report.failed > len(report.errors):
+        print(f"[{kind}] ... и еще {report.failed - len(report.errors)} ошибок", file=sys.stderr)
+    print(
+        f"[{kind}] готово: строк {report.rows}, загружено {report.valid}, изменено {report.imported}, "
+        f"ошибок {report.failed}, {report.duration_seconds} с ({report.rows_per_second:.0f} строк/с)"
+    )
+    return report.failed == 0
+
+
+async def main() -> bool:
+    parser = argparse.ArgumentParser(description="Импорт каталога из CSV/JSONL")
+    parser.add_argument("--products", type=Path, help="Файл с продуктами")
+    parser.add_argument("--files", type=Path, help="Файл с документами продуктов")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="Формат (по умолчанию - по расширению)")
+    parser.add_argument("--batch-size", type=int, default=settings.import_batch_size, help="Размер пачки")
+    args = parser.parse_args()
+
+    if args.products is None and args.files is None:
+        parser.error("укажите --products и/или --files")
+
+    ok = True
+    try:
+        for kind, path in (("products", args.products), ("files", args.files)):
+            if path is None:
+                continue
+            import_format = args.format or detect_import_format(filename=path.name)
+            if import_format is None:
+                parser.error(f"не удалось определить формат {path}, укажите --format")
+            ok = await import_file(kind, path, import_format, args.batch_size) and ok
+    finally:
+        await db_helper.engine.dispose()
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -0,0 +1,99 @@
+"""
+Нагрузочная проверка потока событий (SSE) на большом числе простаивающих подписчиков
+
+Открывает N SSE соединений к запущенному серверу, затем изменяет категорию
+через админский API и измеряет, за какое время событие получили все подписчики.
+Соединения открываются на голых asyncio-сокетах, чтобы сам клиент не был
+узким местом. Для 10 000 соединений нужен ulimit -n больше 10 000
+и у клиента, и у сервера.
+
+Запуск:
+    python -m scripts.load_test_events --url http://127.0.0.1:8000 --subscribers 10000
+"""
+import argparse
+import asyncio
+import json
+import time
+import resource
+from urllib.parse import urlsplit
+
+import httpx
+
+EVENTS_PATH = "/admin/api/v1/events/"
+CATEGORIES_PATH = "/admin/api/v1/categories/"
+
+
+async def subscribe(host: str, port: int, connected: asyncio.Queue, received: asyncio.Queue) -> None:
+    """Открыть SSE соединение и сообщать о каждом событии change"""
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(
+        f"GET {EVENTS_PATH} HTTP/1.1\r\nHost: {host}\r\nAccept: text/event-stream\r\n\r\n".encode()
+    )
+    await writer.drain()
+    await reader.readuntil(b"\r\n\r\n")
+    connected.put_nowait(None)
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            if line.startswith(b"data:") and b'"entity"' in line:
+                received.put_nowait(time.perf_counter())
+    finally:
+        writer.close()
+
+
+async def wait_count(queue: asyncio.Queue, count: int) -> list:
+    return [await queue.get() for _ in range(count)]
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Нагрузочная проверка SSE потока событий")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Адрес сервера")
+    parser.add_argument("--subscribers", type=int, default=10000, help="Число подписчиков")
+    parser.add_argument("--batch", type=int, default=500, help="Сколько соединений открывать одновременно")
+    parser.add_argument("--idle", type=float, default=5.0, help="Простой перед изменением, с")
+    args = parser.parse_args()
+
+    parts = urlsplit(args.url)
+    host, port = parts.hostname, parts.port or 80
+    connected: asyncio.Queue = asyncio.Queue()
+    received: asyncio.Queue = asyncio.Queue()
+
+    started = time.perf_counter()
+    tasks = []
+    for offset in range(0, args.subscribers, args.batch):
+        count = min(args.batch, args.subscribers - offset)
+        tasks += [asyncio.create_task(subscribe(host, port, connected, received)) for _ in range(count)]
+        await wait_count(connected, count)
+    print(f"Подключено {args.subscribers} подписчиков за {time.perf_counter() - started:.1f} с")
+
+    await asyncio.sleep(args.idle)
+
+    async with httpx.AsyncClient(base_url=args.url) as client:
+        sent = time.perf_counter()
+        response = await client.post(CATEGORIES_PATH, json={"name": f"load-test-{time.time()}"})
+        response.raise_for_status()
+        category_id = response.json()["id"]
+
+        times = sorted(moment - sent for moment in await wait_count(received, args.subscribers))
+        await client.delete(f"{CATEGORIES_PATH}{category_id}")
+
+    def percentile(value: float) -> float:
+        return times[min(len(times) - 1, int(len(times) * value))] * 1000
+
+    print(json.dumps({
+        "subscribers": args.subscribers,
+        "p50_ms": round(percentile(0.5), 1),
+        "p99_ms": round(percentile(0.99), 1),
+        "max_ms": round(times[-1] * 1000, 1),
+        "client_max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }, ensure_ascii=False))
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,175 @@
+"""
+Онлайн-миграция загруженных файлов на шардированную структуру (ab/cd/<uuid>.ext)
+
+Переносит изображения (Product.image) и документы (File.path) пачками
+и переписывает пути в БД. Приложение продолжает работать во время миграции:
+ShardedStaticFiles и resolve_storage_path находят файл по старому и новому пути.
+
+Миграция возобновляемая: прогресс сохраняется в state-файл после каждой пачки,
+а уже перенесенные записи при повторном запуске пропускаются.
+
+Пути переписываются без событий изменений, поэтому в конце отправляется сброс
+(core.events.record_reset): воркеры очищают кэши и снимки витрины со старыми
+путями. Сброс между процессами доставляется через NOTIFY PostgreSQL; на других
+базах после миграции приложение нужно перезапустить.
+
+Запуск:
+    python -m scripts.migrate_storage --batch-size 500
+"""
+import argparse
+import asyncio
+import json
+import os
+from pathlib import Path
+
+from sqlalchemy import select, update
+
+from core.config import BASE_DIR, IMAGES_DIR, FILES_DIR
+from core.events import record_reset
+from core.models import db_helper, Product, File
+from admin.api.v1.utils.file_utils import get_sharded_path, is_sharded_path
+
+
+DEFAULT_STATE_FILE = BASE_DIR / ".storage_migration.json"
+
+# (ключ прогресса, модель, колонка с путем, базовая директория)
+MIGRATION_TARGETS = (
+    ("images", Product, Product.image, IMAGES_DIR),
+    ("files", File, File.path, FILES_DIR),
+)
+
+
+def load_state(state_file: Path) -> dict:
+    """Прочитать прогресс миграции"""
+    if state_file.exists():
+        return json.loads(state_file.read_text())
+    return {}
+
+
+def save_state(state_file: Path, state: dict) -> None:
+    """Атомарно сохранить прогресс миграции"""
+    tmp_file = state_file.with_suffix(".tmp")
+    tmp_file.write_text(json.dumps(state))
+    os.replace(tmp_file, state_file)
+
+
+def move_to_shard(relative_path: str, base_directory: Path) -> str | None:
+    """
+    Перенести файл в шардированную директорию
+
+    Returns:
+        str | None: Новый относительный путь или None если файла нет ни там, ни там
+    """
+    new_path = get_sharded_path(Path(relative_path).name)
+    source = base_directory / relative_path
+    target = base_directory / new_path
+
+    if source.is_file():
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(source, target)
+
+        # Удаляем опустевшую директорию старой структуры (по имени продукта)
+        parent_dir = source.parent
+        if parent_dir != base_directory and next(parent_dir.iterdir(), None) is None:
+            parent_dir.rmdir()
+        return new_path
+
+    # Файл уже перенесен прошлым прерванным запуском, но путь в БД не обновлен
+    if target.is_file():
+        return new_path
+    return None
+
+
+async def migrate_target(
+    key: str,
+    model,
+    column,
+    base_directory: Path,
+    state: dict,
+    state_file: Path,
+    batch_size: int,
+    dry_run: bool
+) -> None:
+    """Перенести файлы одной таблицы пачками по возрастанию ID"""
+    last_id = state.get(key, 0)
+    moved = missing = 0
+
+    while True:
+        async with db_helper.session_factory() as session:
+            result = await session.execute(
+                select(model.id, column)
+                .where(model.id > last_id, column.is_not(None))
+                .order_by(model.id)
+                .limit(batch_size)
+            )
+            rows = result.all()
+            if not rows:
+                break
+
+            for row_id, old_path in rows:
+                if is_sharded_path(old_path):
+                    continue
+                if dry_run:
+                    moved += 1
+                    continue
+
+                # Дисковые операции выполняем вне event loop
+                new_path = await asyncio.to_thread(move_to_shard, old_path, base_directory)
+                if new_path is None:
+                    missing += 1
+                    continue
+
+                # Условие на старый путь защищает от гонки с параллельной загрузкой,
+                # updated_at сохраняем: миграция не является изменением данных
+                await session.execute(
+                    update(model)
+                    .where(model.id == row_id, column == old_path)
+                    .values({column: new_path, model.updated_at: model.updated_at})
+                )
+                moved += 1
+
+            await session.commit()
+
+        last_id = rows[-1][0]
+        if not dry_run:
+            state[key] = last_id
+            save_state(state_file, state)
+        print(f"[{key}] обработано до ID {last_id}: перенесено {moved}, не найдено {missing}")
+
+    print(f"[{key}] готово: перенесено {moved}, не найдено {missing}")
+
+
+async def notify_reset() -> None:
+    """Сбросить кэши и снимки витрины воркеров: пути менялись без событий"""
+    async with db_helper.session_factory() as session:
+        record_reset(session)
+        await session.commit()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Миграция файлов на шардированную структуру")
+    parser.add_argument("--batch-size", type=int, default=500, help="Размер пачки")
+    parser.add_argument("--state-file", type=Path, default=DEFAULT_STATE_FILE, help="Файл прогресса")
+    parser.add_argument("--restart", action="store_true", help="Начать с начала, игнорируя прогресс")
+    parser.add_argument("--dry-run", action="store_true", help="Только посчитать записи для переноса")
+    args = parser.parse_args()
+
+    state = {} if args.restart else load_state(args.state_file)
+    try:
+        for key, model, column, base_directory in MIGRATION_TARGETS:
+            await migrate_target(
+                key, model, column, base_directory,
+                state=state,
+                state_file=args.state_file,
+                batch_size=args.batch_size,
+                dry_run=args.dry_run
+            )
+    finally:
+        # И после прерванного запуска: уже перенесенные пачки должны стать видны
+        if not args.dry_run:
+            await notify_reset()
+        await db_helper.engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,30 @@
+"""
+Токен для профилирования запросов к одному пути (заголовок X-Profile)
+
+Подписывается секретом settings.profiling_secret, поэтому запускается
+с тем же окружением, что и приложение.
+
+Запуск:
+    python -m scripts.profile_token /admin/api/v1/products --ttl 300
+    curl -H "X-Profile: <токен>" http://localhost:8000/admin/api/v1/products
+"""
+import argparse
+import sys
+
+from core.config import settings
+from core.profiling import sign_profile_token
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Токен профилирования запроса")
+    parser.add_argument("path", help="Путь запроса, например /admin/api/v1/products")
+    parser.add_argument("--ttl", type=int, default=300, help="Срок действия токена в секундах")
+    args = parser.parse_args()
+
+    if not settings.profiling_secret:
+        sys.exit("profiling_secret не задан")
+    print(sign_profile_token(args.path, args.ttl))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Запуск приложения в продакшене
+
+Мастер-процесс загружает приложение один раз и создает воркеры через fork
+(общие страницы памяти с мастером). Каждый воркер открывает свой сокет
+с SO_REUSEPORT, и ядро само распределяет соединения между воркерами,
+без общей очереди accept. Упавший воркер мастер перезапускает; SIGTERM/SIGINT
+мастера останавливает воркеры штатно (uvicorn дожидается запросов).
+
+Воркер использует uvloop и httptools, если они установлены, иначе - стандартный
+цикл asyncio и h11 (с предупреждением). Пул соединений с базой воркер
+создает заново после fork (DatabaseHelper.reset_after_fork).
+
+Без SO_REUSEPORT или fork (не Linux) воркеры запускает uvicorn: общий сокет
+мастера и процессы spawn, каждый из которых импортирует приложение сам.
+
+Запуск:
+    python -m server
+    python -m server --workers 4 --port 8000
+"""
+import argparse
+import importlib.util
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Optional
+
+import uvicorn
+
+from core.config import settings
+
+APP = "main:app"
+# Воркер, падающий сразу после запуска, перезапускается не чаще раза в секунду
+RESPAWN_DELAY_SECONDS = 1.0
+# Сигналы остановки, которые мастер пересылает воркерам
+STOP_SIGNALS = (signal.SIGTERM, signal.SIGINT)
+
+logger = logging.getLogger("server")
+
+
+def _available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def select_loop() -> str:
+    if _available("uvloop"):
+        return "uvloop"
+    logger.warning("uvloop не установлен, используется стандартный цикл asyncio")
+    return "asyncio"
+
+
+def select_http() -> str:
+    if _available("httptools"):
+        return "httptools"
+    logger.warning("httptools не установлен, используется h11")
+    return "h11"
+
+
+def uvicorn_options(args: argparse.Namespace) -> dict:
+    """Параметры uvicorn.Config воркера"""
+    return dict(
+        loop=select_loop(),
+        http=select_http(),
+        backlog=args.backlog,
+        timeout_keep_alive=args.keep_alive,
+        limit_concurrency=args.limit_concurrency or None,
+        limit_max_requests=args.max_requests or None,
+        # Адрес клиента и схема из заголовков обратного прокси
+        proxy_headers=True,
+        forwarded_allow_ips=args.forwarded_allow_ips,
+        log_level=args.log_level,
+        access_log=args.access_log,
+    )
+
+
+def reuse_port_supported() -> bool:
+    return hasattr(socket, "SO_REUSEPORT") and hasattr(os, "fork")
+
+
+def bind_socket(host: str, port: int, backlog: int) -> socket.socket:
+    """Сокет воркера: SO_REUSEPORT позволяет каждому воркеру слушать тот же порт"""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Master:
+    """Мастер-процесс: fork воркеров с загруженным приложением и их перезапуск"""
+
+    def __init__(self, app, args: argparse.Namespace):
+        self.app = app
+        self.args = args
+        self.options = uvicorn_options(args)
+        self.workers: dict[int, int] = {}
+        self.stopping = False
+
+    def spawn(self, index: int) -> None:
+        # Сигнал остановки между fork и записью pid не должен пропустить нового воркера:
+        # до записи он откладывается (в дочерний процесс отложенные сигналы не попадают)
+        signal.pthread_sigmask(signal.SIG_BLOCK, STOP_SIGNALS)
+        try:
+            pid = os.fork()
+        except OSError:
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+            raise
+        if pid:
+            self.workers[pid] = index
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+            return
+        # Воркер: сигналы обрабатывает uvicorn.Server
+        for signum in STOP_SIGNALS:
+            signal.signal(signum, signal.SIG_DFL)
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+        code = 0
+        try:
+            sock = bind_socket(self.args.host, self.args.port, self.args.backlog)
+            config = uvicorn.Config(self.app, host=self.args.host, port=self.args.port, **self.options)
+            uvicorn.Server(config).run(sockets=[sock])
+        except BaseException:
+            logger.exception("Воркер %s завершился с ошибкой", index)
+            code = 1
+        finally:
+            os._exit(code)
+
+    def stop(self, signum: int, frame) -> None:
+        self.stopping = True
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self) -> None:
+        logger.info(
+            "Мастер %s: %s воркеров на %s:%s (%s, %s)",
+            os.getpid(), self.args.workers, self.args.host, self.args.port,
+            self.options["loop"], self.options["http"]
+        )
+        for signum in STOP_SIGNALS:
+            signal.signal(signum, self.stop)
+        for index in range(self.args.workers):
+            if self.stopping:
+                break
+            self.spawn(index)
+
+        started: dict[int, float] = {}
+        while self.workers:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            index = self.workers.pop(pid, None)
+            if index is None or self.stopping:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            # Штатный выход после limit_max_requests - тоже повод перезапустить воркер
+            logger.warning("Воркер %s (pid %s) завершился с кодом %s, перезапуск", index, pid, code)
+            delay = started.get(index, 0.0) + RESPAWN_DELAY_SECONDS - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+                # SIGTERM во время паузы: новый воркер его бы уже не получил
+                if self.stopping:
+                    continue
+            started[index] = time.monotonic()
+            self.spawn(index)
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Запуск приложения с несколькими воркерами")
+    parser.add_argument("--host", default=settings.server_host)
+    parser.add_argument("--port", type=int, default=settings.server_port)
+    parser.add_argument(
+        "--workers", type=int, default=settings.server_workers or os.cpu_count() or 1,
+        help="Число воркеров (по умолчанию server_workers или число CPU)"
+    )
+    parser.add_argument("--backlog", type=int, default=settings.server_backlog)
+    parser.add_argument("--keep-alive", type=int, default=settings.server_keep_alive_seconds)
+    parser.add_argument(
+        "--limit-concurrency", type=int, default=settings.server_limit_concurrency,
+        help="Соединений на воркер, дальше - 503 (0 - без ограничений)"
+    )
+    parser.add_argument(
+        "--max-requests", type=int, default=settings.server_max_requests,
+        help="Перезапуск воркера после числа запросов (0 - без ограничений)"
+    )
+    parser.add_argument("--forwarded-allow-ips", default="127.0.0.1")
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--no-access-log", dest="access_log", action="store_false")
+    parser.add_argument(
+        "--no-reuse-port", dest="reuse_port", action="store_false",
+        help="Общий сокет и воркеры uvicorn вместо SO_REUSEPORT"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(name)s %(levelname)s %(message)s")
+
+    if args.reuse_port and reuse_port_supported():
+        # Приложение загружается в мастере до fork
+        from main import app
+        Master(app, args).run()
+        return
+
+    uvicorn.run(
+        APP,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        **uvicorn_options(args)
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,12 @@
+import os
+
+# Настройки подключения обязательны при импорте core.config; тесты работают с SQLite в памяти
+for name, value in {
+    "user": "test",
+    "password": "test",
+    "host": "localhost",
+    "port": "5432",
+    "database": "test",
+    "DB_URL": "sqlite+aiosqlite:///:memory:",
+}.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from admin.api.v1.categories.crud import category_crud
+from admin.api.v1.categories.schemas import CategoryCreate, CategoryUpdate
+from core.models.base import Base
+from core.models.models import Category
+
+
+def run_with_session(tmp_path, scenario):
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'tree.db'}")
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        try:
+            async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+                return await scenario(session)
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(run())
+
+
+async def create(session, name, parent_id=None) -> int:
+    category = await category_crud.create(session, CategoryCreate(name=name, parent_id=parent_id))
+    return category.id
+
+
+async def paths(session) -> dict[str, str]:
+    result = await session.execute(select(Category.name, Category.path))
+    return dict(result.all())
+
+
+def test_move_rewrites_subtree_paths(tmp_path):
+    async def scenario(session):
+        a = await create(session, "a")
+        b = await create(session, "b", a)
+        await create(session, "c", b)
+        d = await create(session, "d")
+        await category_crud.update(session, b, CategoryUpdate(parent_id=d))
+        return await paths(session)
+
+    assert run_with_session(tmp_path, scenario) == {"a": "1/", "b": "4/2/", "c": "4/2/3/", "d": "4/"}
+
+
+def test_move_into_own_subtree_is_rejected(tmp_path):
+    async def scenario(session):
+        a = await create(session, "a")
+        b = await create(session, "b", a)
+        c = await create(session, "c", b)
+        for parent_id in (a, c):
+            with pytest.raises(ValueError):
+                await category_crud.update(session, a, CategoryUpdate(parent_id=parent_id))
+        return await paths(session)
+
+    assert run_with_session(tmp_path, scenario) == {"a": "1/", "b": "1/2/", "c": "1/2/3/"}
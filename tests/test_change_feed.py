@@ -0,0 +1,45 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import insert, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from admin.api.v1.changes.crud import change_crud, ChangeCRUD
+from core.models.base import Base
+from core.models.models import Category
+
+
+def test_horizon_is_computed_in_sql_on_postgresql():
+    """Граница ленты не передается параметром: asyncpg не принимает время с зоной для TIMESTAMP"""
+    query = select(Category.id).where(Category.updated_at <= ChangeCRUD.get_horizon(5))
+    compiled = query.compile(dialect=postgresql.asyncpg.dialect())
+    assert "LOCALTIMESTAMP - INTERVAL '5 seconds'" in str(compiled)
+    assert not any(isinstance(value, datetime) for value in compiled.params.values())
+
+
+def test_horizon_disabled_without_lag():
+    assert ChangeCRUD.get_horizon(0) is None
+
+
+def test_changes_lag_behind_horizon():
+    """Изменения новее now() - lag не отдаются, более старые (время без зоны) - отдаются"""
+
+    async def run():
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        old = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(hours=1)
+        async with async_sessionmaker(engine)() as session:
+            await session.execute(insert(Category).values(id=1, name="old", path="1/", updated_at=old))
+            await session.execute(insert(Category).values(id=2, name="new", path="2/"))
+            await session.commit()
+            positions = {stream: None for stream in ("categories", "products", "files", "deleted")}
+            lagged, _, _ = await change_crud.get_changes(session, positions, 10, lag_seconds=5)
+            current, _, _ = await change_crud.get_changes(session, positions, 10)
+        await engine.dispose()
+        return lagged, current
+
+    lagged, current = asyncio.run(run())
+    assert [category.id for category in lagged["categories"]] == [1]
+    assert [category.id for category in current["categories"]] == [1, 2]
@@ -0,0 +1,82 @@
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import FileResponse, PlainTextResponse
+from starlette.routing import Route
+from starlette.staticfiles import StaticFiles
+from starlette.testclient import TestClient
+
+from core.compression import CompressionMiddleware, accepts_encoding
+
+
+def make_client(tmp_path) -> TestClient:
+    text_file = tmp_path / "range_test.txt"
+    text_file.write_text("a" * 5000)
+
+    async def file_endpoint(request):
+        return FileResponse(text_file, media_type="text/plain")
+
+    async def text_endpoint(request):
+        return PlainTextResponse("b" * 5000)
+
+    app = Starlette(routes=[Route("/file", file_endpoint), Route("/text", text_endpoint)])
+    app.add_middleware(CompressionMiddleware)
+    return TestClient(app)
+
+
+def test_full_text_response_is_compressed(tmp_path):
+    response = make_client(tmp_path).get("/text", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.text == "b" * 5000
+
+
+def test_partial_response_is_not_compressed(tmp_path):
+    response = make_client(tmp_path).get(
+        "/file", headers={"Accept-Encoding": "gzip", "Range": "bytes=0-2999"}
+    )
+    assert response.status_code == 206
+    assert "content-encoding" not in response.headers
+    assert response.headers["content-range"] == "bytes 0-2999/5000"
+    assert response.headers["content-length"] == "3000"
+    assert len(response.content) == 3000
+
+
+def make_static_client(tmp_path) -> TestClient:
+    (tmp_path / "notes.txt").write_text("c" * 5000)
+    app = StaticFiles(directory=tmp_path)
+    return TestClient(CompressionMiddleware(app))
+
+
+def test_revalidation_of_compressed_variant(tmp_path):
+    client = make_static_client(tmp_path)
+    first = client.get("/notes.txt", headers={"Accept-Encoding": "gzip"})
+    etag = first.headers["etag"]
+    assert first.headers["content-encoding"] == "gzip"
+    assert etag.endswith('-gzip"')
+
+    response = client.get("/notes.txt", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert "accept-encoding" in response.headers["vary"].lower()
+
+
+def test_variant_etag_of_other_encoding_is_not_matched(tmp_path):
+    pytest.importorskip("brotli")
+    client = make_static_client(tmp_path)
+    etag = client.get("/notes.txt", headers={"Accept-Encoding": "gzip"}).headers["etag"]
+
+    # Клиент просит другую кодировку: тело в gzip ему не подходит
+    response = client.get("/notes.txt", headers={"Accept-Encoding": "br", "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "br"
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    ("gzip", True),
+    ("*;q=0, gzip", True),
+    ("gzip;q=0, *", False),
+    ("br, *", True),
+    ("br", False),
+    ("", False),
+])
+def test_accepts_gzip(accept_encoding, expected):
+    assert accepts_encoding(accept_encoding, "gzip") is expected
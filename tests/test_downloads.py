@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+import api.downloads.routes as downloads_routes
+import admin.api.v1.utils.offload_utils as offload_utils
+from admin.api.v1.dependencies import get_db_session
+from core.config import settings
+from core.models.base import Base
+from core.models.models import Category, Product, File
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    images_dir = tmp_path / "images"
+    files_dir = tmp_path / "files"
+    (files_dir / "ab").mkdir(parents=True)
+    images_dir.mkdir()
+    (files_dir / "ab" / "manual.pdf").write_bytes(b"%PDF manual")
+    (files_dir / "ab" / "hidden.pdf").write_bytes(b"%PDF hidden")
+    (images_dir / "photo.png").write_bytes(b"png bytes")
+    monkeypatch.setattr(downloads_routes, "FILES_DIR", files_dir)
+    monkeypatch.setattr(downloads_routes, "IMAGES_DIR", images_dir)
+    monkeypatch.setattr(offload_utils, "BASE_DIR", tmp_path)
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def setup():
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+            await connection.execute(insert(Category).values(id=1, name="c", path="1/"))
+            await connection.execute(insert(Product).values([
+                {"id": 1, "name": "active", "category_id": 1, "is_active": True, "image": "photo.png"},
+                {"id": 2, "name": "inactive", "category_id": 1, "is_active": False, "image": None},
+            ]))
+            await connection.execute(insert(File).values([
+                {"id": 1, "name": "Инструкция.pdf", "path": "ab/manual.pdf", "product_id": 1},
+                {"id": 2, "name": "hidden.pdf", "path": "ab/hidden.pdf", "product_id": 2},
+            ]))
+
+    asyncio.run(setup())
+
+    async def override_session():
+        async with session_factory() as session:
+            yield session
+
+    app = FastAPI()
+    app.include_router(downloads_routes.router)
+    app.dependency_overrides[get_db_session] = override_session
+    with TestClient(app) as test_client:
+        yield test_client
+    asyncio.run(engine.dispose())
+
+
+def test_accel_redirect(client, monkeypatch):
+    monkeypatch.setattr(settings, "file_offload_mode", "accel")
+    response = client.get("/files/ab/manual.pdf", headers={"X-Sendfile-Type": "X-Accel-Redirect"})
+    assert response.status_code == 200
+    assert response.headers["x-accel-redirect"] == "/protected/files/ab/manual.pdf"
+    assert response.headers["content-type"] == "application/pdf"
+    assert "filename*=UTF-8''%D0%98" in response.headers["content-disposition"]
+    assert response.content == b""
+
+
+def test_sendfile(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "file_offload_mode", "sendfile")
+    response = client.get("/images/photo.png", headers={"X-Sendfile-Type": "X-Sendfile"})
+    assert response.status_code == 200
+    assert response.headers["x-sendfile"] == str((tmp_path / "images" / "photo.png").resolve())
+    assert response.content == b""
+
+
+def test_direct_fallback_without_proxy_header(client, monkeypatch):
+    monkeypatch.setattr(settings, "file_offload_mode", "accel")
+    response = client.get("/files/ab/manual.pdf")
+    assert response.status_code == 200
+    assert "x-accel-redirect" not in response.headers
+    assert response.content == b"%PDF manual"
+
+
+def test_client_cannot_choose_other_mode(client, monkeypatch):
+    """Заголовок запроса не переключает режим: абсолютный путь не раскрывается"""
+    monkeypatch.setattr(settings, "file_offload_mode", "accel")
+    response = client.get("/images/photo.png", headers={"X-Sendfile-Type": "X-Sendfile"})
+    assert response.status_code == 200
+    assert "x-sendfile" not in response.headers
+    assert response.content == b"png bytes"
+
+
+def test_inactive_product_is_not_found(client):
+    response = client.get("/files/ab/hidden.pdf", headers={"X-Sendfile-Type": "X-Accel-Redirect"})
+    assert response.status_code == 404
+    assert "x-accel-redirect" not in response.headers
@@ -0,0 +1,48 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+import pytest
+from PIL import Image
+
+from admin.api.v1.utils.image_utils import ImageDecodeError, resize_image
+
+
+def test_broken_source_is_decode_error(tmp_path):
+    source = tmp_path / "broken.jpg"
+    source.write_bytes(b"not an image")
+    with pytest.raises(ImageDecodeError):
+        resize_image(str(source), str(tmp_path / "out.jpg"), 100, 100, "jpeg")
+
+
+def test_truncated_source_is_decode_error(tmp_path):
+    source = tmp_path / "truncated.png"
+    Image.new("RGB", (400, 400), "red").save(source)
+    source.write_bytes(source.read_bytes()[:200])
+    with pytest.raises(ImageDecodeError):
+        resize_image(str(source), str(tmp_path / "out.png"), 100, 100, "png")
+
+
+def test_write_error_is_not_decode_error(tmp_path):
+    """Ошибка записи копии - ошибка сервера, а не плохое изображение"""
+    source = tmp_path / "ok.png"
+    Image.new("RGB", (400, 400), "red").save(source)
+    blocker = tmp_path / "blocker"
+    blocker.write_text("file, not a directory")
+    with pytest.raises(OSError) as error:
+        resize_image(str(source), str(blocker / "out.png"), 100, 100, "png")
+    assert not isinstance(error.value, ImageDecodeError)
+
+
+def test_decode_error_crosses_process_pool(tmp_path):
+    source = tmp_path / "broken.jpg"
+    source.write_bytes(b"not an image")
+
+    async def run():
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            await asyncio.get_running_loop().run_in_executor(
+                pool, resize_image, str(source), str(tmp_path / "out.jpg"), 100, 100, "jpeg"
+            )
+
+    with pytest.raises(ImageDecodeError):
+        asyncio.run(run())
@@ -0,0 +1,40 @@
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Mount, Route
+from starlette.testclient import TestClient
+
+import core.profiling as profiling
+from core.profiling import ProfilingMiddleware, list_profiles
+
+
+def test_nested_middleware_decides_once(monkeypatch, tmp_path):
+    """Смонтированное приложение с тем же middleware не выбирает запрос повторно"""
+    monkeypatch.setattr(profiling, "PROFILES_DIR", tmp_path)
+    decisions = []
+
+    def requested(scope):
+        decisions.append(scope["path"])
+        return False
+
+    monkeypatch.setattr(profiling, "_requested", requested)
+
+    async def endpoint(request):
+        return PlainTextResponse("ok")
+
+    inner = Starlette(routes=[Route("/ping", endpoint)])
+    inner.add_middleware(ProfilingMiddleware)
+    outer = Starlette(routes=[Mount("/admin", inner)])
+    outer.add_middleware(ProfilingMiddleware)
+
+    response = TestClient(outer).get("/admin/ping")
+    assert response.status_code == 200
+    assert len(decisions) == 1
+
+
+def test_list_profiles_skips_vanished_files(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling, "PROFILES_DIR", tmp_path)
+    (tmp_path / "kept.pstats").write_bytes(b"profile")
+    # Ссылка на удаленный файл: stat() падает так же, как на файле, удаленном другим воркером
+    (tmp_path / "gone.pstats").symlink_to(tmp_path / "missing")
+
+    assert [profile.name for profile in list_profiles()] == ["kept.pstats"]
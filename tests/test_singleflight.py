@@ -0,0 +1,41 @@
+import asyncio
+
+from core.config import settings
+from core.deadline import remaining, set_timeout
+from core.singleflight import SingleFlight
+
+
+def test_shared_read_runs_with_ceiling_deadline():
+    """Общий запрос не наследует дедлайн первого клиента, но и без дедлайна не остается"""
+    group = SingleFlight("test")
+    seen = []
+
+    async def loader():
+        seen.append(remaining())
+        return "value"
+
+    async def run():
+        set_timeout(0.5)
+        return await group.do("key", loader)
+
+    assert asyncio.run(run()) == "value"
+    assert seen[0] is not None
+    assert 0.5 < seen[0] <= settings.request_timeout_max_seconds
+
+
+def test_waiters_share_one_load():
+    group = SingleFlight("test")
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    async def run():
+        return await asyncio.gather(*(group.do("key", loader) for _ in range(5)))
+
+    assert asyncio.run(run()) == [1] * 5
+    assert group.stats().executed == 1
+    assert group.stats().coalesced == 4